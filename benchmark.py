@@ -0,0 +1,225 @@
+"""
+Expansion OS - Benchmark Runner
+===============================
+Times the data entry points on synthetic data (synth_data.py) at multiples
+of production size and reports wall time and peak memory per stage:
+
+  load_core_data        build_core_frame, cold (no snapshots) and warm
+  load_predictive_data  aggregate_web_demand + the app's top-30 cut
+  load_table            every TABLE_MAP table, cold and cached
+  save_table            every TABLE_MAP table written back
+  push_all_to_neon      forced full sync (Postgres mode only)
+
+Each scale and mode runs in a fresh worker process with EXPANSION_DATA_DIR
+pointed at the synthetic data, so module-level caches and peak memory start
+clean. CSV mode always runs; Postgres mode runs against --pg-url (any local
+PostgreSQL works as a Neon stand-in) and is skipped without it.
+
+Peak memory is the highest resident set size sampled during the stage
+(Linux /proc); peak_delta_mb is that minus the RSS when the stage began.
+
+Usage:
+    python benchmark.py --scales 1,10
+    python benchmark.py --scales 1,10,100 --pg-url postgresql+psycopg2://postgres@localhost/bench
+    python benchmark.py --scales 10 --detail --output bench_output.txt
+"""
+
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+RESULT_COLS = ["scale", "mode", "stage", "seconds", "rows", "peak_rss_mb", "peak_delta_mb"]
+SAMPLE_INTERVAL = 0.002      # seconds between RSS samples
+RESULT_MARKER = "BENCH_RESULT "
+
+
+# === Memory sampling =================================================
+
+def _rss_bytes():
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        return None
+
+
+@contextmanager
+def _measure(results: list, stage: str):
+    """Time a stage and sample its peak RSS; the yielded dict takes `rows`."""
+    entry = {"stage": stage, "rows": None}
+    start_rss = _rss_bytes()
+    peak = {"rss": start_rss}
+    done = threading.Event()
+
+    def sample():
+        while not done.wait(SAMPLE_INTERVAL):
+            rss = _rss_bytes()
+            if rss is not None and rss > (peak["rss"] or 0):
+                peak["rss"] = rss
+
+    sampler = threading.Thread(target=sample, daemon=True)
+    sampler.start()
+    started = time.perf_counter()
+    try:
+        yield entry
+    finally:
+        entry["seconds"] = round(time.perf_counter() - started, 3)
+        done.set()
+        sampler.join()
+        end_rss = _rss_bytes()
+        top = max(r for r in (peak["rss"], end_rss, 0) if r is not None)
+        entry["peak_rss_mb"] = round(top / 2**20, 1) if start_rss is not None else None
+        entry["peak_delta_mb"] = round((top - start_rss) / 2**20, 1) if start_rss is not None else None
+        results.append(entry)
+
+
+# === Worker (one scale, one mode) ====================================
+
+def _run_stages(source_dir: str, mode: str) -> list:
+    """Benchmark every stage in this process. Imports happen here, after the env is set."""
+    import db
+    from d2c_pipeline import WEB_FILE, aggregate_web_demand
+    from mis_pipeline import SNAPSHOT_DIR, build_core_frame
+
+    os.chdir(source_dir)                 # the MIS and website exports are read from the cwd
+    for stale in (SNAPSHOT_DIR, db.PARQUET_DIR):
+        shutil.rmtree(stale, ignore_errors=True)
+    tables = list(db.TABLE_MAP)
+    results = []
+
+    if mode == "postgres":
+        if db._get_engine() is None:
+            raise RuntimeError("Postgres URL set but no engine could be created")
+        with _measure(results, "push_all_to_neon") as m:
+            m["rows"] = sum(r["rows"] for r in db.sync_to_neon(force=True))
+
+    with _measure(results, "load_core_data (cold)") as m:
+        m["rows"] = len(build_core_frame())
+    with _measure(results, "load_core_data (snapshot)") as m:
+        m["rows"] = len(build_core_frame())
+
+    with _measure(results, "load_predictive_data") as m:
+        # Same cut as the app's load_predictive_data
+        df_pred = aggregate_web_demand(WEB_FILE)
+        m["rows"] = len(df_pred.sort_values(by="Est_Online_Revenue_Lacs", ascending=False).head(30))
+
+    db.clear_table_cache()
+    frames = {}
+    with _measure(results, "load_table (cold)") as m:
+        for name in tables:
+            frames[name] = db.load_table(name)
+        m["rows"] = sum(len(df) for df in frames.values())
+    with _measure(results, "load_table (cached)") as m:
+        m["rows"] = sum(len(db.load_table(name)) for name in tables)
+
+    with _measure(results, "save_table") as m:
+        for name in tables:
+            db.save_table(name, frames[name])
+        m["rows"] = sum(len(df) for df in frames.values())
+
+    return results
+
+
+def _worker(args) -> int:
+    results = _run_stages(args.dir, args.mode)
+    detail = None
+    if args.detail:
+        from metrics import latency_summary
+        detail = latency_summary(["stage", "table"]).to_dict("records")
+    print(RESULT_MARKER + json.dumps({"results": results, "detail": detail}, default=str))
+    return 0
+
+
+# === Driver ==========================================================
+
+def _dataset(workdir: str, scale: float, seed: int, reuse: bool) -> str:
+    """Directory holding the synthetic inputs for a scale, generated on demand."""
+    from synth_data import generate
+    path = os.path.join(workdir, f"x{scale:g}")
+    marker = os.path.join(path, ".generated.json")
+    if reuse and os.path.exists(marker):
+        return path
+    shutil.rmtree(path, ignore_errors=True)
+    started = time.perf_counter()
+    counts = generate(path, scale, seed)
+    with open(marker, "w") as f:
+        json.dump({"scale": scale, "seed": seed, "rows": counts}, f, indent=2)
+    print(f"Generated x{scale:g} ({sum(counts.values()):,} rows) in {time.perf_counter() - started:.1f}s",
+          file=sys.stderr)
+    return path
+
+
+def _spawn(path: str, scale: float, mode: str, pg_url: str, detail: bool) -> dict:
+    env = dict(os.environ, EXPANSION_DATA_DIR=os.path.join(path, "data"))
+    env.pop("NEON_DATABASE_URL", None)
+    if mode == "postgres":
+        env["NEON_DATABASE_URL"] = pg_url
+    cmd = [sys.executable, os.path.abspath(__file__), "--worker", "--dir", path, "--mode", mode]
+    if detail:
+        cmd.append("--detail")
+    proc = subprocess.run(cmd, env=env, capture_output=True, text=True)
+    lines = [l for l in proc.stdout.splitlines() if l.startswith(RESULT_MARKER)]
+    if proc.returncode != 0 or not lines:
+        raise RuntimeError(f"x{scale:g} {mode} worker failed:\n{proc.stderr[-4000:]}")
+    payload = json.loads(lines[-1][len(RESULT_MARKER):])
+    for entry in payload["results"]:
+        entry.update(scale=scale, mode=mode)
+    return payload
+
+
+def run(scales, workdir: str, pg_url: str = None, seed: int = 0, reuse: bool = False, detail: bool = False):
+    """Benchmark every scale; returns (results frame, {(scale, mode): per-table detail})."""
+    import pandas as pd
+    rows, details = [], {}
+    for scale in scales:
+        path = _dataset(workdir, scale, seed, reuse)
+        for mode in ["csv"] + (["postgres"] if pg_url else []):
+            payload = _spawn(path, scale, mode, pg_url, detail)
+            rows.extend(payload["results"])
+            if payload["detail"] is not None:
+                details[(scale, mode)] = pd.DataFrame(payload["detail"])
+    return pd.DataFrame(rows, columns=RESULT_COLS), details
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the data loaders on synthetic data.")
+    parser.add_argument("--scales", default="1,10", help="comma-separated multiples of production size")
+    parser.add_argument("--workdir", default=os.path.join(os.path.dirname(os.path.abspath(__file__)), "bench"),
+                        help="where synthetic datasets are written")
+    parser.add_argument("--pg-url", default=None, help="SQLAlchemy URL of a local Postgres (enables Postgres mode)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--reuse", action="store_true", help="reuse datasets already generated in --workdir")
+    parser.add_argument("--detail", action="store_true", help="also print p50/p95 per table and stage")
+    parser.add_argument("--output", default=None, help="also write the report to this file")
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--dir", help=argparse.SUPPRESS)
+    parser.add_argument("--mode", default="csv", choices=["csv", "postgres"], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        return _worker(args)
+
+    scales = [float(s) for s in args.scales.split(",") if s.strip()]
+    results, details = run(scales, args.workdir, args.pg_url, args.seed, args.reuse, args.detail)
+
+    report = [results.to_string(index=False)]
+    if not args.pg_url:
+        report.append("(Postgres mode skipped: pass --pg-url to run it)")
+    for (scale, mode), detail in details.items():
+        report.append(f"\n-- x{scale:g} {mode}: slowest tables and stages --\n{detail.head(20).to_string(index=False)}")
+    text = "\n".join(report)
+    print(text)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
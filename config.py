@@ -36,7 +36,7 @@ VERTICALS = {
             "dashboard", "map_explorer", "market_scoring",
             "location_performance", "product_intelligence",
             "expansion_intelligence", "ivf_analysis",
-            "data_explorer", "data_upload", "setup_guide"
+            "data_explorer", "data_upload", "setup_guide", "diagnostics"
         ],
         "sub_verticals": ["Gynoveda", "Custom Healthcare"],
         "scoring_dimensions": {
@@ -78,7 +78,7 @@ VERTICALS = {
             "dashboard", "map_explorer", "market_scoring",
             "location_performance", "product_intelligence",
             "expansion_intelligence",
-            "data_explorer", "data_upload", "setup_guide"
+            "data_explorer", "data_upload", "setup_guide", "diagnostics"
         ],
         "sub_verticals": ["Custom Fashion Brand"],
         "scoring_dimensions": {
@@ -120,7 +120,7 @@ VERTICALS = {
             "dashboard", "map_explorer", "market_scoring",
             "location_performance",
             "expansion_intelligence",
-            "data_explorer", "data_upload", "setup_guide"
+            "data_explorer", "data_upload", "setup_guide", "diagnostics"
         ],
         "sub_verticals": ["Custom Real Estate Developer"],
         "scoring_dimensions": {
@@ -162,7 +162,7 @@ VERTICALS = {
             "dashboard", "map_explorer", "market_scoring",
             "location_performance",
             "expansion_intelligence", "tenant_mix",
-            "data_explorer", "data_upload", "setup_guide"
+            "data_explorer", "data_upload", "setup_guide", "diagnostics"
         ],
         "sub_verticals": ["Custom Mall Developer"],
         "scoring_dimensions": {
@@ -204,7 +204,7 @@ VERTICALS = {
             "dashboard", "map_explorer", "market_scoring",
             "location_performance", "product_intelligence",
             "expansion_intelligence",
-            "data_explorer", "data_upload", "setup_guide"
+            "data_explorer", "data_upload", "setup_guide", "diagnostics"
         ],
         "sub_verticals": ["Custom F&B Brand"],
         "scoring_dimensions": {
@@ -258,15 +258,54 @@ def vertical_selector_options() -> list:
 # ── Universal Module Registry ────────────────────────────────────────
 
 MODULE_REGISTRY = {
-    "dashboard":                {"label": "Dashboard",              "icon": "🏠", "page": "streamlit_app.py"},
-    "map_explorer":             {"label": "Map Explorer",           "icon": "🗺️", "page": "pages/1_Map_Explorer.py"},
-    "market_scoring":           {"label": "Market Scoring",         "icon": "📊", "page": "pages/2_Market_Scoring.py"},
-    "location_performance":     {"label": "Location Performance",   "icon": "📍", "page": "pages/3_Location_Performance.py"},
-    "product_intelligence":     {"label": "Product Intelligence",   "icon": "📦", "page": "pages/4_Product_Intelligence.py"},
-    "expansion_intelligence":   {"label": "Expansion Intelligence", "icon": "🚀", "page": "pages/5_Expansion_Planner.py"},
-    "ivf_analysis":             {"label": "IVF Market Analysis",    "icon": "🧬", "page": "pages/6_IVF_Analysis.py"},
-    "tenant_mix":               {"label": "Tenant Mix Optimizer",   "icon": "🏪", "page": "pages/6_Tenant_Mix.py"},
-    "data_explorer":            {"label": "Data Explorer",          "icon": "📂", "page": "pages/7_Browse_Data.py"},
-    "data_upload":              {"label": "Upload & Refresh",       "icon": "📤", "page": "pages/8_Upload_Refresh.py"},
-    "setup_guide":              {"label": "Setup Guide",            "icon": "⚙️", "page": "pages/9_Configuration.py"},
+    "dashboard":                {"label": "Dashboard",              "icon": "🏠", "page": "streamlit_app.py",
+                                 "tables": ["master_state", "state_orders_summary", "state_clinic_summary",
+                                            "year_trend", "clinic_performance"]},
+    "map_explorer":             {"label": "Map Explorer",           "icon": "🗺️", "page": "pages/1_Map_Explorer.py",
+                                 "tables": ["master_state", "city_orders_summary", "city_clinic_summary",
+                                            "pincode_clinic", "clinic_performance"]},
+    "market_scoring":           {"label": "Market Scoring",         "icon": "📊", "page": "pages/2_Market_Scoring.py",
+                                 "tables": ["cei_district_scores", "census_district_demographics",
+                                            "census_hh_assets", "state_health_spending", "expansion_scores"]},
+    "location_performance":     {"label": "Location Performance",   "icon": "📍", "page": "pages/3_Location_Performance.py",
+                                 "tables": ["clinic_performance", "clinic_zip_summary", "clinic_monthly_trend",
+                                            "ntb_show_clinic", "ntb_zipdata_clinic"]},
+    "product_intelligence":     {"label": "Product Intelligence",   "icon": "📦", "page": "pages/4_Product_Intelligence.py",
+                                 "tables": ["product_state", "year_state_orders"]},
+    "expansion_intelligence":   {"label": "Expansion Intelligence", "icon": "🚀", "page": "pages/5_Expansion_Planner.py",
+                                 "tables": ["expansion_priority_tiers", "expansion_same_city", "expansion_new_city",
+                                            "revenue_projection_175", "revenue_city_rollup", "existing_clinics_61",
+                                            "implementation_roadmap", "web_order_demand"]},
+    "ivf_analysis":             {"label": "IVF Market Analysis",    "icon": "🧬", "page": "pages/6_IVF_Analysis.py",
+                                 "tables": ["ivf_competitor_map"]},
+    "tenant_mix":               {"label": "Tenant Mix Optimizer",   "icon": "🏪", "page": "pages/6_Tenant_Mix.py",
+                                 "tables": ["city_orders_summary", "infra_city"]},
+    "data_explorer":            {"label": "Data Explorer",          "icon": "📂", "page": "pages/7_Browse_Data.py",
+                                 "tables": []},
+    "data_upload":              {"label": "Upload & Refresh",       "icon": "📤", "page": "pages/8_Upload_Refresh.py",
+                                 "tables": []},
+    "setup_guide":              {"label": "Setup Guide",            "icon": "⚙️", "page": "pages/9_Configuration.py",
+                                 "tables": []},
+    "diagnostics":              {"label": "Diagnostics",            "icon": "⏱️", "page": "pages/10_Diagnostics.py",
+                                 "tables": []},
 }
+
+# Modules warmed first when a vertical is selected (landing pages).
+PREFETCH_FIRST = ["dashboard", "map_explorer"]
+
+
+def get_module_tables(module: str) -> list:
+    """Get the tables a module reads (its prefetch dependency list)."""
+    return MODULE_REGISTRY.get(module, {}).get("tables", [])
+
+def prefetch_plan(vertical_key: str) -> list:
+    """Ordered (module, tables) pairs to warm for a vertical; each table appears once."""
+    modules = get_modules(vertical_key)
+    ordered = [m for m in PREFETCH_FIRST if m in modules] + [m for m in modules if m not in PREFETCH_FIRST]
+    seen, plan = set(), []
+    for module in ordered:
+        tables = [t for t in get_module_tables(module) if t not in seen]
+        seen.update(tables)
+        if tables:
+            plan.append((module, tables))
+    return plan
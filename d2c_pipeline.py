@@ -0,0 +1,140 @@
+"""
+Expansion OS - Website D2C Demand Pipeline
+==========================================
+Streams the website first-time-customer export in fixed-size chunks and
+aggregates it per (City, State) without ever holding the whole file.
+
+Distinct customers are counted exactly (one set of IDs per city) or, for
+files whose distinct-ID count itself is too large, with a HyperLogLog
+sketch whose memory is fixed at 2**precision bytes per city.
+
+Usage:
+    from d2c_pipeline import aggregate_web_demand
+    df = aggregate_web_demand(WEB_FILE)                    # exact
+    df = aggregate_web_demand(WEB_FILE, distinct="hll")    # bounded memory
+"""
+
+import numpy as np
+import pandas as pd
+
+WEB_FILE = "First Time customer - website  (2020 - 2025).csv"
+
+GROUP_KEYS = ["City", "State"]
+WEB_USECOLS = ["City", "State", "Customer ID", "Total"]
+# Everything is read as text; Total is coerced per chunk like the old loader did.
+WEB_DTYPES = {"City": str, "State": str, "Customer ID": str, "Total": str}
+
+DEFAULT_CHUNKSIZE = 250_000
+
+
+# === HyperLogLog =====================================================
+
+def _bit_length(x: np.ndarray) -> np.ndarray:
+    """Exact bit length of each uint64 (0 -> 0), by binary search on shifts."""
+    n = np.zeros(x.shape, dtype=np.uint8)
+    for shift in (32, 16, 8, 4, 2, 1):
+        mask = x >= (np.uint64(1) << np.uint64(shift))
+        n[mask] += shift
+        x = np.where(mask, x >> np.uint64(shift), x)
+    return n + (x > 0)
+
+
+class HyperLogLog:
+    """Grouped HyperLogLog: one row of 2**precision uint8 registers per group."""
+
+    def __init__(self, precision: int = 12):
+        if not 4 <= precision <= 16:
+            raise ValueError("precision must be between 4 and 16")
+        self.p = precision
+        self.m = 1 << precision
+        self.registers = np.zeros((0, self.m), dtype=np.uint8)
+
+    def _grow(self, n_groups: int):
+        if n_groups > len(self.registers):
+            extra = max(n_groups, 2 * len(self.registers)) - len(self.registers)
+            self.registers = np.vstack([self.registers, np.zeros((extra, self.m), dtype=np.uint8)])
+
+    def add(self, group_codes: np.ndarray, values: pd.Series):
+        """Add values; group_codes[i] is the row that values[i] belongs to."""
+        if len(values) == 0:
+            return
+        self._grow(int(group_codes.max()) + 1)
+        h = pd.util.hash_pandas_object(values, index=False).to_numpy(dtype=np.uint64)
+        tail_bits = 64 - self.p
+        idx = (h >> np.uint64(tail_bits)).astype(np.int64)
+        w = h & np.uint64((1 << tail_bits) - 1)
+        rank = (tail_bits + 1 - _bit_length(w)).astype(np.uint8)
+        flat = self.registers.reshape(-1)
+        np.maximum.at(flat, group_codes.astype(np.int64) * self.m + idx, rank)
+
+    def estimate(self, n_groups: int) -> np.ndarray:
+        """Cardinality estimate for groups 0..n_groups-1."""
+        regs = self.registers[:n_groups].astype(np.float64)
+        alpha = 0.7213 / (1 + 1.079 / self.m)
+        raw = alpha * self.m ** 2 / np.power(2.0, -regs).sum(axis=1)
+        zeros = (regs == 0).sum(axis=1)
+        # Small-range correction (linear counting)
+        with np.errstate(divide="ignore"):
+            linear = self.m * np.log(self.m / np.maximum(zeros, 1))
+        return np.where((raw <= 2.5 * self.m) & (zeros > 0), linear, raw)
+
+
+# === Streaming aggregation ===========================================
+
+def aggregate_web_demand(path: str = WEB_FILE, chunksize: int = DEFAULT_CHUNKSIZE,
+                         distinct: str = "exact", hll_precision: int = 12) -> pd.DataFrame:
+    """Per-(City, State) distinct customers and revenue, read chunk by chunk.
+
+    Returns City, State, Online_1Cx_Volume, Est_Online_Revenue_Lacs sorted by
+    (City, State) - the same frame the in-memory groupby used to produce.
+    distinct="exact" keeps a set of Customer IDs per city; distinct="hll"
+    keeps a fixed-size sketch instead (~1.6% error at precision 12).
+    """
+    if distinct not in ("exact", "hll"):
+        raise ValueError(f"distinct must be 'exact' or 'hll', got {distinct!r}")
+
+    codes = {}                                  # (City, State) -> row
+    revenue = np.zeros(0, dtype=np.float64)
+    id_sets = []
+    sketch = HyperLogLog(hll_precision) if distinct == "hll" else None
+
+    for chunk in pd.read_csv(path, usecols=WEB_USECOLS, dtype=WEB_DTYPES, chunksize=chunksize):
+        chunk = chunk.dropna(subset=GROUP_KEYS)
+        if chunk.empty:
+            continue
+        total = pd.to_numeric(chunk["Total"], errors='coerce').fillna(0)
+
+        keys = pd.MultiIndex.from_frame(chunk[GROUP_KEYS])
+        local_codes, uniques = pd.factorize(keys)
+        row_of = np.empty(len(uniques), dtype=np.int64)
+        for i, key in enumerate(uniques):
+            row = codes.get(key)
+            if row is None:
+                row = codes[key] = len(codes)
+                id_sets.append(set())
+            row_of[i] = row
+        rows = row_of[local_codes]
+
+        if len(codes) > len(revenue):
+            revenue = np.concatenate([revenue, np.zeros(len(codes) - len(revenue))])
+        np.add.at(revenue, rows, total.to_numpy())
+
+        ids = chunk["Customer ID"]
+        has_id = ids.notna().to_numpy()
+        if sketch is not None:
+            sketch.add(rows[has_id], ids[has_id])
+        else:
+            pairs = pd.DataFrame({"row": rows[has_id], "id": ids[has_id].to_numpy()}).drop_duplicates()
+            for row, grp in pairs.groupby("row")["id"]:
+                id_sets[row].update(grp.to_numpy())
+
+    n = len(codes)
+    if sketch is not None:
+        volume = np.rint(sketch.estimate(n)).astype(np.int64) if n else np.zeros(0, dtype=np.int64)
+    else:
+        volume = np.array([len(s) for s in id_sets], dtype=np.int64)
+
+    df_pred = pd.DataFrame(list(codes.keys()), columns=GROUP_KEYS)
+    df_pred["Online_1Cx_Volume"] = volume
+    df_pred["Est_Online_Revenue_Lacs"] = revenue[:n] / 100000
+    return df_pred.sort_values(GROUP_KEYS).reset_index(drop=True)
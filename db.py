@@ -5,18 +5,31 @@ Dual-mode: Neon PostgreSQL (production) or local CSV (development).
 Supports multi-vertical data isolation via vertical_key prefix.
 
 Usage:
-    from db import load_table, save_table, is_db_mode, get_db_status
+    from db import load_table, load_tables, save_table, is_db_mode, get_db_status
     df = load_table("master_state")          # loads for current vertical
+    df = load_table("master_state", columns=["State"], where={"State": ["Delhi", "Goa"]})
+    frames = load_tables(["cei_district_scores", "census_hh_assets"])   # concurrent
     save_table("master_state", df)
 """
 
 import streamlit as st
 import pandas as pd
+import numpy as np
 import os
+import io
+import hashlib
 import json
+import re
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 
-DATA_DIR = os.path.join(os.path.dirname(__file__), "data")
+from metrics import note, record, timed
+
+# EXPANSION_DATA_DIR points the local store elsewhere (benchmark.py uses it for synthetic data)
+DATA_DIR = os.environ.get("EXPANSION_DATA_DIR") or os.path.join(os.path.dirname(__file__), "data")
 UPLOAD_LOG = os.path.join(DATA_DIR, "upload_log.json")
 
 # === All table definitions (name -> CSV filename) ====================
@@ -74,11 +87,103 @@ TABLE_MAP = {
     "show_pct_impact_comparison":   "show_pct_impact_comparison.csv",
 }
 
+# === Primary keys (name -> key columns) ==============================
+# Tables listed here support save_table(..., mode="upsert"). Key columns
+# must be present, non-null and unique in every upload.
+TABLE_KEYS = {
+    "clinic_monthly_trend":  ["Clinic", "Month"],
+    "ntb_zipdata_monthly":   ["Clinic", "Pincode", "Month"],
+    "year_state_orders":     ["Year", "State"],
+}
+
+# === Column schemas ==================================================
+# Dtypes applied when a table is parsed, instead of letting read_csv infer
+# object/int64/float64 every time. Repeated labels (geo names, periods)
+# become categoricals, shrinking the shared copy every session reads (see
+# the shared frame store below). Measures stay int64/float64: float32 sums
+# drift (1M x 1234.56 != 1234560000) and narrow ints would become the Neon
+# column types.
+# TABLE_SCHEMAS pins columns per table; other text columns become
+# categorical when their distinct/rows ratio is at most CATEGORY_MAX_RATIO
+# (so a unique District column in a per-district table stays text).
+
+CATEGORY_MAX_RATIO = 0.5
+
+TABLE_SCHEMAS = {
+    "clinic_monthly_trend":  {"Clinic": "category", "Month": "category"},
+    "ntb_zipdata_monthly":   {"Clinic": "category", "Pincode": "Int32", "Month": "category"},
+    "ntb_zipdata_clinic":    {"Clinic": "category", "Pincode": "Int32"},
+    "year_state_orders":     {"Year": "Int16", "State": "category"},
+    "pincode_clinic":        {"Pincode": "Int32", "Clinic": "category"},
+    "clinic_zip_summary":    {"Pincode": "Int32", "Clinic": "category"},
+}
+
+
+def table_schema(table_name: str, columns) -> dict:
+    """Declared {column: dtype} for the given columns of a table."""
+    declared = TABLE_SCHEMAS.get(table_name, {})
+    return {c: declared[c] for c in columns if c in declared}
+
+
+def apply_schema(df: pd.DataFrame, table_name: str) -> pd.DataFrame:
+    """Cast a parsed frame to its schema and turn repeated labels into categoricals.
+
+    Casts that do not fit the data (e.g. text in a declared Int32 column)
+    leave that column as parsed.
+    """
+    if df.empty:
+        return df
+    schema = table_schema(table_name, df.columns)
+    out = {}
+    for col in df.columns:
+        s = df[col]
+        dtype = schema.get(col)
+        try:
+            if dtype is not None:
+                if str(s.dtype) != dtype:
+                    s = s.astype(dtype)
+            elif pd.api.types.is_object_dtype(s) or pd.api.types.is_string_dtype(s):
+                if s.nunique(dropna=True) <= CATEGORY_MAX_RATIO * len(s):
+                    s = s.astype("category")
+        except (TypeError, ValueError):
+            s = df[col]
+        out[col] = s
+    typed = pd.DataFrame(out, index=df.index)
+    typed.attrs = df.attrs
+    return typed
+
+
+def _neon_dtypes(df: pd.DataFrame) -> pd.DataFrame:
+    """df with integer columns as int64 and floats as float64, for creating Neon tables.
+
+    to_sql derives column types from dtypes; a declared Int16/Int32 key must
+    not become a SMALLINT/INTEGER column that later upserts overflow.
+    """
+    wide = {}
+    for col in df.columns:
+        s = df[col]
+        if pd.api.types.is_bool_dtype(s):
+            pass
+        elif pd.api.types.is_integer_dtype(s):
+            s = s.astype("Int64" if isinstance(s.dtype, pd.api.extensions.ExtensionDtype) else "int64")
+        elif pd.api.types.is_float_dtype(s):
+            s = s.astype("float64")
+        wide[col] = s
+    return pd.DataFrame(wide, index=df.index)
+
+
+def _read_csv_typed(table_name: str, csv_path: str, usecols=None) -> pd.DataFrame:
+    """read_csv with the table's categoricals parsed directly, then apply_schema."""
+    header = pd.read_csv(csv_path, nrows=0).columns
+    parse = {c: t for c, t in table_schema(table_name, header).items() if t == "category"}
+    df = pd.read_csv(csv_path, usecols=usecols, dtype=parse or None)
+    return apply_schema(df, table_name)
+
 
 # === Connection detection ============================================
 
 def _get_neon_url():
-    """Extract Neon connection URL from Streamlit secrets."""
+    """Extract Neon connection URL from Streamlit secrets, else the NEON_DATABASE_URL env var."""
     try:
         if hasattr(st, 'secrets'):
             if "connections" in st.secrets and "neon" in st.secrets["connections"]:
@@ -89,7 +194,7 @@ def _get_neon_url():
                 return st.secrets["NEON_DATABASE_URL"]
     except Exception:
         pass
-    return None
+    return os.environ.get("NEON_DATABASE_URL") or None
 
 
 def is_db_mode():
@@ -101,25 +206,319 @@ def get_db_status():
     """Returns connection status info dict."""
     neon_url = _get_neon_url()
     if neon_url:
-        import re
         masked = re.sub(r'://([^:]+):([^@]+)@', r'://\1:****@', neon_url)
-        return {"mode": "Neon PostgreSQL", "connected": True, "url_masked": masked, "icon": "🟢"}
-    return {"mode": "Local CSV (dev)", "connected": False, "url_masked": "N/A", "icon": "📁"}
+        breaker = breaker_status()
+        if breaker["state"] == "open":
+            return {"mode": "Neon unreachable - serving local data", "connected": False, "url_masked": masked,
+                    "icon": "🟠", "breaker": breaker}
+        return {"mode": "Neon PostgreSQL", "connected": True, "url_masked": masked, "icon": "🟢", "breaker": breaker}
+    return {"mode": "Local CSV (dev)", "connected": False, "url_masked": "N/A", "icon": "📁", "breaker": None}
 
 
 # === Neon engine (cached) ===========================================
 
+POOL_SIZE = 3
+MAX_OVERFLOW = 5
+CONNECT_TIMEOUT = 5   # seconds per connection attempt (psycopg2)
+
 @st.cache_resource
-def _get_engine():
-    """Create and cache a SQLAlchemy engine for Neon."""
+def _create_engine():
+    """Create and cache a SQLAlchemy engine for Neon, warming its pool in the background."""
     from sqlalchemy import create_engine
+    from sqlalchemy.engine import make_url
     url = _get_neon_url()
     if not url:
         return None
     if "sslmode" not in url:
         sep = "&" if "?" in url else "?"
         url += f"{sep}sslmode=require"
-    return create_engine(url, pool_size=3, max_overflow=5, pool_pre_ping=True)
+    connect_args = {}
+    if make_url(url).get_driver_name() == "psycopg2":
+        connect_args["connect_timeout"] = CONNECT_TIMEOUT
+    engine = create_engine(url, pool_size=POOL_SIZE, max_overflow=MAX_OVERFLOW, pool_pre_ping=True,
+                           connect_args=connect_args)
+    threading.Thread(target=_warm_up, args=(engine,), daemon=True).start()
+    return engine
+
+
+def _get_engine():
+    """The Neon engine, or None in local mode and while the circuit breaker is open."""
+    if _breaker["state"] == "open":
+        return None
+    return _create_engine()
+
+
+# === Circuit breaker =================================================
+# After BREAKER_THRESHOLD consecutive connection failures the breaker opens
+# and _get_engine() returns None, so every read goes straight to the local
+# store instead of waiting out one connect timeout per table. A background
+# probe retries Neon every BREAKER_PROBE_INTERVAL seconds and closes the
+# breaker on its first success. Writes retry connection failures with
+# exponential backoff while the breaker is closed; a table saved while Neon
+# is unreachable is queued and pushed by the probe once it reconnects.
+
+BREAKER_THRESHOLD = 3
+BREAKER_PROBE_INTERVAL = 30   # seconds
+WRITE_RETRIES = 3
+WRITE_BACKOFF = 0.5           # seconds before the first retry, doubled after each
+
+_breaker = {"state": "closed", "failures": 0, "opened_at": None, "last_error": None}
+_breaker_lock = threading.Lock()
+_pending_sync = set()       # tables saved locally while Neon was unreachable
+
+
+def _is_connection_error(exc: Exception) -> bool:
+    """True for failures to reach Neon, as opposed to errors in the SQL itself.
+
+    Pool checkout timeouts (sqlalchemy.exc.TimeoutError) are not counted: they
+    mean the app's own concurrency exhausted the pool, not that Neon is down.
+    """
+    try:
+        from sqlalchemy import exc as sa_exc
+        if isinstance(exc, sa_exc.TimeoutError):
+            return False
+        if isinstance(exc, (sa_exc.OperationalError, sa_exc.InterfaceError, sa_exc.DisconnectionError)):
+            return True
+    except ImportError:
+        pass
+    return isinstance(exc, (OSError, TimeoutError)) or type(exc).__name__ in ("OperationalError", "InterfaceError")
+
+
+def _record_success():
+    if _breaker["failures"]:
+        with _breaker_lock:
+            _breaker["failures"] = 0
+
+
+def _record_failure(exc: Exception):
+    """Count a connection failure; open the breaker at BREAKER_THRESHOLD."""
+    if not _is_connection_error(exc):
+        return
+    with _breaker_lock:
+        _breaker["failures"] += 1
+        _breaker["last_error"] = str(exc).strip().splitlines()[0][:200] if str(exc).strip() else type(exc).__name__
+        if _breaker["state"] == "closed" and _breaker["failures"] >= BREAKER_THRESHOLD:
+            _breaker["state"] = "open"
+            _breaker["opened_at"] = time.time()
+            threading.Thread(target=_probe_until_healthy, daemon=True).start()
+
+
+def _ping(engine):
+    from sqlalchemy import text
+    with engine.connect() as conn:
+        conn.execute(text("SELECT 1"))
+
+
+def _probe_until_healthy():
+    """Background probe while the breaker is open; closes it once Neon answers."""
+    while True:
+        time.sleep(BREAKER_PROBE_INTERVAL)
+        try:
+            _ping(_create_engine())
+        except Exception as e:
+            with _breaker_lock:
+                _breaker["last_error"] = str(e).strip().splitlines()[0][:200] if str(e).strip() else type(e).__name__
+            continue
+        with _breaker_lock:
+            _breaker.update(state="closed", failures=0, opened_at=None)
+        refresh_catalog()
+        refresh_versions()
+        _push_pending()
+        return
+
+
+def _defer_write(table_name: str, reason: str = "Neon is unreachable"):
+    """Queue a locally saved table for the probe to push, and say so."""
+    with _breaker_lock:
+        _pending_sync.add(table_name)
+    st.warning(f"{reason} - {table_name} was saved locally and will be pushed to Neon when it reconnects.")
+
+
+def _push_pending():
+    """Push tables saved while the breaker was open; failures stay queued."""
+    with _breaker_lock:
+        tables = sorted(_pending_sync)
+    if not tables:
+        return
+    try:
+        reports = sync_to_neon(tables=tables)
+    except Exception:
+        return
+    with _breaker_lock:
+        _pending_sync.difference_update(r["table"] for r in reports if r["error"] is None)
+
+
+def _warm_up(engine):
+    """Open POOL_SIZE connections (waking a suspended Neon compute) and load the catalog."""
+    try:
+        with ThreadPoolExecutor(max_workers=POOL_SIZE) as pool:
+            list(pool.map(lambda _: _ping(engine), range(POOL_SIZE)))
+        _record_success()
+        refresh_catalog()
+    except Exception as e:
+        _record_failure(e)
+
+
+def _with_retry(fn, *args, **kwargs):
+    """Run a Neon write, retrying connection failures with backoff (WRITE_RETRIES attempts)."""
+    for attempt in range(WRITE_RETRIES):
+        try:
+            result = fn(*args, **kwargs)
+            _record_success()
+            return result
+        except Exception as e:
+            _record_failure(e)
+            if not _is_connection_error(e) or attempt == WRITE_RETRIES - 1 or _breaker["state"] == "open":
+                raise
+            time.sleep(WRITE_BACKOFF * 2 ** attempt)
+
+
+def breaker_status() -> dict:
+    """Circuit breaker state: {state, failures, last_error, open_for_s, pending}."""
+    with _breaker_lock:
+        b = dict(_breaker)
+        b["pending"] = sorted(_pending_sync)
+    opened = b.pop("opened_at")
+    b["open_for_s"] = round(time.time() - opened, 1) if opened else 0.0
+    return b
+
+
+# === Neon table catalog ==============================================
+# One round trip returns existence, approximate row count and a change
+# marker for every table in the schema; load_table consults this instead of
+# probing information_schema per call.
+
+CATALOG_TTL = 300  # seconds; table versions are polled more often (VERSION_TTL)
+
+# Per-table sync metadata kept in Neon itself, so every container agrees on
+# what the database currently holds.
+META_TABLE = "_table_meta"
+
+_META_DDL = f"""
+    CREATE TABLE IF NOT EXISTS {META_TABLE} (
+        table_name   TEXT PRIMARY KEY,
+        content_hash TEXT,
+        rows         BIGINT,
+        bytes        BIGINT,
+        version      BIGINT NOT NULL DEFAULT 0,
+        updated_at   TIMESTAMPTZ NOT NULL DEFAULT now()
+    )
+"""
+
+_META_UPSERT = f"""
+    INSERT INTO {META_TABLE} (table_name, content_hash, rows, bytes, version, updated_at)
+    VALUES (%(table)s, %(content_hash)s, %(rows)s, %(bytes)s, 1, now())
+    ON CONFLICT (table_name) DO UPDATE
+    SET content_hash = EXCLUDED.content_hash, rows = EXCLUDED.rows, bytes = EXCLUDED.bytes,
+        version = {META_TABLE}.version + 1, updated_at = now()
+"""
+
+_CATALOG_SQL = f"""
+    SELECT c.relname                                          AS table_name,
+           c.oid::bigint                                      AS relid,
+           COALESCE(m.rows, s.n_live_tup, GREATEST(c.reltuples, 0))::bigint AS row_count,
+           COALESCE(s.n_tup_ins + s.n_tup_upd + s.n_tup_del, 0)::bigint AS n_mod,
+           (SELECT json_agg(json_build_array(a.attname, format_type(a.atttypid, a.atttypmod))
+                            ORDER BY a.attnum)
+            FROM pg_attribute a
+            WHERE a.attrelid = c.oid AND a.attnum > 0 AND NOT a.attisdropped) AS columns,
+           m.content_hash,
+           COALESCE(m.version, 0)                             AS version
+    FROM pg_class c
+    JOIN pg_namespace n ON n.oid = c.relnamespace
+    LEFT JOIN pg_stat_user_tables s ON s.relid = c.oid
+    LEFT JOIN {{meta}} m ON m.table_name = c.relname
+    WHERE n.nspname = current_schema() AND c.relkind IN ('r', 'p') AND c.relname <> '{META_TABLE}'
+"""
+
+# Stands in for the metadata table until a write creates it (reads never run DDL)
+_NO_META = "(SELECT NULL::text AS table_name, NULL::bigint AS rows, NULL::text AS content_hash, " \
+           "NULL::bigint AS version WHERE false)"
+
+_catalog = {"tables": None, "fetched_at": 0.0, "meta_ready": False}
+_catalog_lock = threading.Lock()
+_meta_lock = threading.Lock()
+
+
+def _meta_exists(conn) -> bool:
+    from sqlalchemy import text
+    return conn.execute(text("SELECT to_regclass(:t) IS NOT NULL"), {"t": META_TABLE}).scalar()
+
+
+def _ensure_meta_table(engine):
+    """Create the metadata table, once per process; called from the write paths only."""
+    if _catalog["meta_ready"]:
+        return
+    from sqlalchemy import text
+    with _meta_lock:
+        if _catalog["meta_ready"]:
+            return
+        try:
+            with engine.begin() as conn:
+                conn.execute(text(_META_DDL))
+        except Exception as e:
+            if _is_connection_error(e):
+                raise
+            # A concurrent CREATE TABLE IF NOT EXISTS from another container can fail; fine if it exists now
+            with engine.connect() as conn:
+                if not _meta_exists(conn):
+                    raise
+        _catalog["meta_ready"] = True
+
+
+def _fetch_catalog(engine) -> dict:
+    """Query the catalog for all tables.
+
+    {name: {exists, rows, marker, columns, content_hash, version}}. Read-only:
+    until a write has created the metadata table, hashes are None and
+    versions 0.
+    """
+    from sqlalchemy import text
+    with engine.connect() as conn:
+        has_meta = _catalog["meta_ready"] or _meta_exists(conn)
+        result = conn.execute(text(_CATALOG_SQL.format(meta=META_TABLE if has_meta else _NO_META))).fetchall()
+    if has_meta:
+        _catalog["meta_ready"] = True
+    tables = {name: {"exists": False, "rows": 0, "marker": None, "columns": {},
+                     "content_hash": None, "version": 0} for name in TABLE_MAP}
+    for name, relid, rows, n_mod, columns, content_hash, version in result:
+        if isinstance(columns, str):
+            columns = json.loads(columns)
+        # relid changes when a table is dropped & recreated; n_mod on every write
+        tables[name] = {"exists": True, "rows": int(rows), "marker": f"{relid}:{n_mod}",
+                        "columns": {col: pg_type for col, pg_type in (columns or [])},
+                        "content_hash": content_hash, "version": int(version)}
+    return tables
+
+
+def refresh_catalog() -> dict:
+    """Re-fetch the Neon table catalog. Returns {} if Neon is unavailable."""
+    engine = _get_engine()
+    if engine is None:
+        return {}
+    try:
+        tables = _fetch_catalog(engine)
+        _record_success()
+    except Exception as e:
+        _record_failure(e)
+        tables = None
+    with _catalog_lock:
+        _catalog["tables"] = tables
+        _catalog["fetched_at"] = time.time()
+    return tables or {}
+
+
+def get_catalog() -> dict:
+    """Return the cached Neon catalog, refreshing it once it is CATALOG_TTL old."""
+    with _catalog_lock:
+        tables, fetched_at = _catalog["tables"], _catalog["fetched_at"]
+    if tables is None or time.time() - fetched_at > CATALOG_TTL:
+        return refresh_catalog()
+    return tables
+
+
+def _neon_has_table(table_name: str) -> bool:
+    return get_catalog().get(table_name, {}).get("exists", False)
 
 
 def _ensure_neon_table(table_name: str, df: pd.DataFrame):
@@ -127,71 +526,909 @@ def _ensure_neon_table(table_name: str, df: pd.DataFrame):
     engine = _get_engine()
     if engine is None:
         return
-    from sqlalchemy import text
-    with engine.connect() as conn:
-        exists = conn.execute(
-            text("SELECT EXISTS(SELECT 1 FROM information_schema.tables WHERE table_name=:t)"),
-            {"t": table_name}
-        ).scalar()
-        if not exists and not df.empty:
-            df.to_sql(table_name, engine, if_exists="replace", index=False)
+    if not _neon_has_table(table_name) and not df.empty:
+        _neon_dtypes(df).to_sql(table_name, engine, if_exists="replace", index=False)
+        _after_write()
 
 
-# === Public API ======================================================
+# === Arrow fetch path ================================================
+# Reads stream through COPY ... TO STDOUT (CSV) into pyarrow's incremental
+# CSV reader, typed from the catalog, instead of materialising one Python
+# object per cell through read_sql_table. Projection and filters are pushed
+# into the COPY query.
+
+ARROW_BLOCK_SIZE = 4 << 20  # bytes of CSV per Arrow record batch
+
+
+def _quote_ident(name: str) -> str:
+    return '"' + str(name).replace('"', '""') + '"'
+
+
+def _arrow_type(pg_type: str):
+    """Map a Postgres format_type() name to the Arrow type to parse it as."""
+    import pyarrow as pa
+    t = pg_type.lower()
+    if t in ("bigint", "integer", "smallint"):
+        return pa.int64()
+    if t in ("double precision", "real") or t.startswith("numeric"):
+        return pa.float64()
+    if t == "boolean":
+        return pa.bool_()
+    if t.startswith("timestamp") or t == "date":
+        return pa.timestamp("us")
+    return pa.string()
+
+
+def _select_sql(table_name: str, columns=None, where=None):
+    """Build SELECT text and bind params. where: {col: value | list of values}."""
+    cols = ", ".join(_quote_ident(c) for c in columns) if columns else "*"
+    sql = f"SELECT {cols} FROM {_quote_ident(table_name)}"
+    params = {}
+    clauses = []
+    for i, (col, value) in enumerate((where or {}).items()):
+        key = f"w{i}"
+        if isinstance(value, (list, tuple, set)):
+            clauses.append(f"{_quote_ident(col)} = ANY(%({key})s)")
+            params[key] = list(value)
+        elif value is None:
+            clauses.append(f"{_quote_ident(col)} IS NULL")
+        else:
+            clauses.append(f"{_quote_ident(col)} = %({key})s")
+            params[key] = value
+    if clauses:
+        sql += " WHERE " + " AND ".join(clauses)
+    return sql, params
+
+
+def _read_neon_arrow(engine, table_name: str, columns=None, where=None):
+    """Stream a (projected, filtered) table from Neon into a pyarrow.Table."""
+    import pyarrow as pa
+    import pyarrow.csv as pacsv
+
+    coltypes = get_catalog().get(table_name, {}).get("columns", {})
+    cols = [c for c in columns if c in coltypes] if columns else list(coltypes)
+    if not cols:
+        return pa.table({})
+    sql, params = _select_sql(table_name, cols, where)
+
+    raw = engine.raw_connection()
+    try:
+        cur = raw.cursor()
+        copy_sql = "COPY (" + cur.mogrify(sql, params).decode() + ") TO STDOUT WITH (FORMAT csv, HEADER true)"
+        read_fd, write_fd = os.pipe()
+        errors = []
+
+        def _produce():
+            try:
+                with os.fdopen(write_fd, "wb") as sink:
+                    cur.copy_expert(copy_sql, sink)
+            except Exception as e:      # BrokenPipe if the reader bailed out first
+                errors.append(e)
+
+        producer = threading.Thread(target=_produce, daemon=True)
+        producer.start()
+        with os.fdopen(read_fd, "rb") as source:
+            reader = pacsv.open_csv(
+                source,
+                read_options=pacsv.ReadOptions(block_size=ARROW_BLOCK_SIZE),
+                convert_options=pacsv.ConvertOptions(
+                    column_types={c: _arrow_type(coltypes[c]) for c in cols},
+                    true_values=["t"],
+                    false_values=["f"],
+                    strings_can_be_null=True,
+                    quoted_strings_can_be_null=False,
+                ),
+            )
+            table = reader.read_all()
+        producer.join()
+        if errors:
+            raise errors[0]
+        raw.commit()
+        return table
+    finally:
+        raw.close()
+
+
+def _arrow_read_unsupported(exc: Exception) -> bool:
+    """True when the Arrow/COPY path itself cannot do the read.
+
+    That is a driver without mogrify/copy_expert, no pyarrow, or a column
+    Arrow cannot parse. Connection errors and timeouts are not: they go
+    straight to the breaker instead of costing a second, plain-SELECT attempt.
+    """
+    try:
+        import pyarrow as pa
+        if isinstance(exc, pa.ArrowException):
+            return True
+    except ImportError:
+        pass
+    return isinstance(exc, (ImportError, AttributeError, NotImplementedError, TypeError, ValueError))
+
+
+def _read_neon(engine, table_name: str, columns=None, where=None) -> pd.DataFrame:
+    """Arrow/COPY read, falling back to a plain SELECT for non-psycopg2 drivers."""
+    try:
+        return _read_neon_arrow(engine, table_name, columns, where).to_pandas()
+    except Exception as e:
+        if not _arrow_read_unsupported(e):
+            raise
+        if not columns and not where:
+            return pd.read_sql_table(table_name, engine)
+        from sqlalchemy import text
+        sql, params = _select_sql(table_name, columns, where)
+        sql = re.sub(r"%\((\w+)\)s", r":\1", sql)
+        return pd.read_sql_query(text(sql), engine, params=params)
+
+
+# === Bulk writer =====================================================
+# Replaces stream the frame through COPY FROM STDIN into a staging table and
+# swap it over the live table in the same transaction, so readers see either
+# the old table or the complete new one - never a missing or partial table.
+
+COPY_CHUNK_ROWS = 100_000
+
+
+class _NoCopySupport(Exception):
+    """The DBAPI cursor has no copy_expert; callers fall back to plain INSERTs."""
+
+
+def _copy_into(cursor, table_name: str, df: pd.DataFrame):
+    """COPY a DataFrame into an existing table, COPY_CHUNK_ROWS rows at a time."""
+    cols = ", ".join(_quote_ident(c) for c in df.columns)
+    copy_sql = f"COPY {_quote_ident(table_name)} ({cols}) FROM STDIN WITH (FORMAT csv)"
+    for start in range(0, len(df), COPY_CHUNK_ROWS):
+        buf = io.StringIO()
+        df.iloc[start:start + COPY_CHUNK_ROWS].to_csv(buf, index=False, header=False)
+        buf.seek(0)
+        cursor.copy_expert(copy_sql, buf)
+
+
+def _write_meta(cursor, table_name: str, content_hash: str, rows: int, nbytes: int):
+    """Record a completed write in the metadata table (bumps the version)."""
+    cursor.execute(_META_UPSERT, {"table": table_name, "content_hash": content_hash,
+                                  "rows": rows, "bytes": nbytes})
+
+
+def _meta_for_write(engine, meta: dict):
+    """meta, or None when the metadata table cannot be created.
+
+    Connection errors propagate to the caller's _with_retry and breaker like
+    any other write failure; other errors (e.g. no CREATE privilege) let the
+    write go ahead without its version row.
+    """
+    if meta is None:
+        return None
+    try:
+        _ensure_meta_table(engine)
+    except Exception as e:
+        if _is_connection_error(e):
+            raise
+        return None
+    return meta
+
+
+def _bulk_write(engine, table_name: str, df: pd.DataFrame, mode: str = "replace", meta: dict = None):
+    """Write df to Neon via COPY. mode: "replace" (staging swap) or "append".
+
+    meta: optional {content_hash, bytes}, recorded in the metadata table in
+    the same transaction as the data. Falls back to DataFrame.to_sql for
+    drivers without copy_expert.
+    """
+    meta = _meta_for_write(engine, meta)
+    if mode in ("replace", "append"):
+        try:
+            with engine.begin() as conn:
+                cursor = conn.connection.cursor()
+                if not hasattr(cursor, "copy_expert"):
+                    raise _NoCopySupport(table_name)
+                live = _quote_ident(table_name)
+                appended = False
+                if mode == "append":
+                    # Checked inside the transaction: a stale catalog must never turn an append into a replace
+                    cursor.execute("SELECT to_regclass(%s)", (live,))
+                    if cursor.fetchone()[0] is not None:
+                        _copy_into(cursor, table_name, df)
+                        appended = True
+                if not appended:
+                    staging = f"{table_name[:40]}__stg_{uuid.uuid4().hex[:8]}"
+                    _neon_dtypes(df.head(0)).to_sql(staging, conn, index=False)
+                    _copy_into(cursor, staging, df)
+                    conn.exec_driver_sql(f"DROP TABLE IF EXISTS {live}")
+                    conn.exec_driver_sql(f"ALTER TABLE {_quote_ident(staging)} RENAME TO {live}")
+                if meta is not None:
+                    # After an append the exact row count is unknown; the catalog falls back to stats
+                    _write_meta(cursor, table_name, meta.get("content_hash"),
+                                None if appended else len(df), meta.get("bytes"))
+            return
+        except _NoCopySupport:
+            pass
+
+    _neon_dtypes(df).to_sql(table_name, engine, if_exists=mode, index=False)
+    if meta is not None:
+        with engine.begin() as conn:
+            _write_meta(conn.connection.cursor(), table_name, meta.get("content_hash"),
+                        len(df) if mode == "replace" else None, meta.get("bytes"))
+
+
+# === Keyed upsert ====================================================
+# mode="upsert" diffs the upload against the stored version on TABLE_KEYS and
+# applies only the inserted, updated and deleted rows: appended to the local
+# CSV when nothing else changed, and merged into Neon with
+# INSERT ... ON CONFLICT plus a keyed DELETE.
+
+def _normalize_frame(df: pd.DataFrame) -> pd.DataFrame:
+    """Round-trip through CSV so the frame has the dtypes the local store would give it."""
+    return pd.read_csv(io.StringIO(df.to_csv(index=False)))
+
+
+def _row_hashes(df: pd.DataFrame, value_cols: list, numeric: set) -> pd.Series:
+    """Per-row hash of the non-key columns, insensitive to int/float drift."""
+    if not value_cols:
+        return pd.Series(0, index=df.index, dtype="uint64")
+    canon = pd.DataFrame({c: df[c].astype("float64") if c in numeric else df[c].astype(str)
+                          for c in value_cols})
+    return pd.util.hash_pandas_object(canon, index=False)
+
+
+def _row_delta(stored: pd.DataFrame, new: pd.DataFrame, keys: list, delete_missing: bool = True) -> dict:
+    """Row-level delta of `new` against `stored` on `keys`.
+
+    Returns {upserts, deletes, inserted, updated, deleted, result} where
+    upserts are the new/changed rows, deletes the key frame of removed rows
+    and result the table after the delta is applied.
+    """
+    new = new[list(stored.columns)]
+    value_cols = [c for c in stored.columns if c not in keys]
+    numeric = {c for c in value_cols if pd.api.types.is_numeric_dtype(stored[c])
+               and pd.api.types.is_numeric_dtype(new[c]) and not pd.api.types.is_bool_dtype(new[c])}
+
+    stored_idx = pd.MultiIndex.from_frame(stored[keys])
+    new_idx = pd.MultiIndex.from_frame(new[keys])
+    stored_hash = pd.Series(_row_hashes(stored, value_cols, numeric).to_numpy(), index=stored_idx)
+    new_hash = _row_hashes(new, value_cols, numeric).to_numpy()
+
+    existing = new_idx.isin(stored_idx)
+    changed = existing.copy()
+    changed[existing] = stored_hash.reindex(new_idx[existing]).to_numpy() != new_hash[existing]
+    upserts = new[~existing | changed]
+
+    removed = ~stored_idx.isin(new_idx) if delete_missing else np.zeros(len(stored), dtype=bool)
+    deletes = stored.loc[removed, keys]
+
+    if delete_missing:
+        result = new
+    else:
+        keep = ~stored_idx.isin(pd.MultiIndex.from_frame(upserts[keys]))
+        result = pd.concat([stored[keep], upserts], ignore_index=True)
+    return {"upserts": upserts, "deletes": deletes, "inserted": int((~existing).sum()),
+            "updated": int(changed.sum()), "deleted": int(removed.sum()), "result": result}
+
+
+def _apply_delta(engine, table_name: str, keys: list, delta: dict, meta: dict):
+    """Merge a delta into a Neon table in one transaction (ON CONFLICT upsert + keyed delete)."""
+    meta = _meta_for_write(engine, meta)
+    with engine.begin() as conn:
+        cursor = conn.connection.cursor()
+        if not hasattr(cursor, "copy_expert"):
+            raise _NoCopySupport(table_name)
+        live = _quote_ident(table_name)
+        key_cols = ", ".join(_quote_ident(k) for k in keys)
+        cursor.execute(f"CREATE UNIQUE INDEX IF NOT EXISTS {_quote_ident(table_name[:50] + '__pk')} "
+                       f"ON {live} ({key_cols})")
+
+        upserts = delta["upserts"]
+        if len(upserts):
+            cols = ", ".join(_quote_ident(c) for c in upserts.columns)
+            value_cols = [c for c in upserts.columns if c not in keys]
+            on_conflict = ("DO UPDATE SET " + ", ".join(f"{_quote_ident(c)} = EXCLUDED.{_quote_ident(c)}"
+                                                       for c in value_cols)) if value_cols else "DO NOTHING"
+            cursor.execute(f"CREATE TEMP TABLE _upsert_rows (LIKE {live}) ON COMMIT DROP")
+            _copy_into(cursor, "_upsert_rows", upserts)
+            cursor.execute(f"INSERT INTO {live} ({cols}) SELECT {cols} FROM _upsert_rows "
+                           f"ON CONFLICT ({key_cols}) {on_conflict}")
+
+        deletes = delta["deletes"]
+        if len(deletes):
+            cursor.execute(f"CREATE TEMP TABLE _delete_keys ON COMMIT DROP AS "
+                           f"SELECT {key_cols} FROM {live} WHERE false")
+            _copy_into(cursor, "_delete_keys", deletes)
+            match = " AND ".join(f"t.{_quote_ident(k)} = d.{_quote_ident(k)}" for k in keys)
+            cursor.execute(f"DELETE FROM {live} t USING _delete_keys d WHERE {match}")
+
+        if meta is not None:
+            _write_meta(cursor, table_name, meta.get("content_hash"), len(delta["result"]), meta.get("bytes"))
 
-@st.cache_data(ttl=300)
-def load_table(table_name: str) -> pd.DataFrame:
-    """Load a table - from Neon if configured, else from local CSV."""
+
+def _valid_keys(df: pd.DataFrame, keys: list) -> bool:
+    return all(k in df.columns for k in keys) and not df[keys].isna().any().any() \
+        and not df.duplicated(subset=keys).any()
+
+
+def _stored_for_upsert(table_name: str, csv_path: str):
+    """The stored copy an upsert diffs against: the local CSV, else the Neon table.
+
+    Returns (frame, from_neon); frame is None only when the table exists
+    nowhere yet. Raises RuntimeError when Neon holds (or may hold) the
+    table but cannot be read - diffing against nothing would drop its rows.
+    """
+    if os.path.exists(csv_path):
+        return pd.read_csv(csv_path), False
     engine = _get_engine()
+    if engine is None:
+        if is_db_mode():
+            raise RuntimeError(f"Neon is unreachable - {table_name} cannot be upserted until it is back.")
+        return None, False
+    catalog = refresh_catalog()
+    if _catalog["tables"] is None:
+        raise RuntimeError(f"Neon catalog unavailable - {table_name} cannot be upserted until it is back.")
+    if not catalog.get(table_name, {}).get("exists"):
+        return None, False
+    try:
+        stored = _read_neon(engine, table_name)
+        _record_success()
+    except Exception as e:
+        _record_failure(e)
+        raise RuntimeError(f"Could not read {table_name} from Neon to upsert against: {e}") from e
+    return _normalize_frame(stored), True
+
+
+def _save_upsert(table_name: str, df: pd.DataFrame, delete_missing: bool = True):
+    """save_table(mode="upsert"). Returns the delta summary.
+
+    Never replaces an existing table: a schema change or bad keys raise
+    ValueError and nothing is written (use mode="replace" to change the
+    schema). A table that exists nowhere yet is written as its first version.
+    """
+    keys = TABLE_KEYS.get(table_name)
+    if not keys:
+        raise ValueError(f"{table_name} has no key columns in TABLE_KEYS - upsert not supported.")
+    csv_path = os.path.join(DATA_DIR, TABLE_MAP.get(table_name, f"{table_name}.csv"))
+    new = _normalize_frame(df)
+    if not _valid_keys(new, keys):
+        raise ValueError(f"Key columns {keys} must be present, non-null and unique in the {table_name} upload.")
+
+    stored, from_neon = _stored_for_upsert(table_name, csv_path)
+    if stored is None:
+        save_table(table_name, df, mode="replace")
+        return {"inserted": len(df), "updated": 0, "deleted": 0}
+    if set(stored.columns) != set(new.columns):
+        added, dropped = sorted(set(new.columns) - set(stored.columns)), sorted(set(stored.columns) - set(new.columns))
+        raise ValueError(f"Upload columns differ from the stored {table_name} (added {added}, missing {dropped}) - "
+                         f"nothing was written. Use mode=\"replace\" to change the schema.")
+    if not _valid_keys(stored, keys):
+        raise ValueError(f"Stored {table_name} has null or duplicate {keys} - nothing was written.")
+
+    # Neon can only take a delta if it currently mirrors the stored copy
+    engine = _get_engine()
+    entry = get_catalog().get(table_name, {}) if engine is not None else {}
+    neon_in_sync = from_neon or (entry.get("exists") and entry.get("content_hash") == _file_sha256(csv_path)
+                                 and set(entry.get("columns", {})) == set(new.columns))
+
+    delta = _row_delta(stored, new, keys, delete_missing)
+    os.makedirs(DATA_DIR, exist_ok=True)
+    if from_neon or delta["updated"] or delta["deleted"]:
+        delta["result"].to_csv(csv_path, index=False)
+    elif delta["inserted"]:
+        delta["upserts"].to_csv(csv_path, mode="a", header=False, index=False)
 
-    # Try Neon first
     if engine is not None:
+        meta = {"content_hash": _file_sha256(csv_path), "bytes": os.path.getsize(csv_path)}
+        try:
+            if neon_in_sync and not (delta["inserted"] or delta["updated"] or delta["deleted"]):
+                pass    # nothing changed; leave the version alone
+            elif neon_in_sync:
+                try:
+                    _with_retry(_apply_delta, engine, table_name, keys, delta, meta)
+                except _NoCopySupport:
+                    neon_in_sync = False
+            if not neon_in_sync:
+                _with_retry(_bulk_write, engine, table_name, delta["result"], meta=meta)
+            note(source="neon+csv")
+        except Exception as e:
+            if _is_connection_error(e):
+                _defer_write(table_name, f"Neon write failed ({e})")
+            else:
+                st.warning(f"Neon write failed for {table_name}: {e}")
+    elif is_db_mode():
+        _defer_write(table_name)
+
+    _after_write()
+    _refresh_rollups(table_name, delta["result"])
+    _log_upload(table_name, len(delta["result"]))
+    return {k: delta[k] for k in ("inserted", "updated", "deleted")}
+
+
+def _apply_where(df: pd.DataFrame, where=None) -> pd.DataFrame:
+    """Pandas equivalent of _select_sql's WHERE for the local-CSV path."""
+    for col, value in (where or {}).items():
+        if col not in df.columns:
+            return df.iloc[0:0]
+        if isinstance(value, (list, tuple, set)):
+            df = df[df[col].isin(list(value))]
+        elif value is None:
+            df = df[df[col].isna()]
+        else:
+            df = df[(df[col] == value).fillna(False)]   # nullable columns compare to NA
+    return df
+
+
+# === Local query engine ==============================================
+# In local-CSV mode each table is converted once (per CSV version) to a
+# Parquet mirror under data/parquet/. load_table reads the mirror with its
+# projection and filter pushed into the Parquet scan, and query() runs SQL
+# on the mirrors in an embedded DuckDB, so aggregations over large tables
+# never materialise the whole table in pandas.
+
+PARQUET_DIR = os.path.join(DATA_DIR, "parquet")
+_STAMP_KEY = b"source_stamp"
+
+
+def _csv_stamp(csv_path: str) -> str:
+    stat = os.stat(csv_path)
+    return f"{stat.st_mtime_ns}:{stat.st_size}"
+
+
+def _convert_csv(csv_path: str, target: str, stamp: str):
+    """Stream a CSV into Parquet with pandas-compatible types (dates stay text)."""
+    import pyarrow as pa
+    import pyarrow.csv as pacsv
+    import pyarrow.parquet as pq
+
+    tmp = f"{target}.{uuid.uuid4().hex[:8]}.tmp"
+    try:
+        reader = pacsv.open_csv(csv_path, read_options=pacsv.ReadOptions(block_size=ARROW_BLOCK_SIZE),
+                                convert_options=pacsv.ConvertOptions(strings_can_be_null=True))
+        schema = pa.schema([f.with_type(pa.string()) if pa.types.is_temporal(f.type) else f
+                            for f in reader.schema])
+        reader = pacsv.open_csv(csv_path, read_options=pacsv.ReadOptions(block_size=ARROW_BLOCK_SIZE),
+                                convert_options=pacsv.ConvertOptions(
+                                    column_types=schema, strings_can_be_null=True))
+        schema = schema.with_metadata({_STAMP_KEY: stamp.encode()})
+        with pq.ParquetWriter(tmp, schema) as writer:
+            for batch in reader:
+                writer.write_batch(batch)
+    except Exception:
+        # Type inference from the first block failed further down; let pandas decide
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        table = pa.Table.from_pandas(pd.read_csv(csv_path), preserve_index=False)
+        pq.write_table(table.replace_schema_metadata({**(table.schema.metadata or {}), _STAMP_KEY: stamp.encode()}), tmp)
+    os.replace(tmp, target)
+
+
+def parquet_mirror(table_name: str):
+    """Path of the table's Parquet mirror, (re)converted if its CSV changed. None without a CSV."""
+    import pyarrow.parquet as pq
+
+    csv_path = os.path.join(DATA_DIR, TABLE_MAP.get(table_name, f"{table_name}.csv"))
+    if not os.path.exists(csv_path):
+        return None
+    stamp = _csv_stamp(csv_path)
+    target = os.path.join(PARQUET_DIR, f"{table_name}.parquet")
+    try:
+        if (pq.read_schema(target).metadata or {}).get(_STAMP_KEY) == stamp.encode():
+            return target
+    except Exception:
+        pass
+    os.makedirs(PARQUET_DIR, exist_ok=True)
+    _convert_csv(csv_path, target, stamp)
+    return target
+
+
+def _arrow_filter(where: dict):
+    """pyarrow expression equivalent of _select_sql's WHERE."""
+    import pyarrow.compute as pc
+    expr = None
+    for col, value in (where or {}).items():
+        field = pc.field(col)
+        if isinstance(value, (list, tuple, set)):
+            term = field.isin(list(value))
+        elif value is None:
+            term = field.is_null()
+        else:
+            term = field == value
+        expr = term if expr is None else expr & term
+    return expr
+
+
+def _read_parquet_mirror(table_name: str, path: str, columns=None, where=None) -> pd.DataFrame:
+    """Projected, filtered read of a mirror; categoricals come back dictionary-encoded."""
+    import pyarrow.parquet as pq
+
+    available = pq.read_schema(path).names
+    if any(c not in available for c in (where or {})):
+        return pd.DataFrame(columns=[c for c in (columns or available) if c in available])
+    cols = [c for c in columns if c in available] if columns else available
+    if not cols:
+        return pd.DataFrame()
+    parse = [c for c, t in table_schema(table_name, cols).items() if t == "category"]
+    table = pq.read_table(path, columns=cols, filters=_arrow_filter(where) if where else None,
+                          read_dictionary=parse or None)
+    return apply_schema(table.to_pandas(), table_name)
+
+
+def _sql_tables(sql: str) -> list:
+    """Known table names that appear as words in a SQL string."""
+    words = set(re.findall(r"[A-Za-z_][A-Za-z0-9_]*", sql))
+    return [t for t in TABLE_MAP if t in words]
+
+
+# Quoted strings, quoted identifiers and comments are matched (and kept) whole,
+# so a ':30' inside '10:30' or a '::' cast is never taken for a placeholder.
+_SQL_PLACEHOLDER = re.compile(r"'(?:[^']|'')*'|\"(?:[^\"]|\"\")*\"|--[^\n]*|/\*.*?\*/|::|:(\w+)", re.DOTALL)
+
+
+def _duckdb_params(sql: str, params: dict):
+    """Rewrite :name placeholders to DuckDB's $name, for names in params only.
+
+    Returns (sql, params) with params cut to the names the query uses.
+    """
+    used = {}
+
+    def _sub(m):
+        name = m.group(1)
+        if name is None or name not in params:
+            return m.group(0)
+        used[name] = params[name]
+        return f"${name}"
+
+    return _SQL_PLACEHOLDER.sub(_sub, sql), used
+
+
+def query(sql: str, params: dict = None) -> pd.DataFrame:
+    """Run a SQL query over the tables, referring to them by name.
+
+    On Neon the query runs there. In local-CSV mode it runs in an embedded
+    DuckDB over the Parquet mirrors, so filtering and aggregation happen in
+    the engine and only the result reaches pandas. params are bound as
+    :name placeholders in both modes.
+    """
+    engine = _get_engine()
+    if engine is not None:
+        from sqlalchemy import text
+        return pd.read_sql_query(text(sql), engine, params=params)
+
+    try:
+        import duckdb
+    except ImportError:
+        raise RuntimeError("db.query in local-CSV mode needs the duckdb package (pip install duckdb)")
+    con = duckdb.connect()
+    try:
+        for name in _sql_tables(sql):
+            path = parquet_mirror(name)
+            if path is not None:
+                con.execute(f"CREATE VIEW {_quote_ident(name)} AS SELECT * FROM read_parquet('{path.replace(chr(39), chr(39) * 2)}')")
+        if params:
+            sql, params = _duckdb_params(sql, params)
+        return con.execute(sql, params or None).df()
+    finally:
+        con.close()
+
+
+# === Versioned table cache ===========================================
+# Cache entries are keyed on a per-table version stamp instead of a blanket
+# ttl: a write to one table changes only that table's stamp, so only that
+# table is re-fetched. The stamp combines the Neon metadata version (polled
+# every VERSION_TTL seconds, so writes from other containers show up
+# quickly), the local CSV's mtime/size and an in-process epoch.
+
+VERSION_TTL = 15  # seconds between polls of the Neon version table
+
+_VERSIONS_SQL = f"SELECT table_name, version FROM {META_TABLE}"
+
+_versions = {"tables": None, "fetched_at": 0.0}
+_versions_lock = threading.Lock()
+_local_epochs = {}
+
+
+def refresh_versions() -> dict:
+    """Re-poll the Neon version table. {table_name: version}."""
+    engine = _get_engine()
+    if engine is None:
+        return {}
+    catalog = get_catalog()
+    tables = None
+    if _catalog["meta_ready"]:
         try:
             from sqlalchemy import text
             with engine.connect() as conn:
-                exists = conn.execute(
-                    text("SELECT EXISTS(SELECT 1 FROM information_schema.tables WHERE table_name=:t)"),
-                    {"t": table_name}
-                ).scalar()
-            if exists:
-                return pd.read_sql_table(table_name, engine)
-        except Exception:
-            pass
+                tables = {name: int(v) for name, v in conn.execute(text(_VERSIONS_SQL)).fetchall()}
+        except Exception as e:
+            _record_failure(e)
+    if tables is None:
+        # Metadata table not created yet (or Neon unreachable): use the catalog's view
+        tables = {name: e.get("version", 0) for name, e in catalog.items()}
+    with _versions_lock:
+        _versions["tables"] = tables
+        _versions["fetched_at"] = time.time()
+    return tables
+
+
+def _neon_versions() -> dict:
+    with _versions_lock:
+        tables, fetched_at = _versions["tables"], _versions["fetched_at"]
+    if tables is None or time.time() - fetched_at > VERSION_TTL:
+        return refresh_versions()
+    return tables
+
+
+def table_version(table_name: str) -> str:
+    """Current version stamp of a table.
+
+    Pages can keep the stamp of the frame they hold (df.attrs["version"])
+    and compare it with this to detect that the table has since changed.
+    """
+    parts = []
+    if _get_engine() is not None:
+        entry = get_catalog().get(table_name, {})
+        relid = (entry.get("marker") or "").split(":")[0]
+        parts.append(f"neon:{_neon_versions().get(table_name, 0)}:{relid}")
+    csv_path = os.path.join(DATA_DIR, TABLE_MAP.get(table_name, f"{table_name}.csv"))
+    try:
+        stat = os.stat(csv_path)
+        parts.append(f"csv:{stat.st_mtime_ns}:{stat.st_size}")
+    except OSError:
+        parts.append("csv:none")
+    parts.append(f"epoch:{_local_epochs.get(table_name, 0)}")
+    return "|".join(parts)
+
+
+def clear_table_cache(table_name: str = None):
+    """Invalidate the cached copy of one table (or of every table)."""
+    if table_name is None:
+        _load_table_cached.clear()
+        with _cache_keys_lock:
+            _cache_keys.clear()
+        return
+    _local_epochs[table_name] = _local_epochs.get(table_name, 0) + 1
+
+
+def _after_write():
+    """Refresh catalog and versions after this process wrote to Neon."""
+    if _get_engine() is not None:
+        refresh_catalog()
+        refresh_versions()
 
-    # Fallback to local CSV
+
+# === Shared frame store ==============================================
+# Table reads are held once per process (st.cache_resource) instead of being
+# pickled into every caller by st.cache_data. Callers get shallow views;
+# under pandas copy-on-write all sessions share the same column buffers and
+# a column is only copied when a page writes to it.
+
+if int(pd.__version__.split(".")[0]) < 3:     # always on from pandas 3.0
+    pd.set_option("mode.copy_on_write", True)
+
+
+def shared_view(df: pd.DataFrame) -> pd.DataFrame:
+    """Per-caller view of a shared frame; writes to it copy, never leak back."""
+    view = df.copy(deep=False)
+    view.attrs = dict(df.attrs)
+    return view
+
+
+@st.cache_resource(ttl=3600, max_entries=256)
+def _load_table_cached(table_name: str, version: str, columns: list = None, where: dict = None) -> pd.DataFrame:
+    """Read behind load_table, shared process-wide; `version` is only part of the cache key.
+
+    The returned frame is shared - hand it out through shared_view().
+    attrs["source"] / attrs["nbytes"] say where it was read from and its size.
+    """
+    note(cache="miss")
+    engine = _get_engine()
+
+    # Try Neon first
+    if engine is not None:
+        try:
+            if _neon_has_table(table_name):
+                df = _read_neon(engine, table_name, columns, where)
+                _record_success()
+                return _tag_source(apply_schema(df, table_name), "neon")
+        except Exception as e:
+            _record_failure(e)
+
+    # Fallback to local CSV, through its Parquet mirror when pyarrow can scan it
     csv_name = TABLE_MAP.get(table_name, f"{table_name}.csv")
     csv_path = os.path.join(DATA_DIR, csv_name)
     if os.path.exists(csv_path):
         try:
-            return pd.read_csv(csv_path)
+            df = _read_parquet_mirror(table_name, parquet_mirror(table_name), columns, where)
+            return _tag_source(df, "parquet")
+        except Exception:
+            pass
+        try:
+            if not columns and not where:
+                return _tag_source(_read_csv_typed(table_name, csv_path), "csv")
+            wanted = set(columns or []) | set(where or {})
+            df = _read_csv_typed(table_name, csv_path, usecols=(lambda c: c in wanted) if columns else None)
+            df = _apply_where(df, where)
+            if columns:
+                df = df[[c for c in columns if c in df.columns]]
+            return _tag_source(df.reset_index(drop=True), "csv")
         except Exception:
             pass
 
-    return pd.DataFrame()
+    return _tag_source(pd.DataFrame(), "none")
 
 
-def save_table(table_name: str, df: pd.DataFrame, mode: str = "replace"):
-    """Save a DataFrame - to Neon if configured, always save local CSV too."""
-    os.makedirs(DATA_DIR, exist_ok=True)
+_cache_keys = {}          # {table_name: (version, [(columns, where), ...])} cached at that version
+_cache_keys_lock = threading.Lock()
+
+
+def _evict_superseded(table_name: str, version: str, columns: list, where: dict):
+    """Track what load_table cached for a table; drop its entries once the version moves on.
+
+    Without this, superseded versions sit in _load_table_cached until the
+    TTL or max_entries pushes them out, each holding a full copy of the table.
+    """
+    with _cache_keys_lock:
+        current, keys = _cache_keys.get(table_name, (None, []))
+        stale = []
+        if current != version:
+            stale, keys = keys, []
+            _cache_keys[table_name] = (version, keys)
+        if (columns, where) not in keys:
+            keys.append((columns, where))
+    for cols, wh in stale:
+        _load_table_cached.clear(table_name, current, cols, wh)
+
+
+def _tag_source(df: pd.DataFrame, source: str) -> pd.DataFrame:
+    """Stamp a freshly read frame with its source and in-memory size (once, on a miss)."""
+    df.attrs["source"] = source
+    df.attrs["nbytes"] = int(df.memory_usage(index=False, deep=True).sum()) if len(df.columns) else 0
+    return df
+
+
+# === Public API ======================================================
+
+def load_table(table_name: str, columns: list = None, where: dict = None) -> pd.DataFrame:
+    """Load a table - from Neon if configured, else from local CSV.
+
+    Every session reads the same in-process copy; the returned frame is a
+    copy-on-write view, so mutating it is safe and only copies what changes.
+
+    columns: optional projection; unknown names are ignored.
+    where:   optional {column: value} / {column: [values]} equality filter,
+             pushed into the Neon query and applied on read for CSV.
+    The frame's attrs["version"] holds the table_version() it was read at.
+    """
+    with timed("load_table", table=table_name, cache="hit") as span:
+        version = table_version(table_name)
+        df = shared_view(_load_table_cached(table_name, version, columns, where))
+        _evict_superseded(table_name, version, columns, where)
+        df.attrs["version"] = version
+        span.update(rows=len(df), bytes=df.attrs.get("nbytes"), source=df.attrs.get("source"))
+    return df
+
+
+# Kept for callers that still do load_table.clear()
+load_table.clear = clear_table_cache
+
+
+def _thread_initializer():
+    """Give worker threads the caller's script-run context so st.cache_data works there."""
+    try:
+        from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
+        ctx = get_script_run_ctx()
+    except Exception:
+        return lambda: None
+    return lambda: add_script_run_ctx(threading.current_thread(), ctx)
+
+
+def load_tables(tables) -> dict:
+    """Load several tables concurrently. Returns {table_name: DataFrame}.
+
+    tables: list of names, or {name: {"columns": [...], "where": {...}}}.
+    Fetches share load_table's versioned cache and run at most
+    POOL_SIZE + MAX_OVERFLOW at a time, so page startup waits for the
+    slowest table rather than the sum of all of them.
+    """
+    specs = tables if isinstance(tables, dict) else {name: {} for name in tables}
+    if not specs:
+        return {}
+    workers = min(len(specs), POOL_SIZE + MAX_OVERFLOW)
+    with ThreadPoolExecutor(max_workers=workers, initializer=_thread_initializer()) as pool:
+        futures = {name: pool.submit(load_table, name, (spec or {}).get("columns"), (spec or {}).get("where"))
+                   for name, spec in specs.items()}
+        return {name: future.result() for name, future in futures.items()}
+
+
+# === Vertical prefetch ===============================================
+
+_prefetch_threads = {}
+_prefetch_lock = threading.Lock()
 
-    # Save local CSV
+
+def _run_prefetch(plan: list, initializer):
+    initializer()
+    for _module, tables in plan:
+        try:
+            load_tables(tables)
+        except Exception:
+            continue
+
+
+def prefetch_vertical(vertical_key: str) -> bool:
+    """Warm the table cache for a vertical's modules on a background thread.
+
+    Modules are warmed in config.prefetch_plan order (dashboard and map
+    first). Returns False if a prefetch for this vertical is already running.
+    """
+    from config import prefetch_plan
+    plan = prefetch_plan(vertical_key)
+    with _prefetch_lock:
+        running = _prefetch_threads.get(vertical_key)
+        if running is not None and running.is_alive():
+            return False
+        thread = threading.Thread(target=_run_prefetch, args=(plan, _thread_initializer()),
+                                  name=f"prefetch-{vertical_key}", daemon=True)
+        _prefetch_threads[vertical_key] = thread
+        thread.start()
+    return True
+
+
+def save_table(table_name: str, df: pd.DataFrame, mode: str = "replace", delete_missing: bool = True):
+    """Save a DataFrame - to Neon if configured, always save local CSV too.
+
+    mode="upsert" (tables in TABLE_KEYS) writes only the row-level delta and
+    returns {inserted, updated, deleted}. With delete_missing=False, rows
+    absent from df are kept, so df may hold just the new month. It raises
+    ValueError, writing nothing, when df's columns or keys don't fit the
+    stored table.
+    """
+    os.makedirs(DATA_DIR, exist_ok=True)
     csv_name = TABLE_MAP.get(table_name, f"{table_name}.csv")
     csv_path = os.path.join(DATA_DIR, csv_name)
-    df.to_csv(csv_path, index=False)
+    with timed("save_table", table=table_name, rows=len(df), mode=mode, source="csv") as span:
+        if mode == "upsert":
+            result = _save_upsert(table_name, df, delete_missing)
+            span["bytes"] = os.path.getsize(csv_path) if os.path.exists(csv_path) else None
+            return result
 
-    # Save to Neon if available
-    engine = _get_engine()
-    if engine is not None:
-        try:
-            df.to_sql(table_name, engine, if_exists=mode, index=False)
-        except Exception as e:
-            st.warning(f"Neon write failed for {table_name}: {e}")
+        # Save local CSV
+        df.to_csv(csv_path, index=False)
+        span["bytes"] = os.path.getsize(csv_path)
+
+        # Save to Neon if available
+        engine = _get_engine()
+        if engine is not None:
+            try:
+                # Hash the CSV just written so push_all_to_neon sees this table as in sync
+                meta = {"content_hash": _file_sha256(csv_path), "bytes": span["bytes"]}
+                if mode != "replace":
+                    meta = {"content_hash": None, "bytes": None}   # Neon no longer mirrors the CSV
+                _with_retry(_bulk_write, engine, table_name, df, mode, meta=meta)
+                span["source"] = "neon+csv"
+            except Exception as e:
+                if _is_connection_error(e):
+                    _defer_write(table_name, f"Neon write failed ({e})")
+                else:
+                    st.warning(f"Neon write failed for {table_name}: {e}")
+        elif is_db_mode():
+            _defer_write(table_name)
 
-    # Clear cache
-    load_table.clear()
+        # Bump this table's version (the CSV stamp changed with the write above)
+        _after_write()
 
-    # Log upload
-    _log_upload(table_name, len(df))
+        # Pre-aggregate the rollup cube against the new version
+        _refresh_rollups(table_name, df if mode == "replace" else None)
+
+        # Log upload
+        _log_upload(table_name, len(df))
+
+
+def _refresh_rollups(table_name: str, df: pd.DataFrame = None):
+    """Rebuild a table's rollup cube after a write; df=None re-reads the CSV."""
+    from rollups import ROLLUP_TABLES, save_cube
+    if table_name not in ROLLUP_TABLES:
+        return
+    try:
+        if df is None:
+            df = pd.read_csv(os.path.join(DATA_DIR, TABLE_MAP.get(table_name, f"{table_name}.csv")))
+        save_cube(table_name, df)
+    except Exception as e:
+        st.warning(f"Rollup cube not rebuilt for {table_name}: {e}")
 
 
 def _log_upload(table_name: str, rows: int):
@@ -209,24 +1446,36 @@ def _log_upload(table_name: str, rows: int):
         json.dump(log[-50:], f, indent=2)
 
 
-def load_geojson():
-    """Load India states GeoJSON for choropleth maps."""
-    geo_path = os.path.join(DATA_DIR, "india_states_simple.geojson")
-    if os.path.exists(geo_path):
-        with open(geo_path) as f:
-            return json.load(f)
+def load_geojson(name: str = "states", detail: str = "medium"):
+    """Load boundary GeoJSON for choropleth maps (states or districts).
 
-    # Try downloading if not present
+    Served from the simplified, memoized geometry store; None when the
+    source file is not in data/.
+    """
+    from geo_store import get_geojson
     try:
-        import urllib.request
-        url = "https://raw.githubusercontent.com/geohacker/india/master/state/india_state.geojson"
-        urllib.request.urlretrieve(url, geo_path)
-        with open(geo_path) as f:
-            return json.load(f)
+        return get_geojson(name, detail)
     except Exception:
         return None
 
 
+def memory_report(tables=None) -> pd.DataFrame:
+    """In-memory size of local tables as inferred by read_csv vs under their schema."""
+    rows = []
+    for name in tables or TABLE_MAP:
+        csv_path = os.path.join(DATA_DIR, TABLE_MAP.get(name, f"{name}.csv"))
+        if not os.path.exists(csv_path):
+            continue
+        try:
+            inferred = pd.read_csv(csv_path).memory_usage(deep=True).sum()
+            typed = _read_csv_typed(name, csv_path).memory_usage(deep=True).sum()
+        except Exception:
+            continue
+        rows.append({"table": name, "inferred_mb": inferred / 2**20, "typed_mb": typed / 2**20,
+                     "saved_pct": 100 * (1 - typed / inferred) if inferred else 0.0})
+    return pd.DataFrame(rows, columns=["table", "inferred_mb", "typed_mb", "saved_pct"])
+
+
 def get_upload_log() -> list:
     """Return the upload history log."""
     if os.path.exists(UPLOAD_LOG):
@@ -238,21 +1487,83 @@ def get_upload_log() -> list:
     return []
 
 
-def push_all_to_neon():
-    """Bulk push all local CSVs to Neon. Returns count of tables synced."""
+# === Change-aware sync ===============================================
+
+SYNC_WORKERS = 4  # concurrent table pushes; stays inside POOL_SIZE + MAX_OVERFLOW
+
+
+def _file_sha256(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def _sync_one(engine, table_name: str, csv_path: str, catalog: dict, force: bool) -> dict:
+    """Push one local CSV to Neon unless its content hash already matches."""
+    started = time.perf_counter()
+    report = {"table": table_name, "rows": 0, "bytes": os.path.getsize(csv_path),
+              "seconds": 0.0, "skipped": False, "error": None}
+    try:
+        content_hash = _file_sha256(csv_path)
+        entry = catalog.get(table_name, {})
+        if not force and entry.get("exists") and entry.get("content_hash") == content_hash:
+            report.update(rows=entry.get("rows", 0), skipped=True)
+        else:
+            df = pd.read_csv(csv_path)
+            if df.empty:
+                report["skipped"] = True
+            else:
+                _with_retry(_bulk_write, engine, table_name, df,
+                            meta={"content_hash": content_hash, "bytes": report["bytes"]})
+                report["rows"] = len(df)
+    except Exception as e:
+        report["error"] = str(e)
+    report["seconds"] = round(time.perf_counter() - started, 3)
+    record("sync_table", table_name, report["seconds"], rows=report["rows"], bytes=report["bytes"],
+           skipped=report["skipped"], source="neon", error=report["error"])
+    return report
+
+
+def sync_to_neon(force: bool = False, tables: list = None) -> list:
+    """Push local CSVs to Neon, skipping tables whose content is unchanged.
+
+    Changed tables are pushed concurrently (SYNC_WORKERS at a time). Returns
+    one report per table: {table, rows, bytes, seconds, skipped, error}.
+    """
     engine = _get_engine()
     if engine is None:
-        return 0
-    synced = 0
-    for table_name, csv_name in TABLE_MAP.items():
-        csv_path = os.path.join(DATA_DIR, csv_name)
+        return []
+    jobs = []
+    for table_name in (tables or TABLE_MAP):
+        csv_path = os.path.join(DATA_DIR, TABLE_MAP.get(table_name, f"{table_name}.csv"))
         if os.path.exists(csv_path):
-            try:
-                df = pd.read_csv(csv_path)
-                if not df.empty:
-                    df.to_sql(table_name, engine, if_exists="replace", index=False)
-                    synced += 1
-            except Exception:
-                continue
-    load_table.clear()
-    return synced
+            jobs.append((table_name, csv_path))
+    try:
+        _with_retry(_ensure_meta_table, engine)
+    except Exception as e:
+        if _is_connection_error(e):
+            # Neon unreachable: report every table as failed rather than raise
+            return [{"table": table_name, "rows": 0, "bytes": os.path.getsize(csv_path), "seconds": 0.0,
+                     "skipped": False, "error": str(e)} for table_name, csv_path in jobs]
+    catalog = refresh_catalog()
+
+    with ThreadPoolExecutor(max_workers=SYNC_WORKERS) as pool:
+        reports = list(pool.map(lambda job: _sync_one(engine, *job, catalog, force), jobs))
+
+    _after_write()
+    return reports
+
+
+def push_all_to_neon(force: bool = False):
+    """Bulk push all local CSVs to Neon. Returns count of tables synced.
+
+    Unchanged tables count as synced without being re-sent; use
+    sync_to_neon() for the per-table report.
+    """
+    with timed("push_all_to_neon", source="neon") as span:
+        reports = sync_to_neon(force=force)
+        span.update(rows=sum(r["rows"] for r in reports), bytes=sum(r["bytes"] for r in reports),
+                    tables=len(reports), skipped=sum(1 for r in reports if r["skipped"]))
+    return sum(1 for r in reports if r["error"] is None and r["rows"] > 0)
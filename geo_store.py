@@ -0,0 +1,237 @@
+"""
+Expansion Intelligence Platform - Geometry Store
+================================================
+Boundary GeoJSON for choropleths, simplified once per detail level and kept
+in a compact on-disk form: coordinates quantized to an integer grid and
+delta-encoded per ring (as TopoJSON does), gzipped. Decoded geometries are
+memoized for the whole process, so a render never re-reads or re-parses
+the full-resolution source.
+
+Sources live in data/ (no network fallback); a compact file is rebuilt
+only when its source file changes.
+
+Usage:
+    from geo_store import get_geojson, feature_id_key
+    states = get_geojson("states")                      # medium detail
+    districts = get_geojson("districts", detail="low")
+    px.choropleth(df, geojson=districts, featureidkey=feature_id_key(districts, "district"), ...)
+"""
+
+import gzip
+import json
+import os
+import threading
+
+import numpy as np
+
+from db import DATA_DIR
+
+GEO_SOURCES = {
+    "states": "india_states_simple.geojson",
+    "districts": "india_districts.geojson",
+}
+
+# Douglas-Peucker tolerance in degrees per detail level (0 = no simplification)
+DETAIL_TOLERANCE = {"full": 0.0, "medium": 0.01, "low": 0.05}
+
+GEO_CACHE_DIR = os.path.join(DATA_DIR, "geo_cache")
+QUANTIZATION = 100_000          # grid cells across the source bounding box
+COORD_DECIMALS = 4              # decimals in decoded coordinates (~11 m)
+STORE_VERSION = 1
+
+# Property names tried by feature_id_key, per level
+ID_PROPERTIES = {
+    "state": ["ST_NM", "NAME_1", "st_nm", "state", "State", "STATE", "name"],
+    "district": ["DISTRICT", "district", "District", "dtname", "NAME_2", "district_name", "name"],
+}
+
+_memo = {}
+_memo_lock = threading.Lock()
+
+
+# === Simplification ==================================================
+
+def _simplify_ring(pts: np.ndarray, tol: float) -> np.ndarray:
+    """Douglas-Peucker on one ring (first point == last point)."""
+    n = len(pts)
+    if tol <= 0 or n <= 4:
+        return pts
+    keep = np.zeros(n, dtype=bool)
+    keep[0] = keep[-1] = True
+    stack = [(0, n - 1)]
+    while stack:
+        s, e = stack.pop()
+        if e - s < 2:
+            continue
+        a, seg = pts[s], pts[s + 1:e]
+        d = pts[e] - a
+        length = np.hypot(d[0], d[1])
+        if length == 0:
+            dist = np.hypot(seg[:, 0] - a[0], seg[:, 1] - a[1])
+        else:
+            dist = np.abs(d[0] * (seg[:, 1] - a[1]) - d[1] * (seg[:, 0] - a[0])) / length
+        i = int(np.argmax(dist))
+        if dist[i] > tol:
+            keep[s + 1 + i] = True
+            stack.append((s, s + 1 + i))
+            stack.append((s + 1 + i, e))
+    return pts[keep]
+
+
+def _simplify_polygon(rings: list, tol: float):
+    """Simplified polygon, or None if its outer ring collapses; holes that collapse are dropped."""
+    out = []
+    for i, ring in enumerate(rings):
+        pts = _simplify_ring(np.asarray(ring, dtype=np.float64)[:, :2], tol)
+        if len(pts) < 4:
+            if i == 0:
+                return None
+            continue
+        out.append(pts)
+    return out
+
+
+def _polygons(geometry: dict) -> list:
+    if not geometry:
+        return []
+    if geometry["type"] == "Polygon":
+        return [geometry["coordinates"]]
+    if geometry["type"] == "MultiPolygon":
+        return geometry["coordinates"]
+    return []
+
+
+# === Compact encoding ================================================
+
+def _encode(geo: dict, tol: float) -> dict:
+    """Simplify and quantize a FeatureCollection into the compact form."""
+    features = []
+    for feat in geo.get("features", []):
+        polys = _polygons(feat.get("geometry"))
+        simplified = [p for p in (_simplify_polygon(p, tol) for p in polys) if p]
+        if not simplified and polys:
+            # Keep a tiny feature's largest-ring polygon unsimplified rather than dropping it
+            simplified = [_simplify_polygon(max(polys, key=lambda p: len(p[0])), 0.0)]
+        features.append((feat.get("properties") or {}, feat.get("id"), simplified))
+
+    all_pts = [r for _, _, polys in features for p in polys for r in p]
+    if all_pts:
+        stacked = np.vstack(all_pts)
+        lo, hi = stacked.min(axis=0), stacked.max(axis=0)
+    else:
+        lo, hi = np.zeros(2), np.ones(2)
+    scale = np.maximum(hi - lo, 1e-9) / (QUANTIZATION - 1)
+
+    encoded = []
+    for props, fid, polys in features:
+        q_polys = []
+        for poly in polys:
+            q_rings = []
+            for ring in poly:
+                q = np.rint((ring - lo) / scale).astype(np.int64)
+                q = q[np.r_[True, (np.diff(q, axis=0) != 0).any(axis=1)]]
+                q_rings.append(np.diff(q, axis=0, prepend=np.zeros((1, 2), dtype=np.int64)).ravel().tolist())
+            q_polys.append(q_rings)
+        encoded.append({"properties": props, "id": fid, "polygons": q_polys})
+    return {"version": STORE_VERSION, "scale": scale.tolist(), "translate": lo.tolist(), "features": encoded}
+
+
+def _decode(compact: dict) -> dict:
+    """Compact form back to a GeoJSON FeatureCollection with rounded coordinates."""
+    scale = np.asarray(compact["scale"])
+    translate = np.asarray(compact["translate"])
+    features = []
+    for feat in compact["features"]:
+        polys = []
+        for poly in feat["polygons"]:
+            rings = []
+            for delta in poly:
+                q = np.cumsum(np.asarray(delta, dtype=np.int64).reshape(-1, 2), axis=0)
+                rings.append(np.round(q * scale + translate, COORD_DECIMALS).tolist())
+            polys.append(rings)
+        if len(polys) == 1:
+            geometry = {"type": "Polygon", "coordinates": polys[0]}
+        else:
+            geometry = {"type": "MultiPolygon", "coordinates": polys}
+        out = {"type": "Feature", "properties": feat["properties"], "geometry": geometry}
+        if feat.get("id") is not None:
+            out["id"] = feat["id"]
+        features.append(out)
+    return {"type": "FeatureCollection", "features": features}
+
+
+# === Store ===========================================================
+
+def _source_path(name: str) -> str:
+    if name not in GEO_SOURCES:
+        raise KeyError(f"Unknown geometry '{name}'. Available: {', '.join(GEO_SOURCES)}")
+    return os.path.join(DATA_DIR, GEO_SOURCES[name])
+
+
+def _compact_path(name: str, detail: str, stat: os.stat_result) -> str:
+    tag = f"{stat.st_size}-{stat.st_mtime_ns}"
+    return os.path.join(GEO_CACHE_DIR, f"{name}.{detail}.{tag}.v{STORE_VERSION}.json.gz")
+
+
+def _build_compact(name: str, detail: str, source: str, target: str) -> dict:
+    with open(source) as f:
+        compact = _encode(json.load(f), DETAIL_TOLERANCE[detail])
+    try:
+        os.makedirs(GEO_CACHE_DIR, exist_ok=True)
+        # Drop stale compact files for this source/detail before writing the new one
+        for old in os.listdir(GEO_CACHE_DIR):
+            if old.startswith(f"{name}.{detail}."):
+                os.remove(os.path.join(GEO_CACHE_DIR, old))
+        tmp = f"{target}.tmp"
+        with gzip.open(tmp, "wt") as f:
+            json.dump(compact, f, separators=(",", ":"))
+        os.replace(tmp, target)
+    except Exception:
+        pass  # read-only deployments still get the in-memory copy
+    return compact
+
+
+def get_geojson(name: str = "states", detail: str = "medium"):
+    """Boundary FeatureCollection for `name` at `detail`, or None if the source is missing.
+
+    The returned dict is shared by every caller in the process - treat it
+    as read-only.
+    """
+    if detail not in DETAIL_TOLERANCE:
+        raise ValueError(f"detail must be one of {list(DETAIL_TOLERANCE)}, got {detail!r}")
+    source = _source_path(name)
+    try:
+        stat = os.stat(source)
+    except OSError:
+        return None
+
+    key = (name, detail, stat.st_size, stat.st_mtime_ns)
+    with _memo_lock:
+        if key in _memo:
+            return _memo[key]
+
+        target = _compact_path(name, detail, stat)
+        compact = None
+        if os.path.exists(target):
+            try:
+                with gzip.open(target, "rt") as f:
+                    compact = json.load(f)
+            except Exception:
+                compact = None
+        if compact is None:
+            compact = _build_compact(name, detail, source, target)
+
+        geo = _decode(compact)
+        for stale in [k for k in _memo if k[:2] == (name, detail)]:
+            del _memo[stale]
+        _memo[key] = geo
+        return geo
+
+
+def feature_id_key(geojson: dict, level: str = "state") -> str:
+    """Plotly featureidkey ('properties.<name>') for the boundary level, or None."""
+    if not geojson or not geojson.get("features"):
+        return None
+    props = geojson["features"][0].get("properties") or {}
+    name = next((p for p in ID_PROPERTIES[level] if p in props), None)
+    return f"properties.{name}" if name else None
@@ -0,0 +1,172 @@
+"""
+Expansion OS - Map Layers
+=========================
+Server-side hex binning with fixed levels of detail for the Geospatial
+Network Map. Point layers (online orders, pincodes, competitors) are
+aggregated once per level into hexagons; a view then only slices the
+level's bins to its bounding box, so the payload sent to the browser is
+bounded by MAX_BINS however many orders sit underneath.
+
+Usage:
+    from map_layers import build_pyramid, view_bins, demand_points
+    pyramid = build_pyramid(demand_points(), weight_col="Orders")
+    bins = view_bins(pyramid, level=1, bbox=(18.0, 72.0, 20.5, 74.5))
+"""
+
+import numpy as np
+import pandas as pd
+
+from spatial import latlon_columns, LAT_ALIASES, LON_ALIASES
+
+# Level of detail: (label, hex size in degrees, map zoom it is drawn at)
+LOD_LEVELS = [
+    ("National", 1.00, 3.5),
+    ("Regional", 0.35, 5.0),
+    ("Metro", 0.10, 7.0),
+    ("Local", 0.03, 9.0),
+]
+
+# Upper bound on bins returned for one view
+MAX_BINS = 2500
+
+# Longitudes are scaled by cos(mid-India latitude) so hexagons stay roughly regular
+_LON_SCALE = np.cos(np.radians(22.0))
+_SQRT3 = np.sqrt(3.0)
+
+DEMAND_TABLE = "web_order_demand"
+WEIGHT_ALIASES = ["Orders", "orders", "Order_Count", "Online_1Cx_Volume", "Total", "Revenue", "Count"]
+
+
+# === Hex binning =====================================================
+
+def hex_cells(lat: np.ndarray, lon: np.ndarray, size: float):
+    """Axial (q, r) hex coordinates for each point, pointy-top, size in degrees."""
+    x = np.asarray(lon, dtype=np.float64) * _LON_SCALE / size
+    y = np.asarray(lat, dtype=np.float64) / size
+    q = _SQRT3 / 3 * x - y / 3
+    r = 2.0 / 3 * y
+    # Cube rounding
+    s = -q - r
+    rq, rr, rs = np.rint(q), np.rint(r), np.rint(s)
+    dq, dr, ds = np.abs(rq - q), np.abs(rr - r), np.abs(rs - s)
+    fix_q = (dq > dr) & (dq > ds)
+    fix_r = ~fix_q & (dr > ds)
+    rq = np.where(fix_q, -rr - rs, rq)
+    rr = np.where(fix_r, -rq - rs, rr)
+    return rq.astype(np.int64), rr.astype(np.int64)
+
+
+def hex_centers(q: np.ndarray, r: np.ndarray, size: float):
+    """(lat, lon) of hex centres."""
+    x = size * _SQRT3 * (q + r / 2.0)
+    y = size * 1.5 * r
+    return y, x / _LON_SCALE
+
+
+def hex_bin(points: pd.DataFrame, size: float, weight_col: str = None) -> pd.DataFrame:
+    """Aggregate points into hexagons: Lat, Lon (centre), Points, Weight."""
+    lat_col, lon_col = latlon_columns(points)
+    lat = pd.to_numeric(points[lat_col], errors="coerce").to_numpy(dtype=np.float64)
+    lon = pd.to_numeric(points[lon_col], errors="coerce").to_numpy(dtype=np.float64)
+    if weight_col:
+        weight = pd.to_numeric(points[weight_col], errors="coerce").fillna(0).to_numpy(dtype=np.float64)
+    else:
+        weight = np.ones(len(points))
+    keep = np.isfinite(lat) & np.isfinite(lon)
+    q, r = hex_cells(lat[keep], lon[keep], size)
+
+    cells = pd.DataFrame({"q": q, "r": r, "w": weight[keep]})
+    agg = cells.groupby(["q", "r"], sort=False).agg(Points=("w", "size"), Weight=("w", "sum")).reset_index()
+    agg["Lat"], agg["Lon"] = hex_centers(agg["q"].to_numpy(), agg["r"].to_numpy(), size)
+    return agg[["Lat", "Lon", "Points", "Weight"]]
+
+
+def build_pyramid(points: pd.DataFrame, weight_col: str = None) -> list:
+    """Hex bins for every entry of LOD_LEVELS, coarsest first."""
+    if points is None or points.empty:
+        return [pd.DataFrame(columns=["Lat", "Lon", "Points", "Weight"]) for _ in LOD_LEVELS]
+    return [hex_bin(points, size, weight_col) for _, size, _ in LOD_LEVELS]
+
+
+# === Views ===========================================================
+
+def level_for_zoom(zoom: float) -> int:
+    """Finest level whose draw zoom does not exceed `zoom`."""
+    level = 0
+    for i, (_, _, z) in enumerate(LOD_LEVELS):
+        if zoom >= z:
+            level = i
+    return level
+
+
+def bbox_of(lat, lon, pad: float = 1.0) -> tuple:
+    """(south, west, north, east) around a set of points, padded in degrees."""
+    lat = np.asarray(lat, dtype=np.float64)
+    lon = np.asarray(lon, dtype=np.float64)
+    ok = np.isfinite(lat) & np.isfinite(lon)
+    if not ok.any():
+        return None
+    return lat[ok].min() - pad, lon[ok].min() - pad, lat[ok].max() + pad, lon[ok].max() + pad
+
+
+def view_bins(pyramid: list, level: int, bbox: tuple = None, max_bins: int = MAX_BINS) -> pd.DataFrame:
+    """Bins of one level inside bbox, the heaviest max_bins of them."""
+    bins = pyramid[max(0, min(level, len(pyramid) - 1))]
+    if bbox is not None and not bins.empty:
+        south, west, north, east = bbox
+        bins = bins[bins["Lat"].between(south, north) & bins["Lon"].between(west, east)]
+    if len(bins) > max_bins:
+        bins = bins.nlargest(max_bins, "Weight")
+    return bins.reset_index(drop=True)
+
+
+# === Sources =========================================================
+
+def _weight_column(df: pd.DataFrame):
+    return next((c for c in WEIGHT_ALIASES if c in df.columns), None)
+
+
+def city_coordinates(frames: dict) -> pd.DataFrame:
+    """Mean (Lat, Lon) per (City, State) from any frames carrying both."""
+    parts = []
+    for df in frames.values():
+        if df is None or df.empty or "City" not in df.columns:
+            continue
+        try:
+            lat, lon = latlon_columns(df)
+        except ValueError:
+            continue
+        keys = ["City", "State"] if "State" in df.columns else ["City"]
+        part = df[keys + [lat, lon]].rename(columns={lat: "Lat", lon: "Lon"})
+        parts.append(part.assign(Lat=pd.to_numeric(part["Lat"], errors="coerce"),
+                                 Lon=pd.to_numeric(part["Lon"], errors="coerce")))
+    if not parts:
+        return pd.DataFrame(columns=["City", "Lat", "Lon"])
+    coords = pd.concat(parts, ignore_index=True)
+    coords = coords[coords["Lat"].notna() & coords["Lon"].notna() & (coords["Lat"] != 0)]
+    coords["City"] = coords["City"].astype(str).str.strip().str.title()
+    return coords.groupby("City", as_index=False)[["Lat", "Lon"]].mean()
+
+
+def demand_points(web_demand: pd.DataFrame = None) -> tuple:
+    """Online-demand points for the map, as (frame, weight column).
+
+    Uses web_order_demand when it carries coordinates; otherwise places the
+    website file's per-city aggregate (aggregate_web_demand output) on city
+    coordinates taken from the location tables.
+    """
+    from db import load_table, load_tables
+    from spatial import LOCATION_TABLES
+
+    try:
+        df = load_table(DEMAND_TABLE)
+        if not df.empty and any(c in df.columns for c in LAT_ALIASES) and any(c in df.columns for c in LON_ALIASES):
+            return df, _weight_column(df)
+    except Exception:
+        pass
+
+    if web_demand is None or web_demand.empty:
+        return pd.DataFrame(), None
+    coords = city_coordinates(load_tables(LOCATION_TABLES))
+    web = web_demand.assign(City=web_demand["City"].astype(str).str.strip().str.title())
+    return web.merge(coords, on="City", how="inner"), "Online_1Cx_Volume"
@@ -0,0 +1,172 @@
+"""
+Expansion Intelligence Platform - Hot-Path Metrics
+==================================================
+Lightweight timing for the data entry points (load_table, save_table,
+push_all_to_neon, the MIS stitch, the app loaders). Each call records one
+event - wall time, rows, bytes, cache hit/miss, source - into a bounded
+in-process ring buffer shared by every session; the Diagnostics page turns
+it into p50/p95 latencies.
+
+Profiling is off by default. When switched on (set_profiling(True) or
+EXPANSION_PROFILE=1) the outermost span on each thread is run under
+cProfile and its top functions are kept in a second, smaller buffer.
+
+Usage:
+    from metrics import timed, note, latency_summary
+    with timed("load_table", table="master_state", cache="hit") as span:
+        df = ...
+        span.update(rows=len(df), source="csv")
+    note(cache="miss")                         # from inside a cached body
+    latency_summary(["stage", "table"])        # p50/p95 per table and stage
+"""
+
+import cProfile
+import io
+import os
+import pstats
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime
+
+import pandas as pd
+
+RING_SIZE = 5000           # events kept per process
+PROFILE_RING_SIZE = 20     # cProfile captures kept per process
+PROFILE_TOP = 25           # functions listed per capture
+
+EVENT_COLS = ["ts", "stage", "table", "seconds", "rows", "bytes", "cache", "source", "error"]
+
+_events = deque(maxlen=RING_SIZE)
+_profiles = deque(maxlen=PROFILE_RING_SIZE)
+_lock = threading.Lock()
+_local = threading.local()
+_profiling = {"on": os.environ.get("EXPANSION_PROFILE", "").lower() in ("1", "true", "yes")}
+
+
+# === Recording =======================================================
+
+def record(stage: str, table: str = None, seconds: float = 0.0, **fields):
+    """Append one event to the ring buffer."""
+    event = {"ts": datetime.now().isoformat(timespec="milliseconds"), "stage": stage,
+             "table": table, "seconds": seconds}
+    event.update(fields)
+    with _lock:
+        _events.append(event)
+
+
+def _stack() -> list:
+    stack = getattr(_local, "stack", None)
+    if stack is None:
+        stack = _local.stack = []
+    return stack
+
+
+def note(**fields):
+    """Set fields on the innermost open span of this thread (no-op outside one).
+
+    Lets a cached function body mark its caller's span as a miss, or report
+    where it read from, without knowing who is timing it.
+    """
+    stack = _stack()
+    if stack:
+        stack[-1].update(fields)
+
+
+@contextmanager
+def timed(stage: str, table: str = None, **fields):
+    """Time a block and record it; the yielded dict takes rows/bytes/source/... ."""
+    span = dict(fields)
+    stack = _stack()
+    profiler = None
+    if _profiling["on"] and not stack:
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except Exception:
+            profiler = None     # another profiler is active on this interpreter
+    stack.append(span)
+    started = time.perf_counter()
+    try:
+        yield span
+    except BaseException as e:
+        span.setdefault("error", f"{type(e).__name__}: {e}")
+        raise
+    finally:
+        seconds = time.perf_counter() - started
+        stack.pop()
+        if profiler is not None:
+            profiler.disable()
+            _keep_profile(stage, table, seconds, profiler)
+        record(stage, table, seconds, **span)
+
+
+# === Profiling =======================================================
+
+def set_profiling(on: bool):
+    """Switch cProfile capture of outermost spans on or off for the process."""
+    _profiling["on"] = bool(on)
+
+
+def profiling_enabled() -> bool:
+    return _profiling["on"]
+
+
+def _keep_profile(stage: str, table: str, seconds: float, profiler: cProfile.Profile):
+    out = io.StringIO()
+    try:
+        pstats.Stats(profiler, stream=out).sort_stats("cumulative").print_stats(PROFILE_TOP)
+    except Exception:
+        return
+    with _lock:
+        _profiles.append({"ts": datetime.now().isoformat(timespec="seconds"), "stage": stage,
+                          "table": table, "seconds": seconds, "stats": out.getvalue()})
+
+
+def recent_profiles() -> list:
+    """cProfile captures, newest first."""
+    with _lock:
+        return list(reversed(_profiles))
+
+
+# === Reporting =======================================================
+
+def events() -> pd.DataFrame:
+    """The ring buffer as a frame, oldest first."""
+    with _lock:
+        rows = list(_events)
+    df = pd.DataFrame(rows)
+    for col in EVENT_COLS:
+        if col not in df.columns:
+            df[col] = None
+    return df[EVENT_COLS + [c for c in df.columns if c not in EVENT_COLS]]
+
+
+def latency_summary(by=("stage", "table")) -> pd.DataFrame:
+    """Calls, p50/p95/max latency (ms), cache hit rate and volume per group."""
+    by = list(by)
+    df = events()
+    cols = by + ["calls", "p50_ms", "p95_ms", "max_ms", "hit_rate", "rows", "mb", "errors"]
+    if df.empty:
+        return pd.DataFrame(columns=cols)
+    df = df.assign(ms=df["seconds"].astype(float) * 1000,
+                   hit=df["cache"].map({"hit": 1.0, "miss": 0.0}),
+                   rows=pd.to_numeric(df["rows"], errors="coerce"),
+                   mb=pd.to_numeric(df["bytes"], errors="coerce") / 2**20,
+                   failed=df["error"].notna())
+    for col in by:
+        df[col] = df[col].fillna("")
+    out = df.groupby(by, sort=False).agg(
+        calls=("ms", "size"), p50_ms=("ms", "median"), p95_ms=("ms", lambda s: s.quantile(0.95)),
+        max_ms=("ms", "max"), hit_rate=("hit", "mean"), rows=("rows", "sum"), mb=("mb", "sum"),
+        errors=("failed", "sum"),
+    ).reset_index()
+    return out.sort_values("p95_ms", ascending=False, ignore_index=True)[cols]
+
+
+def clear():
+    """Empty the event and profile buffers."""
+    with _lock:
+        _events.clear()
+        _profiles.clear()
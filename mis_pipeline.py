@@ -0,0 +1,569 @@
+"""
+Expansion OS - MIS Stitch Pipeline
+==================================
+Builds the per-clinic frame (df_main) from the VG MIS exports and keeps a
+persistent Parquet snapshot of every merge stage under data/snapshots/.
+
+Each stage is keyed on the size, mtime and SHA-256 of its source file, so a
+cold start with unchanged exports reads one Parquet file instead of seven
+CSVs, and replacing a single MIS sheet rebuilds only that sheet's stage.
+
+The clinic first-time-customer file additionally feeds an incremental
+per-clinic, per-month store of distinct customer IDs, so any trailing 1Cx
+window is answered from monthly partitions instead of the raw CSV.
+
+Sheets are stitched on an integer Clinic_ID from the clinic dimension (see
+below), not on their free-text clinic names.
+
+Usage:
+    from mis_pipeline import build_core_frame, trailing_1cx
+    df_main = build_core_frame()            # MIS files in the working dir
+    df_6m = trailing_1cx(6)                 # Clinic, Avg_Monthly_1Cx
+    report = clinic_match_report()          # sheet names that matched no clinic
+"""
+
+import difflib
+import hashlib
+import json
+import os
+import re
+
+import numpy as np
+import pandas as pd
+
+from db import DATA_DIR
+from metrics import note, timed
+
+SNAPSHOT_DIR = os.path.join(DATA_DIR, "snapshots")
+MANIFEST_PATH = os.path.join(SNAPSHOT_DIR, "manifest.json")
+
+# Bump when any stage's transformation changes so old snapshots are ignored.
+PIPELINE_VERSION = 3
+
+MIS_PREFIX = "Copy of (Vg) Clinic Location - Monthly MIS.xlsx - "
+
+# === Source files (stage -> CSV export name) =========================
+SOURCE_FILES = {
+    "geo":      "Clinic latitude longitude.xlsx - Sheet1.csv",
+    "sales":    MIS_PREFIX + "SalesMTD.csv",
+    "ebitda":   MIS_PREFIX + "Ebitda Trend.csv",
+    "show":     MIS_PREFIX + "NTBShow%.csv",
+    "conv":     MIS_PREFIX + "1Conv.csv",
+    "appt":     MIS_PREFIX + "NTBAppointment.csv",
+    "first_1cx": "First Time customer - Clinic ( 2023 to 2025).csv",
+}
+
+NUMERIC_COLS = ["Sales_MTD_Lacs", "Age_Months", "NTB_Show_Rate_Pct", "Conversion_1Cx_Pct",
+                "EBITDA_Margin_Pct", "Avg_Monthly_Appointments", "Avg_Monthly_Shows", "Avg_Monthly_1Cx"]
+
+
+# === Stages (one per source sheet) ===================================
+
+def _stage_geo(path: str) -> pd.DataFrame:
+    """1. Base Geo-Data (the 62 clinics)."""
+    df_geo = pd.read_csv(path)
+    df_geo = df_geo.rename(columns={"Area": "Clinic", "Latitude": "Lat", "Longitude": "Lon"})
+    return df_geo[["Clinic", "City", "Lat", "Lon"]].dropna(subset=["Clinic"])
+
+
+def _stage_sales(path: str) -> pd.DataFrame:
+    """2. Sales & Age (from SalesMTD)."""
+    df_sales = pd.read_csv(path, header=0)
+    df_sales = df_sales.rename(columns={"Area": "Clinic", "All": "Sales_MTD_Lacs"})
+    return df_sales[["Clinic", "Region", "Age", "Sales_MTD_Lacs"]]
+
+
+def _stage_ebitda(path: str) -> pd.DataFrame:
+    """3. EBITDA Margin (from Ebitda Trend)."""
+    df_ebitda = pd.read_csv(path, header=0)
+    df_ebitda = df_ebitda.rename(columns={df_ebitda.columns[0]: "Clinic", "Fy26": "EBITDA_Margin_Pct"})
+    df_ebitda["EBITDA_Margin_Pct"] = pd.to_numeric(df_ebitda["EBITDA_Margin_Pct"], errors='coerce') * 100
+    return df_ebitda[["Clinic", "EBITDA_Margin_Pct"]]
+
+
+def _stage_show(path: str) -> pd.DataFrame:
+    """4. NTB Show Rate (from NTBShow%)."""
+    df_show = pd.read_csv(path, header=1)
+    df_show = df_show.rename(columns={"Area": "Clinic"})
+    show_col = [c for c in df_show.columns if 'All' in c][-1]
+    df_show["NTB_Show_Rate_Pct"] = pd.to_numeric(df_show[show_col], errors='coerce') * 100
+    return df_show[["Clinic", "NTB_Show_Rate_Pct"]]
+
+
+def _stage_conv(path: str) -> pd.DataFrame:
+    """5. 1Cx Conversion % (from 1Conv)."""
+    df_conv = pd.read_csv(path, header=0)
+    df_conv = df_conv.rename(columns={"Area": "Clinic", "All": "Conversion_1Cx_Pct"})
+    df_conv["Conversion_1Cx_Pct"] = pd.to_numeric(df_conv["Conversion_1Cx_Pct"], errors='coerce') * 100
+    return df_conv[["Clinic", "Conversion_1Cx_Pct"]]
+
+
+def _stage_appt(path: str) -> pd.DataFrame:
+    """6. Absolute Appointments (Last 12 Months Avg)."""
+    df_appt = pd.read_csv(path, header=1)
+    df_appt = df_appt.rename(columns={"Area": "Clinic"})
+    date_cols = [c for c in df_appt.columns if '202' in str(c)]
+    last_12_dates = date_cols[-12:] if len(date_cols) >= 12 else date_cols
+    df_appt[last_12_dates] = df_appt[last_12_dates].apply(pd.to_numeric, errors='coerce')
+    df_appt["Avg_Monthly_Appointments"] = df_appt[last_12_dates].mean(axis=1)
+    return df_appt[["Clinic", "Avg_Monthly_Appointments"]]
+
+
+def _stage_first_1cx(path: str) -> pd.DataFrame:
+    """7. Absolute 1Cx Conversions (Unique Customer IDs / 12 Months)."""
+    sync_1cx_store(path)
+    return trailing_1cx(12)
+
+
+# Merge order matters: "geo" is the left side of every join.
+STAGES = {
+    "geo":       _stage_geo,
+    "sales":     _stage_sales,
+    "ebitda":    _stage_ebitda,
+    "show":      _stage_show,
+    "conv":      _stage_conv,
+    "appt":      _stage_appt,
+    "first_1cx": _stage_first_1cx,
+}
+
+
+# === Fingerprints & manifest =========================================
+
+def _sha256(path: str) -> str:
+    """Hash a file in 1 MB blocks."""
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def file_fingerprint(path: str, known: dict = None) -> dict:
+    """Return {size, mtime_ns, sha256} for a file.
+
+    The hash is reused from `known` when size and mtime are unchanged, so an
+    untouched export is never re-read just to be fingerprinted.
+    """
+    stat = os.stat(path)
+    fp = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+    if known and known.get("size") == fp["size"] and known.get("mtime_ns") == fp["mtime_ns"] \
+            and known.get("sha256"):
+        fp["sha256"] = known["sha256"]
+    else:
+        fp["sha256"] = _sha256(path)
+    return fp
+
+
+def _load_manifest() -> dict:
+    if os.path.exists(MANIFEST_PATH):
+        try:
+            with open(MANIFEST_PATH) as f:
+                manifest = json.load(f)
+            if manifest.get("version") == PIPELINE_VERSION:
+                return manifest
+        except Exception:
+            pass
+    return {"version": PIPELINE_VERSION, "stages": {}, "core": {}}
+
+
+def _save_manifest(manifest: dict):
+    tmp = MANIFEST_PATH + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp, MANIFEST_PATH)
+
+
+def _snapshot_path(name: str) -> str:
+    return os.path.join(SNAPSHOT_DIR, f"{name}.parquet")
+
+
+def _read_snapshot(name: str):
+    path = _snapshot_path(name)
+    if os.path.exists(path):
+        try:
+            return pd.read_parquet(path)
+        except Exception:
+            pass
+    return None
+
+
+def _write_snapshot(name: str, df: pd.DataFrame) -> bool:
+    """Write a Parquet snapshot atomically. Returns False if it could not be written."""
+    path = _snapshot_path(name)
+    tmp = path + ".tmp"
+    try:
+        df.to_parquet(tmp, index=False)
+        os.replace(tmp, path)
+        return True
+    except Exception:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        return False
+
+
+# === 1Cx monthly store ================================================
+# One Parquet partition per month holding the distinct (Clinic, Customer ID)
+# pairs seen that month. The raw export only ever grows by appended rows, so
+# the store remembers how far it has read plus a hash of that prefix and
+# parses just the new tail; any rewrite of earlier rows triggers a rebuild.
+
+STORE_1CX_DIR = os.path.join(SNAPSHOT_DIR, "first_1cx_monthly")
+STORE_1CX_STATE = os.path.join(STORE_1CX_DIR, "state.json")
+STORE_1CX_COLS = ["Date", "Clinic Loc", "Customer ID"]
+
+
+def _hash_range(path: str, start: int, stop: int, h):
+    """Feed bytes [start, stop) of a file into hasher `h` and return it."""
+    with open(path, "rb") as f:
+        f.seek(start)
+        remaining = stop - start
+        while remaining > 0:
+            block = f.read(min(1 << 20, remaining))
+            if not block:
+                break
+            h.update(block)
+            remaining -= len(block)
+    return h
+
+
+def _load_1cx_state() -> dict:
+    if os.path.exists(STORE_1CX_STATE):
+        try:
+            with open(STORE_1CX_STATE) as f:
+                state = json.load(f)
+            if state.get("version") == PIPELINE_VERSION:
+                return state
+        except Exception:
+            pass
+    return {}
+
+
+def _month_partition(month: str) -> str:
+    return os.path.join(STORE_1CX_DIR, f"{month}.parquet")
+
+
+def _store_months() -> list:
+    if not os.path.isdir(STORE_1CX_DIR):
+        return []
+    return sorted(f[:-len(".parquet")] for f in os.listdir(STORE_1CX_DIR) if f.endswith(".parquet"))
+
+
+def _append_1cx_rows(chunks) -> int:
+    """Fold raw rows into the monthly partitions. Returns rows consumed."""
+    pending = {}
+    rows = 0
+    for chunk in chunks:
+        rows += len(chunk)
+        dates = pd.to_datetime(chunk["Date"], errors='coerce', dayfirst=True)
+        df = pd.DataFrame({
+            "Month": dates.dt.strftime("%Y-%m"),
+            "Clinic": chunk["Clinic Loc"].astype("string"),
+            "Customer ID": chunk["Customer ID"].astype("string"),
+        }).dropna().drop_duplicates()
+        for month, grp in df.groupby("Month"):
+            pending.setdefault(month, []).append(grp[["Clinic", "Customer ID"]])
+
+    for month, parts in pending.items():
+        existing = _read_partition(month)
+        if existing is not None:
+            parts.insert(0, existing)
+        merged = pd.concat(parts, ignore_index=True).drop_duplicates(ignore_index=True)
+        tmp = _month_partition(month) + ".tmp"
+        merged.to_parquet(tmp, index=False)
+        os.replace(tmp, _month_partition(month))
+    return rows
+
+
+def _read_partition(month: str):
+    path = _month_partition(month)
+    return pd.read_parquet(path) if os.path.exists(path) else None
+
+
+def sync_1cx_store(path: str, chunksize: int = 250_000) -> dict:
+    """Bring the monthly 1Cx store up to date with the clinic first-time file.
+
+    Only bytes appended since the last sync are parsed. Returns the store
+    state ({offset, rows, months, ...}).
+    """
+    os.makedirs(STORE_1CX_DIR, exist_ok=True)
+    state = _load_1cx_state()
+    size = os.path.getsize(path)
+    header = list(pd.read_csv(path, nrows=0).columns)
+
+    offset = state.get("offset", 0)
+    prefix = hashlib.sha256()
+    resumable = (
+        state.get("resumable") and state.get("header") == header and 0 < offset <= size
+        and _hash_range(path, 0, offset, prefix).hexdigest() == state.get("prefix_sha256")
+    )
+    if resumable and offset == size:
+        return state
+
+    if resumable:
+        with open(path, "rb") as f:
+            f.seek(offset)
+            rows = _append_1cx_rows(pd.read_csv(f, header=None, names=header, usecols=STORE_1CX_COLS,
+                                                dtype=str, chunksize=chunksize))
+        rows += state.get("rows", 0)
+        _hash_range(path, offset, size, prefix)
+    else:
+        for month in _store_months():
+            os.remove(_month_partition(month))
+        rows = _append_1cx_rows(pd.read_csv(path, usecols=STORE_1CX_COLS, dtype=str, chunksize=chunksize))
+        prefix = _hash_range(path, 0, size, hashlib.sha256())
+
+    with open(path, "rb") as f:
+        f.seek(max(size - 1, 0))
+        ends_with_newline = f.read(1) == b"\n"
+    state = {
+        "version": PIPELINE_VERSION,
+        "header": header,
+        "offset": size,
+        "prefix_sha256": prefix.hexdigest(),
+        # A file that ends mid-line could have that line extended later
+        "resumable": ends_with_newline,
+        "rows": rows,
+        "months": _store_months(),
+    }
+    tmp = STORE_1CX_STATE + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(state, f, indent=2)
+    os.replace(tmp, STORE_1CX_STATE)
+    return state
+
+
+def store_1cx_version() -> str:
+    """Stamp of the monthly 1Cx store; changes whenever a sync adds rows."""
+    try:
+        return str(os.stat(STORE_1CX_STATE).st_mtime_ns)
+    except OSError:
+        return "none"
+
+
+def trailing_1cx(months: int = 12) -> pd.DataFrame:
+    """Average monthly unique 1Cx customers per clinic over the last `months`.
+
+    The window is the `months` calendar months ending with the latest month
+    in the store. Returns Clinic, Avg_Monthly_1Cx.
+    """
+    available = _store_months()
+    if not available:
+        return pd.DataFrame({"Clinic": pd.Series(dtype=str), "Avg_Monthly_1Cx": pd.Series(dtype=float)})
+    start = (pd.Period(available[-1], freq="M") - (months - 1)).strftime("%Y-%m")
+    window = pd.concat([_read_partition(m) for m in available if m >= start], ignore_index=True)
+    df_grp = window.groupby("Clinic")["Customer ID"].nunique().reset_index()
+    df_grp = df_grp.rename(columns={"Customer ID": "Avg_Monthly_1Cx"})
+    df_grp["Clinic"] = df_grp["Clinic"].astype(object)
+    df_grp["Avg_Monthly_1Cx"] = df_grp["Avg_Monthly_1Cx"] / months
+    return df_grp[["Clinic", "Avg_Monthly_1Cx"]]
+
+
+# === Clinic dimension ================================================
+# The geo sheet defines the canonical clinics; each gets an integer
+# Clinic_ID. Every other sheet's free-text name (Area, Clinic Loc, ...) is
+# mapped to that ID through a normalised name (case, spacing, punctuation)
+# and the optional alias table, so the stitch aligns on integers and a name
+# that still does not match is reported instead of silently zero-filled.
+
+CLINIC_ALIAS_FILE = os.path.join(DATA_DIR, "clinic_aliases.csv")   # columns: Alias, Clinic
+
+UNMATCHED_COLS = ["Stage", "Source_Name", "Rows", "Suggestion"]
+
+
+_NON_ALNUM = re.compile(r"[^a-z0-9]+")
+
+
+def _name_key(name):
+    return _NON_ALNUM.sub("", name.lower()) if isinstance(name, str) else None
+
+
+def clinic_key(names: pd.Series) -> pd.Series:
+    """Normalised clinic name used for matching (lower-case, letters and digits only)."""
+    return pd.Series([_name_key(n) for n in names], index=names.index, dtype=object)
+
+
+def load_clinic_aliases() -> dict:
+    """{normalised alias: normalised canonical name} from CLINIC_ALIAS_FILE."""
+    if not os.path.exists(CLINIC_ALIAS_FILE):
+        return {}
+    df = pd.read_csv(CLINIC_ALIAS_FILE, dtype=str).dropna(subset=["Alias", "Clinic"])
+    return dict(zip(clinic_key(df["Alias"]), clinic_key(df["Clinic"])))
+
+
+def build_clinic_dimension(df_geo: pd.DataFrame) -> pd.DataFrame:
+    """Clinic_ID, Clinic, Key for each distinct clinic of the geo sheet."""
+    dim = pd.DataFrame({"Clinic": df_geo["Clinic"].astype(object), "Key": clinic_key(df_geo["Clinic"])})
+    dim = dim[dim["Key"].notna() & (dim["Key"] != "")].drop_duplicates("Key").reset_index(drop=True)
+    dim.insert(0, "Clinic_ID", np.arange(len(dim), dtype=np.int32))
+    return dim
+
+
+def clinic_dimension(df_main: pd.DataFrame) -> pd.DataFrame:
+    """The dimension (Clinic_ID, Clinic, Key) carried by a stitched frame."""
+    dim = df_main[["Clinic_ID", "Clinic"]].drop_duplicates("Clinic_ID").reset_index(drop=True)
+    dim["Key"] = clinic_key(dim["Clinic"])
+    return dim
+
+
+def map_clinic_ids(names: pd.Series, dim: pd.DataFrame, aliases: dict = None) -> np.ndarray:
+    """Clinic_ID for each name (-1 where it matches no clinic or alias)."""
+    lookup = dict(zip(dim["Key"], dim["Clinic_ID"]))
+    aliases = aliases or {}
+    keys = (_name_key(n) for n in names)
+    return np.fromiter((lookup.get(aliases.get(k, k), -1) for k in keys), dtype=np.int64, count=len(names))
+
+
+def align_to_clinics(df: pd.DataFrame, clinic_ids, dim: pd.DataFrame, aliases: dict = None,
+                     ids: np.ndarray = None) -> pd.DataFrame:
+    """Rows of `df` (keyed by its Clinic name) reordered onto `clinic_ids`.
+
+    Positions with no matching row come back as NaN; the first row wins
+    when a sheet repeats a clinic. `ids` skips the name lookup when the
+    caller already has map_clinic_ids(df["Clinic"], ...).
+    """
+    if ids is None:
+        ids = map_clinic_ids(df["Clinic"], dim, aliases)
+    clinic_ids = np.asarray(clinic_ids, dtype=np.int64)
+    # Sized by the largest id, not len(dim): Clinic_IDs are global and dim may be a subset
+    size = int(max(np.max(clinic_ids, initial=-1), np.max(ids, initial=-1))) + 2
+    row_of = np.full(size, -1, dtype=np.int64)               # last slot absorbs id -1
+    matched = np.flatnonzero(ids >= 0)[::-1]                 # reversed so the first row wins
+    row_of[ids[matched]] = matched
+    rows = row_of[clinic_ids]
+    return df.drop(columns="Clinic").reset_index(drop=True).reindex(rows).reset_index(drop=True)
+
+
+def _unmatched(stage: str, names: pd.Series, ids: np.ndarray, dim: pd.DataFrame) -> pd.DataFrame:
+    missed = names[(ids < 0) & names.notna().to_numpy()].astype(str)
+    if missed.empty:
+        return pd.DataFrame(columns=UNMATCHED_COLS)
+    counts = missed.value_counts()
+    canon = dim["Clinic"].astype(str).tolist()
+    return pd.DataFrame({
+        "Stage": stage,
+        "Source_Name": counts.index,
+        "Rows": counts.to_numpy(),
+        "Suggestion": [next(iter(difflib.get_close_matches(n, canon, n=1, cutoff=0.6)), "") for n in counts.index],
+    })
+
+
+# === Stitch ==========================================================
+
+_match_report = {"df": None}
+
+
+def _stitch(frames: dict, aliases: dict = None):
+    """Align stage outputs onto the geo frame by Clinic_ID and apply final cleaning.
+
+    Returns (df_main, unmatched-name report).
+    """
+    df_geo = frames["geo"].reset_index(drop=True)
+    dim = build_clinic_dimension(df_geo)
+    geo_ids = map_clinic_ids(df_geo["Clinic"], dim)
+
+    parts, reports = [df_geo.assign(Clinic_ID=geo_ids)], []
+    for name in STAGES:
+        if name == "geo":
+            continue
+        with timed("stitch_merge", table=name) as span:
+            stage = frames[name]
+            ids = map_clinic_ids(stage["Clinic"], dim, aliases)
+            if (ids < 0).any():
+                reports.append(_unmatched(name, stage["Clinic"], ids, dim))
+            parts.append(align_to_clinics(stage, geo_ids, dim, ids=ids))
+            span.update(rows=len(stage), unmatched=int((ids < 0).sum()))
+
+    with timed("stitch_clean", rows=len(df_geo)):
+        df_main = pd.concat(parts, axis=1)
+
+        # 8. Calculate Absolute Shows
+        df_main["Avg_Monthly_Shows"] = df_main["Avg_Monthly_Appointments"] * (df_main["NTB_Show_Rate_Pct"] / 100)
+
+        # Format and Clean the Stitched Data
+        df_main = df_main.rename(columns={"Age": "Age_Months"})
+        df_main = df_main.fillna(0)
+        for col in NUMERIC_COLS:
+            df_main[col] = pd.to_numeric(df_main[col], errors='coerce').fillna(0)
+
+    report = pd.concat([r for r in reports if not r.empty] or [pd.DataFrame(columns=UNMATCHED_COLS)],
+                       ignore_index=True)
+    return df_main[df_main["Lat"] != 0].reset_index(drop=True), report
+
+
+def clinic_match_report() -> pd.DataFrame:
+    """Sheet clinic names that matched no clinic in the last build_core_frame.
+
+    One row per (Stage, Source_Name) with its row count and the closest
+    canonical name - add it to clinic_aliases.csv to fix the match.
+    """
+    if _match_report["df"] is not None:
+        return _match_report["df"]
+    report = _read_snapshot("unmatched")
+    return report if report is not None else pd.DataFrame(columns=UNMATCHED_COLS)
+
+
+def build_core_frame(source_dir: str = "", use_snapshot: bool = True) -> pd.DataFrame:
+    """Build the stitched clinic frame, reusing Parquet snapshots where valid.
+
+    Raises the underlying read error if a source file is missing or malformed,
+    exactly like the inline loader it replaces.
+    """
+    with timed("build_core_frame") as span:
+        df_main = _build_core_frame(source_dir, use_snapshot)
+        span.update(rows=len(df_main), bytes=int(df_main.memory_usage(index=False).sum()))
+    return df_main
+
+
+def _build_core_frame(source_dir: str, use_snapshot: bool) -> pd.DataFrame:
+    paths = {name: os.path.join(source_dir, fname) for name, fname in SOURCE_FILES.items()}
+    aliases = load_clinic_aliases()
+    if not use_snapshot:
+        note(source="csv")
+        df_main, _match_report["df"] = _stitch({name: fn(paths[name]) for name, fn in STAGES.items()}, aliases)
+        return df_main
+
+    os.makedirs(SNAPSHOT_DIR, exist_ok=True)
+    manifest = _load_manifest()
+    prints = {name: file_fingerprint(paths[name], manifest["stages"].get(name)) for name in STAGES}
+    alias_hash = _sha256(CLINIC_ALIAS_FILE) if os.path.exists(CLINIC_ALIAS_FILE) else "none"
+    core_key = hashlib.sha256(
+        ("|".join(f"{name}:{prints[name]['sha256']}" for name in STAGES) + f"|aliases:{alias_hash}").encode()
+    ).hexdigest()
+
+    # Fast path: nothing changed since the last full stitch
+    if manifest["core"].get("key") == core_key:
+        df_main = _read_snapshot("core")
+        if df_main is not None:
+            note(source="snapshot")
+            _match_report["df"] = None      # served from the "unmatched" snapshot
+            if any(manifest["stages"].get(n, {}).get("mtime_ns") != prints[n]["mtime_ns"] for n in STAGES):
+                for name in STAGES:
+                    manifest["stages"][name].update(prints[name])
+                _save_manifest(manifest)
+            return df_main
+
+    # Rebuild only the stages whose source hash changed
+    note(source="rebuild")
+    frames = {}
+    for name, fn in STAGES.items():
+        with timed("mis_stage", table=name, source="snapshot") as span:
+            entry = manifest["stages"].get(name, {})
+            df_stage = _read_snapshot(name) if entry.get("sha256") == prints[name]["sha256"] else None
+            if df_stage is None:
+                span["source"] = "csv"
+                df_stage = fn(paths[name])
+                if not _write_snapshot(name, df_stage):
+                    prints[name]["sha256"] = None   # never trust a snapshot we failed to write
+            span["rows"] = len(df_stage)
+        frames[name] = df_stage
+        manifest["stages"][name] = {"source": SOURCE_FILES[name], **prints[name]}
+
+    df_main, report = _stitch(frames, aliases)
+    _match_report["df"] = report
+    if all(manifest["stages"][n]["sha256"] for n in STAGES) and _write_snapshot("unmatched", report) \
+            and _write_snapshot("core", df_main):
+        manifest["core"] = {"key": core_key, "rows": len(df_main)}
+    else:
+        manifest["core"] = {}
+    _save_manifest(manifest)
+    return df_main
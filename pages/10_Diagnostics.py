@@ -0,0 +1,91 @@
+"""
+Expansion OS - Performance Diagnostics
+======================================
+Where time goes in this process: p50/p95 latency per table and per stage
+from the metrics ring buffer, cache hit rates, the Neon breaker, recent
+cProfile captures and table memory footprints.
+"""
+
+import plotly.express as px
+import streamlit as st
+
+from db import get_db_status, memory_report
+from metrics import (RING_SIZE, clear, events, latency_summary, profiling_enabled, recent_profiles,
+                     set_profiling)
+
+st.set_page_config(page_title="Diagnostics - Expansion OS", layout="wide")
+
+st.title("⏱️ Performance Diagnostics")
+st.caption(f"Timings recorded in this server process since it started (last {RING_SIZE:,} events, all sessions).")
+
+# --- CONTROLS ---
+col1, col2, col3 = st.columns([2, 1, 3])
+profile_on = col1.toggle("Capture cProfile", value=profiling_enabled(),
+                         help="Profiles the outermost timed call on each thread. Adds overhead - leave off in normal use.")
+if profile_on != profiling_enabled():
+    set_profiling(profile_on)
+if col2.button("Clear buffer"):
+    clear()
+status = get_db_status()
+breaker = status.get("breaker")
+col3.markdown(f"{status['icon']} **{status['mode']}**"
+              + (f" - breaker {breaker['state']}, {breaker['failures']} consecutive failures" if breaker else ""))
+if breaker and breaker.get("last_error"):
+    col3.caption(f"Last connection error: {breaker['last_error']}")
+
+df_events = events()
+if df_events.empty:
+    st.info("No timings yet. Open the other pages to load data, then come back.")
+    st.stop()
+
+# --- HEADLINE ---
+loads = df_events[df_events["stage"] == "load_table"]
+m1, m2, m3, m4 = st.columns(4)
+m1.metric("Events", f"{len(df_events):,}")
+m2.metric("Table loads", f"{len(loads):,}")
+m3.metric("Load cache hit rate", f"{(loads['cache'] == 'hit').mean():.0%}" if len(loads) else "-")
+m4.metric("Errors", int(df_events["error"].notna().sum()))
+
+st.divider()
+
+tab_stage, tab_table, tab_stitch, tab_recent, tab_profile, tab_memory = st.tabs(
+    ["By stage", "By table", "MIS stitch", "Recent events", "Profiles", "Memory"])
+
+with tab_stage:
+    by_stage = latency_summary(["stage"])
+    fig = px.bar(by_stage.melt(id_vars="stage", value_vars=["p50_ms", "p95_ms"], var_name="Percentile",
+                               value_name="ms"),
+                 x="stage", y="ms", color="Percentile", barmode="group", title="Latency by stage (ms)")
+    st.plotly_chart(fig, use_container_width=True)
+    st.dataframe(by_stage, hide_index=True, use_container_width=True)
+
+with tab_table:
+    stages = ["load_table", "save_table", "sync_table"]
+    pick = st.selectbox("Stage", stages)
+    by_table = latency_summary(["stage", "table", "source"])
+    st.dataframe(by_table[by_table["stage"] == pick].drop(columns="stage"), hide_index=True,
+                 use_container_width=True)
+
+with tab_stitch:
+    st.markdown("Per-sheet read (`mis_stage`: snapshot or CSV) and merge onto the clinic dimension (`stitch_merge`).")
+    stitch = latency_summary(["stage", "table"])
+    st.dataframe(stitch[stitch["stage"].isin(["build_core_frame", "mis_stage", "stitch_merge", "stitch_clean"])],
+                 hide_index=True, use_container_width=True)
+
+with tab_recent:
+    recent = df_events.iloc[::-1].head(200).assign(ms=lambda d: (d["seconds"] * 1000).round(1))
+    st.dataframe(recent.drop(columns="seconds"), hide_index=True, use_container_width=True)
+
+with tab_profile:
+    captures = recent_profiles()
+    if not captures:
+        st.info("No captures. Switch on 'Capture cProfile' above and reload a page.")
+    for cap in captures:
+        label = f"{cap['ts']} - {cap['stage']}" + (f" ({cap['table']})" if cap["table"] else "")
+        with st.expander(f"{label} - {cap['seconds'] * 1000:,.0f} ms"):
+            st.code(cap["stats"], language="text")
+
+with tab_memory:
+    st.caption("Re-reads every local CSV, so it is only run on request.")
+    if st.button("Measure table memory"):
+        st.dataframe(memory_report(), hide_index=True, use_container_width=True)
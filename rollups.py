@@ -0,0 +1,251 @@
+"""
+Expansion Intelligence Platform - Rollup Cubes
+==============================================
+Pre-aggregated Region / State / City / Clinic x Month / Quarter / Year sums
+for the monthly and geo tables, built when a table is saved (save_table)
+instead of by a fresh groupby on every rerun. Each cube also keeps
+membership bitmaps - which of its finest-level geo members belong to each
+Region and State - so filtering and drill-down are bit lookups.
+
+Cubes are stored under data/cubes/ and tagged with the table's version
+(Neon metadata version + CSV stamp); a stale or missing cube is rebuilt
+from load_table on first use.
+
+Usage:
+    from rollups import get_cube
+    cube = get_cube("clinic_monthly_trend")
+    by_state_q = cube.rollup("State", "Quarter")
+    west_cities = cube.rollup("City", "Year", filters={"Region": "West"})
+    cube.drill("State", "Maharashtra", "City")        # member cities
+"""
+
+import json
+import os
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+from db import DATA_DIR, load_table, table_version
+
+CUBE_DIR = os.path.join(DATA_DIR, "cubes")
+CUBE_VERSION = 1
+
+# Tables that get a cube on save
+ROLLUP_TABLES = ["clinic_monthly_trend", "ntb_zipdata_monthly", "year_state_orders",
+                 "city_orders_summary", "product_state"]
+
+GEO_LEVELS = ["Region", "State", "City", "Clinic"]     # coarse -> fine
+GRAINS = ["Month", "Quarter", "Year"]
+BITMAP_LEVELS = ["Region", "State"]
+
+# Numeric columns that are identifiers or periods, never summed
+NON_MEASURES = {"year", "month", "quarter", "pincode", "pin", "zip", "id", "lat", "lon",
+                "latitude", "longitude", "rank"}
+
+
+# === Build ===========================================================
+
+def _periods(df: pd.DataFrame) -> dict:
+    """{grain: period labels} derivable from the table's Month / Year columns."""
+    out = {}
+    if "Month" in df.columns:
+        dates = pd.to_datetime(df["Month"].astype(str), errors="coerce", format="mixed")
+        if dates.notna().mean() >= 0.9:
+            out["Month"] = dates.dt.strftime("%Y-%m")
+            out["Quarter"] = dates.dt.year.astype("Int64").astype(str) + "Q" + dates.dt.quarter.astype("Int64").astype(str)
+            out["Year"] = dates.dt.year.astype("Int64").astype(str)
+            return out
+    if "Year" in df.columns:
+        years = pd.to_numeric(df["Year"], errors="coerce")
+        if years.notna().any():
+            out["Year"] = years.astype("Int64").astype(str)
+    return out
+
+
+def _measures(df: pd.DataFrame) -> list:
+    return [c for c in df.columns
+            if pd.api.types.is_numeric_dtype(df[c]) and not pd.api.types.is_bool_dtype(df[c])
+            and c.lower() not in NON_MEASURES and c not in GEO_LEVELS]
+
+
+def build_cube(df: pd.DataFrame) -> "RollupCube":
+    """Aggregate every (geo level, grain) combination the table supports."""
+    geos = [g for g in GEO_LEVELS if g in df.columns]
+    periods = _periods(df)
+    measures = _measures(df)
+
+    base = pd.DataFrame({g: df[g].astype("string") for g in geos}, index=df.index)
+    for grain, labels in periods.items():
+        base[f"_{grain}"] = labels
+    for m in measures:
+        base[m] = pd.to_numeric(df[m], errors="coerce").astype("float64")
+    base["Rows"] = 1
+
+    parts = []
+    for geo in [None] + geos:
+        for grain in [None] + list(periods):
+            keys = ([geo] if geo else []) + ([f"_{grain}"] if grain else [])
+            cols = measures + ["Rows"]
+            agg = base.groupby(keys, dropna=False)[cols].sum().reset_index() if keys \
+                else base[cols].sum().to_frame().T
+            agg.insert(0, "Geo_Level", geo or "")
+            agg.insert(1, "Grain", grain or "")
+            agg.insert(2, "Geo", agg.pop(geo).astype("string") if geo else "")
+            agg.insert(3, "Period", agg.pop(f"_{grain}").astype("string") if grain else "")
+            parts.append(agg)
+    aggregates = pd.concat(parts, ignore_index=True)
+    aggregates["Rows"] = aggregates["Rows"].astype("int64")
+
+    members = base[geos].drop_duplicates().reset_index(drop=True) if geos else pd.DataFrame()
+    bitmaps = {}
+    for level in BITMAP_LEVELS:
+        if level in members.columns:
+            bitmaps[level] = {str(v): np.packbits((members[level] == v).fillna(False).to_numpy(dtype=bool))
+                              for v in members[level].dropna().unique()}
+    return RollupCube(aggregates, members, bitmaps, measures)
+
+
+# === Cube ============================================================
+
+class RollupCube:
+    """Pre-aggregated sums with geo membership bitmaps."""
+
+    def __init__(self, aggregates: pd.DataFrame, members: pd.DataFrame, bitmaps: dict, measures: list):
+        self.measures = measures
+        self.members = members
+        self.bitmaps = bitmaps
+        self._slices = {key: grp.reset_index(drop=True)
+                        for key, grp in aggregates.groupby(["Geo_Level", "Grain"], sort=False)}
+        self.levels = [g for g in GEO_LEVELS if g in members.columns]
+        self.grains = [g for g in GRAINS if any(k[1] == g for k in self._slices)]
+
+    def _mask(self, filters: dict) -> np.ndarray:
+        """Bool mask over members for {level: value or [values]} filters."""
+        mask = np.ones(len(self.members), dtype=bool)
+        for level, value in (filters or {}).items():
+            values = value if isinstance(value, (list, tuple, set)) else [value]
+            if level in self.bitmaps:
+                hit = np.zeros(len(self.members), dtype=bool)
+                for v in values:
+                    bits = self.bitmaps[level].get(str(v))
+                    if bits is not None:
+                        hit |= np.unpackbits(bits, count=len(self.members)).astype(bool)
+            elif level in self.members.columns:
+                hit = self.members[level].isin([str(v) for v in values]).to_numpy(dtype=bool)
+            else:
+                hit = np.zeros(len(self.members), dtype=bool)
+            mask &= hit
+        return mask
+
+    def drill(self, level: str, value, target: str) -> list:
+        """Members of `target` level inside level == value (e.g. cities of a state)."""
+        if target not in self.members.columns:
+            return []
+        return self.members.loc[self._mask({level: value}), target].dropna().unique().tolist()
+
+    def rollup(self, geo: str = None, grain: str = None, filters: dict = None) -> pd.DataFrame:
+        """Sums at one geo level and time grain (None = all of it).
+
+        filters ({level: value}) keep geo members inside those regions/states;
+        they need `geo` to be set at or below the filtered level.
+        """
+        agg = self._slices.get((geo or "", grain or ""))
+        if agg is None:
+            raise KeyError(f"No rollup for geo={geo!r}, grain={grain!r}. "
+                           f"Levels: {self.levels}, grains: {self.grains}")
+        if filters and geo:
+            keep = self.members.loc[self._mask(filters), geo].dropna().unique()
+            agg = agg[agg["Geo"].isin(keep)]
+        out = agg.drop(columns=["Geo_Level", "Grain"])
+        out = out.rename(columns={"Geo": geo}) if geo else out.drop(columns="Geo")
+        out = out.rename(columns={"Period": grain}) if grain else out.drop(columns="Period")
+        return out.reset_index(drop=True)
+
+
+# === Storage =========================================================
+
+def _cube_stamp(table_name: str) -> str:
+    """table_version without the in-process epoch, so it survives restarts."""
+    return table_version(table_name).split("|epoch:")[0]
+
+
+def _paths(table_name: str):
+    base = os.path.join(CUBE_DIR, table_name)
+    return base + ".parquet", base + ".members.parquet", base + ".json"
+
+
+def save_cube(table_name: str, df: pd.DataFrame) -> RollupCube:
+    """Build and persist the cube for a table (called by save_table)."""
+    cube = build_cube(df)
+    agg_path, members_path, meta_path = _paths(table_name)
+    aggregates = pd.concat(list(cube._slices.values()), ignore_index=True)
+    meta = {
+        "version": CUBE_VERSION, "stamp": _cube_stamp(table_name), "measures": cube.measures,
+        "bitmaps": {lvl: {v: bits.tobytes().hex() for v, bits in vals.items()} for lvl, vals in cube.bitmaps.items()},
+    }
+    os.makedirs(CUBE_DIR, exist_ok=True)
+    for path, frame in ((agg_path, aggregates), (members_path, cube.members)):
+        frame.to_parquet(path + ".tmp", index=False)
+        os.replace(path + ".tmp", path)
+    with open(meta_path + ".tmp", "w") as f:
+        json.dump(meta, f)
+    os.replace(meta_path + ".tmp", meta_path)   # written last: marks the cube complete
+    return cube
+
+
+def _read_cube(table_name: str, stamp: str):
+    agg_path, members_path, meta_path = _paths(table_name)
+    try:
+        with open(meta_path) as f:
+            meta = json.load(f)
+        if meta.get("version") != CUBE_VERSION or meta.get("stamp") != stamp:
+            return None
+        bitmaps = {lvl: {v: np.frombuffer(bytes.fromhex(h), dtype=np.uint8) for v, h in vals.items()}
+                   for lvl, vals in meta["bitmaps"].items()}
+        return RollupCube(pd.read_parquet(agg_path), pd.read_parquet(members_path), bitmaps, meta["measures"])
+    except Exception:
+        return None
+
+
+@st.cache_resource(max_entries=32)
+def _cube_for(table_name: str, stamp: str):
+    cube = _read_cube(table_name, stamp)
+    if cube is not None:
+        return cube
+    df = load_table(table_name)
+    if df.empty:
+        return None
+    try:
+        return save_cube(table_name, df)
+    except Exception:
+        return build_cube(df)
+
+
+def get_cube(table_name: str):
+    """The table's rollup cube, or None if the table is empty / unavailable."""
+    return _cube_for(table_name, _cube_stamp(table_name))
+
+
+# === Flat-frame membership ===========================================
+
+def membership_bitmaps(values: pd.Series, options: list, contains: bool = True) -> dict:
+    """{option: packed bitmap over rows} for a label column, computed once.
+
+    contains=True matches like str.contains(option, case=False), the
+    sidebar region filter's semantics.
+    """
+    text = values.astype(str)
+    bitmaps = {}
+    for opt in options:
+        hit = text.str.contains(opt, case=False, regex=False, na=False) if contains else (text == opt)
+        bitmaps[opt] = np.packbits(hit.to_numpy(dtype=bool))
+    return bitmaps
+
+
+def select_rows(df: pd.DataFrame, bitmaps: dict, option) -> pd.DataFrame:
+    """Rows of df set in option's bitmap (df must be the frame the bitmaps were built on)."""
+    bits = bitmaps.get(option)
+    if bits is None:
+        return df.iloc[0:0]
+    return df[np.unpackbits(bits, count=len(df)).astype(bool)]
@@ -0,0 +1,262 @@
+"""
+Expansion Intelligence Platform - Market Scoring Engine
+========================================================
+Scores every district on the D1-D7 scoring_dimensions of all verticals at
+once. The district x dimension feature matrix is built and normalised a
+single time; composite scores for every vertical are then one matrix
+multiply (districts x 7) @ (7 x verticals), so moving a weight slider only
+re-runs the multiply and the ranking.
+
+Usage:
+    from scoring import get_scoring_engine
+    engine = get_scoring_engine()
+    ranked = engine.rank("healthcare", top_n=50)
+    ranked = engine.rank("healthcare", weights={"D1": 0.4, "D3": 0.1})
+    stable = engine.rank_stability("healthcare", top_n=50, n_samples=10_000)
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+from config import VERTICALS, all_vertical_keys
+from db import load_tables, table_version
+
+DIMENSIONS = ["D1", "D2", "D3", "D4", "D5", "D6", "D7"]
+
+# Tables the feature matrix is built from, merged on the district key.
+SCORING_TABLES = ["cei_district_scores", "census_district_demographics", "census_hh_assets"]
+
+# Column-name keywords that feed each dimension (first matching numeric
+# column wins). Pass dimension_columns= to ScoringEngine to pin exact columns.
+DIMENSION_KEYWORDS = {
+    "D1": ["online", "demand", "order"],
+    "D2": ["health", "gap", "spend"],
+    "D3": ["competition", "vacuum", "competitor"],
+    "D4": ["infra", "access", "transport"],
+    "D5": ["demographic", "population", "income"],
+    "D6": ["digital", "internet", "mobile"],
+    "D7": ["retail", "footfall", "mpce", "asset"],
+}
+
+# Dimensions where a larger raw value is worse (e.g. competitor counts).
+INVERTED_KEYWORDS = ["competitor", "saturation"]
+
+ID_ALIASES = {"state": "State", "state_name": "State", "district": "District", "district_name": "District"}
+
+# Rank stability draws weight samples in batches of BATCH_SAMPLES, and only
+# fans out to a process pool from PROCESS_POOL_MIN_SAMPLES samples up.
+BATCH_SAMPLES = 2000
+PROCESS_POOL_MIN_SAMPLES = 200_000
+
+
+# === Feature frame ===================================================
+
+def _standardize_ids(df: pd.DataFrame) -> pd.DataFrame:
+    return df.rename(columns={c: ID_ALIASES[c.lower()] for c in df.columns if c.lower() in ID_ALIASES})
+
+
+def build_feature_frame(frames: dict) -> pd.DataFrame:
+    """Merge the district tables into one frame keyed on State/District."""
+    merged = None
+    for name in SCORING_TABLES:
+        df = frames.get(name)
+        if df is None or df.empty:
+            continue
+        df = _standardize_ids(df)
+        keys = [k for k in ("State", "District") if k in df.columns]
+        if "District" not in keys:
+            continue
+        df = df.drop_duplicates(subset=keys)
+        if merged is None:
+            merged = df
+        else:
+            on = [k for k in keys if k in merged.columns]
+            extra = [c for c in df.columns if c not in merged.columns or c in on]
+            merged = merged.merge(df[extra], on=on, how="left")
+    return merged if merged is not None else pd.DataFrame(columns=["State", "District"])
+
+
+def resolve_dimension_columns(features: pd.DataFrame) -> dict:
+    """Pick a source column for each dimension by keyword. {dim: column or None}."""
+    numeric = [c for c in features.columns
+               if c not in ("State", "District") and pd.api.types.is_numeric_dtype(features[c])]
+    resolved, used = {}, set()
+    for dim in DIMENSIONS:
+        resolved[dim] = None
+        for keyword in DIMENSION_KEYWORDS[dim]:
+            match = next((c for c in numeric if keyword in c.lower() and c not in used), None)
+            if match is not None:
+                resolved[dim] = match
+                used.add(match)
+                break
+    return resolved
+
+
+# === Engine ==========================================================
+
+class ScoringEngine:
+    """Normalised district x dimension matrix plus per-vertical weights."""
+
+    def __init__(self, features: pd.DataFrame, dimension_columns: dict = None):
+        features = _standardize_ids(features).reset_index(drop=True)
+        self.ids = features[[c for c in ("State", "District") if c in features.columns]].copy()
+        self.sources = dimension_columns or resolve_dimension_columns(features)
+
+        matrix = np.zeros((len(features), len(DIMENSIONS)), dtype=np.float64)
+        self.available = np.zeros(len(DIMENSIONS), dtype=bool)
+        for j, dim in enumerate(DIMENSIONS):
+            col = self.sources.get(dim)
+            if col is None or col not in features.columns:
+                continue
+            values = pd.to_numeric(features[col], errors="coerce").to_numpy(dtype=np.float64)
+            lo, hi = np.nanmin(values, initial=np.inf), np.nanmax(values, initial=-np.inf)
+            if not np.isfinite(lo) or hi <= lo:
+                continue
+            scaled = (values - lo) / (hi - lo)
+            if any(k in col.lower() for k in INVERTED_KEYWORDS):
+                scaled = 1.0 - scaled
+            matrix[:, j] = np.nan_to_num(scaled, nan=0.0)
+            self.available[j] = True
+        self.matrix = matrix
+
+        self.verticals = all_vertical_keys()
+        self.base_weights = self.weight_matrix()
+
+    def _weight_vector(self, dims: dict) -> np.ndarray:
+        w = np.array([float(dims.get(d, {}).get("weight", 0.0)) for d in DIMENSIONS])
+        w = w * self.available
+        total = w.sum()
+        return w / total if total > 0 else w
+
+    def weight_matrix(self, overrides: dict = None) -> np.ndarray:
+        """(7 x verticals) weights, renormalised over the dimensions with data.
+
+        overrides: {vertical_key: {dim: weight}} replacing config weights.
+        """
+        overrides = overrides or {}
+        cols = []
+        for key in self.verticals:
+            dims = dict(VERTICALS[key].get("scoring_dimensions", {}))
+            for dim, weight in overrides.get(key, {}).items():
+                dims[dim] = {"weight": weight}
+            cols.append(self._weight_vector(dims))
+        return np.column_stack(cols) if cols else np.zeros((len(DIMENSIONS), 0))
+
+    def score_all(self, overrides: dict = None) -> pd.DataFrame:
+        """Composite 0-100 score of every district for every vertical."""
+        weights = self.base_weights if not overrides else self.weight_matrix(overrides)
+        scores = self.matrix @ weights * 100
+        out = self.ids.copy()
+        for i, key in enumerate(self.verticals):
+            out[key] = scores[:, i]
+        return out
+
+    def rank(self, vertical_key: str, weights: dict = None, top_n: int = None) -> pd.DataFrame:
+        """Districts ranked for one vertical, with per-dimension contributions.
+
+        weights: optional {dim: weight} from the UI sliders.
+        """
+        dims = dict(VERTICALS.get(vertical_key, VERTICALS["healthcare"]).get("scoring_dimensions", {}))
+        for dim, weight in (weights or {}).items():
+            dims[dim] = {"weight": weight}
+        w = self._weight_vector(dims)
+        contrib = self.matrix * w * 100
+        score = contrib.sum(axis=1)
+        order = np.argsort(-score, kind="stable")
+        if top_n:
+            order = order[:top_n]
+
+        out = self.ids.iloc[order].reset_index(drop=True)
+        out["Score"] = score[order]
+        out["Rank"] = np.arange(1, len(order) + 1)
+        for j, dim in enumerate(DIMENSIONS):
+            if self.available[j]:
+                out[dim] = contrib[order, j]
+        return out
+
+    def rank_stability(self, vertical_key: str, top_n: int = 50, n_samples: int = 5000,
+                       concentration: float = 100.0, seed: int = None, processes: int = None) -> pd.DataFrame:
+        """How robust each district's ranking is to perturbed weights.
+
+        Draws n_samples weight vectors from a Dirichlet centred on the
+        vertical's configured weights (larger concentration = tighter) and
+        scores them all as one batched multiply per BATCH_SAMPLES draws. Runs
+        of PROCESS_POOL_MIN_SAMPLES or more are split across a process pool
+        (processes=None picks the CPU count; processes=1 forces in-process).
+        Returns per district: Base_Rank, P_Top_N, and the 5th/50th/95th
+        percentile rank.
+        """
+        dims = VERTICALS.get(vertical_key, VERTICALS["healthcare"]).get("scoring_dimensions", {})
+        base = self._weight_vector(dims)
+        active = np.flatnonzero(base > 0)
+        alpha = base[active] * concentration
+        matrix = self.matrix[:, active]
+
+        seeds = np.random.SeedSequence(seed).spawn(max(1, -(-n_samples // BATCH_SAMPLES)))
+        sizes = [min(BATCH_SAMPLES, n_samples - i * BATCH_SAMPLES) for i in range(len(seeds))]
+        jobs = [(matrix, alpha, size, top_n, s) for size, s in zip(sizes, seeds) if size > 0]
+
+        n = len(self.matrix)
+        top_counts = np.zeros(n, dtype=np.int64)
+        rank_hist = np.zeros((n, n), dtype=np.int64)
+        if n_samples >= PROCESS_POOL_MIN_SAMPLES and processes != 1 and len(jobs) > 1:
+            with ProcessPoolExecutor(max_workers=processes) as pool:
+                results = list(pool.map(_stability_batch, *zip(*jobs)))
+        else:
+            results = [_stability_batch(*job) for job in jobs]
+        for counts, hist in results:
+            top_counts += counts
+            rank_hist += hist
+
+        total = max(sum(sizes), 1)
+        cum = rank_hist.cumsum(axis=1)
+
+        def _pct(q):
+            return np.argmax(cum >= q * total, axis=1) + 1
+
+        base_score = matrix @ base[active]
+        base_rank = np.empty(n, dtype=np.int64)
+        base_rank[np.argsort(-base_score, kind="stable")] = np.arange(1, n + 1)
+
+        out = self.ids.copy()
+        out["Base_Rank"] = base_rank
+        out[f"P_Top_{top_n}"] = top_counts / total
+        out["Rank_P05"] = _pct(0.05)
+        out["Rank_Median"] = _pct(0.50)
+        out["Rank_P95"] = _pct(0.95)
+        return out.sort_values([f"P_Top_{top_n}", "Base_Rank"], ascending=[False, True]).reset_index(drop=True)
+
+
+# === Rank-stability worker ===========================================
+# Module-level so ProcessPoolExecutor can pickle it.
+
+def _stability_batch(matrix: np.ndarray, alpha: np.ndarray, n_draws: int, top_n: int, seed):
+    """Score n_draws Dirichlet weight vectors at once.
+
+    Returns (top-N membership counts per district, district x rank histogram).
+    """
+    n = len(matrix)
+    rng = np.random.default_rng(seed)
+    weights = rng.dirichlet(alpha, size=n_draws) if len(alpha) else np.zeros((n_draws, 0))
+    scores = weights @ matrix.T                                   # draws x districts, row-contiguous
+    order = np.argsort(-scores, axis=1)
+    ranks = np.empty_like(order)
+    np.put_along_axis(ranks, order, np.arange(n)[None, :], axis=1)  # 0-based rank
+    counts = (ranks < top_n).sum(axis=0)
+    flat = (np.arange(n)[None, :] * n + ranks).ravel()
+    hist = np.bincount(flat, minlength=n * n).reshape(n, n)
+    return counts, hist
+
+
+@st.cache_resource(max_entries=4)
+def _engine_for(versions: tuple) -> ScoringEngine:
+    """Build the engine once per combination of source-table versions."""
+    return ScoringEngine(build_feature_frame(load_tables(SCORING_TABLES)))
+
+
+def get_scoring_engine() -> ScoringEngine:
+    """Shared engine, rebuilt only when one of SCORING_TABLES changes."""
+    return _engine_for(tuple(table_version(t) for t in SCORING_TABLES))
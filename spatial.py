@@ -0,0 +1,264 @@
+"""
+Expansion Intelligence Platform - Spatial Index
+===============================================
+Great-circle nearest-neighbour and radius queries over clinic, pincode and
+competitor coordinates, for cannibalisation and competitor checks.
+
+Points are stored as 3-D unit vectors, where straight-line (chord) distance
+is monotonic in haversine distance. Queries go through scipy's cKDTree when
+scipy is installed and otherwise through a chunked NumPy scan, which is
+still well under a second for tens of thousands of pincodes against the
+clinic network.
+
+Usage:
+    from spatial import SpatialIndex, nearest_clinic, count_within, catchment_overlap, load_locations
+    idx = SpatialIndex.from_frame(df_clinics, label_col="Clinic")
+    dist_km, pos = idx.nearest(pins["Lat"], pins["Lon"])
+    pins = nearest_clinic(pins, df_clinics)            # adds Nearest_Clinic, Nearest_Km
+    pins = count_within(pins, load_locations("ivf_competitor_map"), 5, "Competitors_5km")
+    overlap = catchment_overlap(candidates, 5, existing=df_clinics, label_col="Clinic")
+"""
+
+import numpy as np
+import pandas as pd
+
+EARTH_RADIUS_KM = 6371.0088
+
+# Max query x point pairs per chunk in the NumPy fallback (bounds memory)
+SCAN_CHUNK_PAIRS = 4_000_000
+
+LAT_ALIASES = ["Lat", "Latitude", "lat", "latitude", "LAT"]
+LON_ALIASES = ["Lon", "Longitude", "lon", "lng", "longitude", "Long", "LON"]
+
+
+# === Geometry helpers ================================================
+
+def _unit_vectors(lat, lon) -> np.ndarray:
+    lat = np.radians(np.asarray(lat, dtype=np.float64))
+    lon = np.radians(np.asarray(lon, dtype=np.float64))
+    cos_lat = np.cos(lat)
+    return np.column_stack([cos_lat * np.cos(lon), cos_lat * np.sin(lon), np.sin(lat)])
+
+
+def _chord_to_km(chord: np.ndarray) -> np.ndarray:
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.clip(chord / 2, 0.0, 1.0))
+
+
+def _km_to_chord(km: float) -> float:
+    return 2 * np.sin(min(km / EARTH_RADIUS_KM, np.pi) / 2)
+
+
+def haversine_km(lat1, lon1, lat2, lon2) -> np.ndarray:
+    """Great-circle distance in km; inputs broadcast like NumPy arrays."""
+    lat1, lon1, lat2, lon2 = (np.radians(np.asarray(a, dtype=np.float64)) for a in (lat1, lon1, lat2, lon2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def latlon_columns(df: pd.DataFrame) -> tuple:
+    """Find the latitude/longitude column names of a frame."""
+    lat = next((c for c in LAT_ALIASES if c in df.columns), None)
+    lon = next((c for c in LON_ALIASES if c in df.columns), None)
+    if lat is None or lon is None:
+        raise ValueError(f"No latitude/longitude columns found in {list(df.columns)}")
+    return lat, lon
+
+
+# === Index ===========================================================
+
+class SpatialIndex:
+    """Static index over a set of points (clinics, competitors, ...)."""
+
+    def __init__(self, lat, lon, labels=None):
+        lat = np.asarray(lat, dtype=np.float64)
+        lon = np.asarray(lon, dtype=np.float64)
+        keep = np.isfinite(lat) & np.isfinite(lon)
+        self.positions = np.flatnonzero(keep)      # row positions in the source data
+        self.xyz = _unit_vectors(lat[keep], lon[keep])
+        self.labels = None if labels is None else np.asarray(labels)[keep]
+        try:
+            from scipy.spatial import cKDTree
+            self._tree = cKDTree(self.xyz) if len(self.xyz) else None
+        except ImportError:
+            self._tree = None
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame, label_col: str = None):
+        lat, lon = latlon_columns(df)
+        return cls(df[lat], df[lon], df[label_col] if label_col else None)
+
+    def __len__(self):
+        return len(self.xyz)
+
+    def _chunks(self, q: np.ndarray):
+        step = max(1, SCAN_CHUNK_PAIRS // max(len(self.xyz), 1))
+        for start in range(0, len(q), step):
+            yield start, q[start:start + step]
+
+    def nearest(self, lat, lon, k: int = 1):
+        """k nearest points for each query. Returns (dist_km, positions), shape (n, k).
+
+        Positions index rows of the source data; queries with no valid
+        coordinates get distance inf and position -1.
+        """
+        q = _unit_vectors(lat, lon)
+        n, k_eff = len(q), min(k, len(self.xyz))
+        dist = np.full((n, k), np.inf)
+        pos = np.full((n, k), -1, dtype=np.int64)
+        valid = np.isfinite(q).all(axis=1)
+        if k_eff == 0 or not valid.any():
+            return dist, pos
+
+        qv = q[valid]
+        if self._tree is not None:
+            chord, idx = self._tree.query(qv, k=k_eff)
+            chord, idx = chord.reshape(len(qv), k_eff), idx.reshape(len(qv), k_eff)
+        else:
+            chord = np.empty((len(qv), k_eff))
+            idx = np.empty((len(qv), k_eff), dtype=np.int64)
+            for start, block in self._chunks(qv):
+                sq = np.maximum(2.0 - 2.0 * (block @ self.xyz.T), 0.0)      # squared chord
+                part = np.argpartition(sq, k_eff - 1, axis=1)[:, :k_eff] if k_eff < sq.shape[1] \
+                    else np.tile(np.arange(sq.shape[1]), (len(block), 1))
+                part_sq = np.take_along_axis(sq, part, axis=1)
+                order = np.argsort(part_sq, axis=1)
+                idx[start:start + len(block)] = np.take_along_axis(part, order, axis=1)
+                chord[start:start + len(block)] = np.sqrt(np.take_along_axis(part_sq, order, axis=1))
+
+        dist[valid, :k_eff] = _chord_to_km(chord)
+        pos[valid, :k_eff] = self.positions[idx]
+        return dist, pos
+
+    def within(self, lat, lon, radius_km: float) -> list:
+        """Positions of all points within radius_km of each query (list of arrays)."""
+        q = _unit_vectors(lat, lon)
+        r = _km_to_chord(radius_km)
+        out = [np.empty(0, dtype=np.int64)] * len(q)
+        valid = np.flatnonzero(np.isfinite(q).all(axis=1))
+        if not len(self.xyz) or not len(valid):
+            return out
+        if self._tree is not None:
+            hits = self._tree.query_ball_point(q[valid], r=r)
+            for i, h in zip(valid, hits):
+                out[i] = self.positions[np.sort(np.asarray(h, dtype=np.int64))]
+            return out
+        min_dot = 1.0 - r * r / 2.0
+        for start, block in self._chunks(q[valid]):
+            rows, cols = np.nonzero(block @ self.xyz.T >= min_dot)
+            split = np.searchsorted(rows, np.arange(1, len(block)))
+            for i, c in zip(valid[start:start + len(block)], np.split(cols, split)):
+                out[i] = self.positions[c]
+        return out
+
+    def count_within(self, lat, lon, radius_km: float) -> np.ndarray:
+        """Number of points within radius_km of each query."""
+        q = _unit_vectors(lat, lon)
+        counts = np.zeros(len(q), dtype=np.int64)
+        valid = np.flatnonzero(np.isfinite(q).all(axis=1))
+        if not len(self.xyz) or not len(valid):
+            return counts
+        r = _km_to_chord(radius_km)
+        if self._tree is not None:
+            counts[valid] = self._tree.query_ball_point(q[valid], r=r, return_length=True)
+            return counts
+        min_dot = 1.0 - r * r / 2.0
+        for start, block in self._chunks(q[valid]):
+            counts[valid[start:start + len(block)]] = (block @ self.xyz.T >= min_dot).sum(axis=1)
+        return counts
+
+
+# === Batch helpers ===================================================
+
+def nearest_clinic(points: pd.DataFrame, clinics: pd.DataFrame, label_col: str = "Clinic") -> pd.DataFrame:
+    """Add Nearest_Clinic and Nearest_Km to every row of `points`."""
+    idx = SpatialIndex.from_frame(clinics.reset_index(drop=True), label_col=label_col)
+    lat, lon = latlon_columns(points)
+    dist, pos = idx.nearest(points[lat], points[lon])
+    labels = clinics[label_col].to_numpy()
+    out = points.copy()
+    out["Nearest_Clinic"] = np.where(pos[:, 0] >= 0, labels[np.maximum(pos[:, 0], 0)], None)
+    out["Nearest_Km"] = dist[:, 0]
+    return out
+
+
+def count_within(points: pd.DataFrame, others: pd.DataFrame, radius_km: float,
+                 col: str = "Within_Count") -> pd.DataFrame:
+    """Add the number of `others` (clinics, competitors) within radius_km of each point."""
+    idx = SpatialIndex.from_frame(others)
+    lat, lon = latlon_columns(points)
+    out = points.copy()
+    out[col] = idx.count_within(points[lat], points[lon], radius_km)
+    return out
+
+
+def _lens_fraction(d: np.ndarray, r: float) -> np.ndarray:
+    """Share of a radius-r circle covered by an equal circle d km away (planar)."""
+    d = np.clip(d, 0.0, 2 * r)
+    area = 2 * r * r * np.arccos(d / (2 * r)) - (d / 2) * np.sqrt(4 * r * r - d * d)
+    return area / (np.pi * r * r)
+
+
+def catchment_overlap(candidates: pd.DataFrame, radius_km: float, existing: pd.DataFrame = None,
+                      label_col: str = None) -> pd.DataFrame:
+    """Pairwise catchment overlap for a candidate list.
+
+    Every pair whose radius_km catchments intersect - candidate/candidate,
+    and candidate/existing when `existing` is given - with its distance and
+    the overlapping share of one catchment (Overlap_Pct).
+    """
+    cands = candidates.reset_index(drop=True)
+    lat, lon = latlon_columns(cands)
+    c_lat, c_lon = cands[lat].to_numpy(dtype=float), cands[lon].to_numpy(dtype=float)
+    names = cands[label_col].to_numpy() if label_col else np.arange(len(cands))
+
+    kinds, i_idx, others, o_lat, o_lon = [], [], [], [], []
+    for i, hits in enumerate(SpatialIndex(c_lat, c_lon).within(c_lat, c_lon, 2 * radius_km)):
+        hits = hits[hits > i]
+        kinds += ["candidate"] * len(hits)
+        i_idx.append(np.full(len(hits), i))
+        others.append(names[hits])
+        o_lat.append(c_lat[hits])
+        o_lon.append(c_lon[hits])
+
+    if existing is not None and len(existing):
+        ex = existing.reset_index(drop=True)
+        e_lat_col, e_lon_col = latlon_columns(ex)
+        e_lat, e_lon = ex[e_lat_col].to_numpy(dtype=float), ex[e_lon_col].to_numpy(dtype=float)
+        ex_label = label_col if label_col in ex.columns else ("Clinic" if "Clinic" in ex.columns else None)
+        ex_names = ex[ex_label].to_numpy() if ex_label else np.arange(len(ex))
+        for i, hits in enumerate(SpatialIndex(e_lat, e_lon).within(c_lat, c_lon, 2 * radius_km)):
+            kinds += ["existing"] * len(hits)
+            i_idx.append(np.full(len(hits), i))
+            others.append(ex_names[hits])
+            o_lat.append(e_lat[hits])
+            o_lon.append(e_lon[hits])
+
+    if not kinds:
+        return pd.DataFrame(columns=["Type", "Candidate", "Other", "Distance_Km", "Overlap_Pct"])
+
+    i_idx = np.concatenate(i_idx)
+    dist = haversine_km(c_lat[i_idx], c_lon[i_idx], np.concatenate(o_lat), np.concatenate(o_lon))
+    return pd.DataFrame({
+        "Type": kinds, "Candidate": names[i_idx], "Other": np.concatenate(others),
+        "Distance_Km": dist, "Overlap_Pct": _lens_fraction(dist, radius_km) * 100,
+    }).sort_values("Overlap_Pct", ascending=False).reset_index(drop=True)
+
+
+# === Location sources ================================================
+
+# Tables with per-row coordinates that can be indexed directly.
+LOCATION_TABLES = ["pincode_clinic", "expansion_new_city", "expansion_same_city", "ivf_competitor_map"]
+
+
+def load_locations(table_name: str) -> pd.DataFrame:
+    """Rows of a location table that carry usable coordinates (empty if none)."""
+    from db import load_table
+    df = load_table(table_name)
+    try:
+        lat, lon = latlon_columns(df)
+    except ValueError:
+        return df.iloc[0:0]
+    df = df.copy()
+    df[lat] = pd.to_numeric(df[lat], errors="coerce")
+    df[lon] = pd.to_numeric(df[lon], errors="coerce")
+    return df[df[lat].notna() & df[lon].notna() & (df[lat] != 0)].reset_index(drop=True)
@@ -1,7 +1,16 @@
+import os
 import streamlit as st
 import pandas as pd
 import plotly.express as px
 import plotly.graph_objects as go
+from mis_pipeline import build_core_frame, trailing_1cx, store_1cx_version, clinic_match_report, clinic_dimension, align_to_clinics, load_clinic_aliases
+from d2c_pipeline import aggregate_web_demand, WEB_FILE
+from db import prefetch_vertical, shared_view, table_version
+from metrics import note, timed
+from map_layers import build_pyramid, view_bins, demand_points, bbox_of, LOD_LEVELS
+from rollups import membership_bitmaps, select_rows
+from spatial import LOCATION_TABLES
+from underwriting import underwrite, sensitivity_grid, RENT_RATIO, SHOW_RATE, CONVERSION, RENT_RATIO_GRID
 
 # --- PAGE CONFIGURATION ---
 st.set_page_config(page_title="Expansion OS", layout="wide", initial_sidebar_state="expanded")
@@ -32,104 +41,103 @@ app_mode = st.sidebar.radio("Select Module:",
 
 st.sidebar.markdown("---")
 st.sidebar.header("Data Filters")
-region_filter = st.sidebar.selectbox("Filter Region", ["All India", "West", "North", "South", "East"])
+REGION_OPTIONS = ["All India", "West", "North", "South", "East"]
+region_filter = st.sidebar.selectbox("Filter Region", REGION_OPTIONS)
+
+# Warm the shared table cache for the other pages, once per session for each vertical selected
+vertical_key = st.session_state.get("vertical_key", "healthcare")
+prefetched = st.session_state.setdefault("prefetched_verticals", set())
+if vertical_key not in prefetched and prefetch_vertical(vertical_key):
+    prefetched.add(vertical_key)     # False = already running elsewhere; try again on the next rerun
 
 # --- DATA INGESTION (DIRECT FROM VG MIS) ---
-@st.cache_data
+@st.cache_resource
 def load_core_data():
+    note(cache="miss")
     try:
-        # 1. Base Geo-Data (Your 62 Clinics)
-        df_geo = pd.read_csv("Clinic latitude longitude.xlsx - Sheet1.csv")
-        df_geo = df_geo.rename(columns={"Area": "Clinic", "Latitude": "Lat", "Longitude": "Lon"})
-        df_main = df_geo[["Clinic", "City", "Lat", "Lon"]].dropna(subset=["Clinic"])
-        
-        # 2. Sales & Age (from SalesMTD)
-        df_sales = pd.read_csv("Copy of (Vg) Clinic Location - Monthly MIS.xlsx - SalesMTD.csv", header=0)
-        df_sales = df_sales.rename(columns={"Area": "Clinic", "All": "Sales_MTD_Lacs"})
-        df_main = df_main.merge(df_sales[["Clinic", "Region", "Age", "Sales_MTD_Lacs"]], on="Clinic", how="left")
-        
-        # 3. EBITDA Margin (from Ebitda Trend)
-        df_ebitda = pd.read_csv("Copy of (Vg) Clinic Location - Monthly MIS.xlsx - Ebitda Trend.csv", header=0)
-        df_ebitda = df_ebitda.rename(columns={df_ebitda.columns[0]: "Clinic", "Fy26": "EBITDA_Margin_Pct"})
-        df_ebitda["EBITDA_Margin_Pct"] = pd.to_numeric(df_ebitda["EBITDA_Margin_Pct"], errors='coerce') * 100
-        df_main = df_main.merge(df_ebitda[["Clinic", "EBITDA_Margin_Pct"]], on="Clinic", how="left")
-        
-        # 4. NTB Show Rate (from NTBShow%)
-        df_show = pd.read_csv("Copy of (Vg) Clinic Location - Monthly MIS.xlsx - NTBShow%.csv", header=1)
-        df_show = df_show.rename(columns={"Area": "Clinic"})
-        show_col = [c for c in df_show.columns if 'All' in c][-1] 
-        df_show["NTB_Show_Rate_Pct"] = pd.to_numeric(df_show[show_col], errors='coerce') * 100
-        df_main = df_main.merge(df_show[["Clinic", "NTB_Show_Rate_Pct"]], on="Clinic", how="left")
-        
-        # 5. 1Cx Conversion % (from 1Conv)
-        df_conv = pd.read_csv("Copy of (Vg) Clinic Location - Monthly MIS.xlsx - 1Conv.csv", header=0)
-        df_conv = df_conv.rename(columns={"Area": "Clinic", "All": "Conversion_1Cx_Pct"})
-        df_conv["Conversion_1Cx_Pct"] = pd.to_numeric(df_conv["Conversion_1Cx_Pct"], errors='coerce') * 100
-        df_main = df_main.merge(df_conv[["Clinic", "Conversion_1Cx_Pct"]], on="Clinic", how="left")
-        
-        # 6. Absolute Appointments (Last 12 Months Avg)
-        df_appt = pd.read_csv("Copy of (Vg) Clinic Location - Monthly MIS.xlsx - NTBAppointment.csv", header=1)
-        df_appt = df_appt.rename(columns={"Area": "Clinic"})
-        date_cols = [c for c in df_appt.columns if '202' in str(c)]
-        last_12_dates = date_cols[-12:] if len(date_cols) >= 12 else date_cols
-        df_appt[last_12_dates] = df_appt[last_12_dates].apply(pd.to_numeric, errors='coerce')
-        df_appt["Avg_Monthly_Appointments"] = df_appt[last_12_dates].mean(axis=1)
-        df_main = df_main.merge(df_appt[["Clinic", "Avg_Monthly_Appointments"]], on="Clinic", how="left")
-        
-        # 7. Absolute 1Cx Conversions (Unique Customer IDs / 12 Months)
-        df_1cx = pd.read_csv("First Time customer - Clinic ( 2023 to 2025).csv")
-        df_1cx['Date'] = pd.to_datetime(df_1cx['Date'], errors='coerce', dayfirst=True)
-        max_date = df_1cx['Date'].max()
-        if pd.notnull(max_date):
-            cutoff_date = max_date - pd.DateOffset(months=12)
-            df_1cx = df_1cx[df_1cx['Date'] >= cutoff_date]
-        df_1cx_grp = df_1cx.groupby("Clinic Loc")["Customer ID"].nunique().reset_index()
-        df_1cx_grp = df_1cx_grp.rename(columns={"Clinic Loc": "Clinic", "Customer ID": "Avg_Monthly_1Cx"})
-        df_1cx_grp["Avg_Monthly_1Cx"] = df_1cx_grp["Avg_Monthly_1Cx"] / 12
-        df_main = df_main.merge(df_1cx_grp[["Clinic", "Avg_Monthly_1Cx"]], on="Clinic", how="left")
-        
-        # 8. Calculate Absolute Shows
-        df_main["Avg_Monthly_Shows"] = df_main["Avg_Monthly_Appointments"] * (df_main["NTB_Show_Rate_Pct"] / 100)
-
-        # Format and Clean the Stitched Data
-        df_main = df_main.rename(columns={"Age": "Age_Months"})
-        df_main = df_main.fillna(0)
-        
-        numeric_cols = ["Sales_MTD_Lacs", "Age_Months", "NTB_Show_Rate_Pct", "Conversion_1Cx_Pct", 
-                        "EBITDA_Margin_Pct", "Avg_Monthly_Appointments", "Avg_Monthly_Shows", "Avg_Monthly_1Cx"]
-        for col in numeric_cols:
-            df_main[col] = pd.to_numeric(df_main[col], errors='coerce').fillna(0)
-            
-        return df_main[df_main["Lat"] != 0]
+        # Stitch of the 7 MIS sources; see mis_pipeline for the per-stage snapshots
+        return build_core_frame()
         
     except Exception as e:
         st.error(f"🚨 Data Pipeline Error: Ensure all CSV files are uploaded exactly as named. Details: {e}")
         return pd.DataFrame()
 
-@st.cache_data
-def load_predictive_data():
+def web_demand_version():
+    # Cache key for the D2C loaders: the web_order_demand table and the website export file
     try:
-        df_web = pd.read_csv("First Time customer - website  (2020 - 2025).csv")
-        df_web['Total'] = pd.to_numeric(df_web['Total'], errors='coerce').fillna(0)
-        
-        df_pred = df_web.groupby(["City", "State"]).agg(
-            Online_1Cx_Volume=("Customer ID", "nunique"),
-            Est_Online_Revenue_Lacs=("Total", lambda x: x.sum() / 100000)
-        ).reset_index()
-        
-        df_pred = df_pred.sort_values(by="Est_Online_Revenue_Lacs", ascending=False).head(30)
-        return df_pred
+        stat = os.stat(WEB_FILE)
+        stamp = f"{stat.st_mtime_ns}:{stat.st_size}"
+    except OSError:
+        stamp = "none"
+    return (table_version("web_order_demand"), stamp)
+
+@st.cache_resource(max_entries=2)
+def load_web_demand(version):
+    try:
+        # Streamed in chunks so peak memory no longer scales with the file
+        return aggregate_web_demand(WEB_FILE)
         
     except Exception as e:
         st.error(f"🚨 Website D2C Data Error: {e}")
         return pd.DataFrame()
 
-df_main = load_core_data()
-df_predictive = load_predictive_data()
+@st.cache_data(max_entries=2)
+def load_predictive_data(version):
+    note(cache="miss")
+    df_pred = load_web_demand(version)
+    if df_pred.empty:
+        return df_pred
+    return df_pred.sort_values(by="Est_Online_Revenue_Lacs", ascending=False).head(30)
+
+@st.cache_resource(max_entries=2)
+def load_demand_pyramid(version, location_versions):
+    try:
+        # Hex bins for every detail level, built once per version; views only slice them
+        points, weight_col = demand_points(load_web_demand(version))
+        return build_pyramid(points, weight_col)
+    except Exception:
+        return build_pyramid(pd.DataFrame())
+
+@st.cache_resource
+def load_region_index():
+    # Region membership bitmaps over the shared core frame, built once per load
+    df = load_core_data()
+    if df.empty or "Region" not in df.columns:
+        return {}
+    return membership_bitmaps(df["Region"], REGION_OPTIONS[1:])
+
+@st.cache_resource
+def load_clinic_dimension():
+    # Built from the unfiltered core frame: Clinic_IDs are global, so a region-filtered frame's dimension is a subset
+    df = load_core_data()
+    return clinic_dimension(df) if not df.empty else None
+
+@st.cache_data(max_entries=8)
+def load_1cx_window(months, store_version):
+    try:
+        # Answered from the monthly 1Cx store that load_core_data keeps current; store_version keys the cache
+        return trailing_1cx(months)
+    except Exception:
+        return pd.DataFrame()
+
+# Shared process-wide; each rerun works on a copy-on-write view
+with timed("load_core_data", cache="hit") as span:
+    df_main = shared_view(load_core_data())
+    span["rows"] = len(df_main)
+with timed("load_predictive_data", cache="hit") as span:
+    df_predictive = load_predictive_data(web_demand_version())
+    span["rows"] = len(df_predictive)
+
+# Sheet clinic names that matched no clinic are listed instead of silently zero-filled
+df_unmatched = clinic_match_report()
+if not df_unmatched.empty:
+    with st.sidebar.expander(f"⚠️ {len(df_unmatched)} unmatched clinic names"):
+        st.caption("Rows under these names were not joined. Add Alias,Clinic pairs to data/clinic_aliases.csv to map them.")
+        st.dataframe(df_unmatched, hide_index=True)
 
 # Apply Sidebar Filter to Main Data
 if not df_main.empty and region_filter != "All India":
-    df_main = df_main[df_main["Region"].astype(str).str.contains(region_filter, case=False, na=False)]
+    df_main = select_rows(df_main, load_region_index(), region_filter)
 
 # --- MODULE 1: PORTFOLIO HEALTH ---
 if app_mode == "1. Portfolio Health (CapEx ROI)":
@@ -170,13 +178,20 @@ elif app_mode == "2. Funnel Leakage Analytics":
     st.markdown("Visualizing the exact patient volume drop-off (Monthly Averages over the Last 12 Months).")
     
     if not df_main.empty:
+        window_1cx = st.radio("1Cx window (months)", [12, 6, 3], horizontal=True)
+        
         # Sort by most appointments to make the chart readable
         df_funnel = df_main.sort_values(by="Avg_Monthly_Appointments", ascending=False)
+        if window_1cx != 12:
+            df_window = load_1cx_window(window_1cx, store_1cx_version())
+            if not df_window.empty:
+                df_aligned = align_to_clinics(df_window, df_funnel["Clinic_ID"], load_clinic_dimension(), load_clinic_aliases())
+                df_funnel["Avg_Monthly_1Cx"] = df_aligned["Avg_Monthly_1Cx"].fillna(0).to_numpy()
         
         fig2 = go.Figure()
         fig2.add_trace(go.Bar(x=df_funnel['Clinic'], y=df_funnel['Avg_Monthly_Appointments'], name='Appointments', marker_color='#1f77b4'))
         fig2.add_trace(go.Bar(x=df_funnel['Clinic'], y=df_funnel['Avg_Monthly_Shows'], name='Shows (Walk-ins)', marker_color='#ff7f0e'))
-        fig2.add_trace(go.Bar(x=df_funnel['Clinic'], y=df_funnel['Avg_Monthly_1Cx'], name='1Cx Conversions', marker_color='#2ca02c'))
+        fig2.add_trace(go.Bar(x=df_funnel['Clinic'], y=df_funnel['Avg_Monthly_1Cx'], name=f'1Cx Conversions ({window_1cx}M)', marker_color='#2ca02c'))
         
         fig2.update_layout(barmode='group', height=500, xaxis_title="Clinic Location", yaxis_title="Average Patients / Month")
         st.plotly_chart(fig2, use_container_width=True)
@@ -196,6 +211,17 @@ elif app_mode == "3. Geospatial Network Map":
     st.markdown("Visualize current clinic locations and performance.")
     
     if not df_main.empty:
+        m1, m2 = st.columns([1, 2])
+        show_demand = m1.checkbox("Overlay online demand", value=False)
+        level_label = m2.select_slider("Detail level", options=[lvl[0] for lvl in LOD_LEVELS], value=LOD_LEVELS[0][0])
+        level = [lvl[0] for lvl in LOD_LEVELS].index(level_label)
+        
+        # Centre on the filtered clinics; national view stays on all of India
+        view_box = bbox_of(df_main["Lat"], df_main["Lon"]) if region_filter != "All India" else None
+        center = {"lat": 20.5937, "lon": 78.9629}
+        if view_box is not None:
+            center = {"lat": (view_box[0] + view_box[2]) / 2, "lon": (view_box[1] + view_box[3]) / 2}
+        
         fig3 = px.scatter_mapbox(
             df_main, 
             lat="Lat", 
@@ -205,10 +231,26 @@ elif app_mode == "3. Geospatial Network Map":
             color="EBITDA_Margin_Pct",
             color_continuous_scale="RdYlGn",
             size="Sales_MTD_Lacs",
-            zoom=3.5, 
+            zoom=LOD_LEVELS[level][2], 
             height=600,
-            center={"lat": 20.5937, "lon": 78.9629} 
+            center=center 
         )
+        
+        if show_demand:
+            pyramid = load_demand_pyramid(web_demand_version(), tuple(table_version(t) for t in LOCATION_TABLES))
+            bins = view_bins(pyramid, level, view_box)
+            if bins.empty:
+                st.info("No geolocated online demand available for this view.")
+            else:
+                size = 6 + 24 * (bins["Weight"] / bins["Weight"].max()) ** 0.5
+                fig3.add_trace(go.Scattermapbox(
+                    lat=bins["Lat"], lon=bins["Lon"], mode="markers", name="Online demand",
+                    marker=dict(size=size, color="rgba(52, 101, 164, 0.45)"),
+                    text=[f"{w:,.0f} online customers ({n} points)" for w, n in zip(bins["Weight"], bins["Points"])],
+                    hoverinfo="text",
+                ))
+                st.caption(f"{len(bins):,} demand bins at {level_label} detail.")
+        
         fig3.update_layout(mapbox_style="carto-positron")
         st.plotly_chart(fig3, use_container_width=True)
 
@@ -217,32 +259,75 @@ elif app_mode == "4. Site Underwriter (AOP)":
     st.title("🏗️ Expansion Site Underwriter")
     st.markdown("Calculate break-even and patient targets before approving a commercial lease.")
     
-    st.info("Input the variables negotiated by the real estate team below:")
-    
-    c1, c2, c3, c4 = st.columns(4)
-    rent = c1.number_input("Monthly Rent Quote (₹)", value=150000, step=10000)
-    capex = c2.number_input("Fit-out CapEx (₹)", value=2800000, step=100000)
-    deposit_months = c3.number_input("Deposit (Months)", value=6)
-    ticket_size = c4.number_input("Est. Ticket Size (₹)", value=22000)
-    
-    day_zero_cash = capex + (rent * deposit_months)
-    required_revenue = rent / 0.12 
-    required_patients = required_revenue / ticket_size
+    underwrite_mode = st.radio("Mode", ["Single Quote", "Batch (CSV of candidate sites)"], horizontal=True)
     
-    st.markdown("### 📋 Underwriting Results")
-    res1, res2, res3 = st.columns(3)
-    res1.metric("Day-Zero Cash Burn", f"₹ {day_zero_cash:,.0f}")
-    res2.metric("Target Monthly Revenue", f"₹ {required_revenue/100000:,.1f} Lacs", help="To maintain 12% rent ratio")
-    res3.metric("Required New Patients / Month", f"{required_patients:,.0f} Patients")
+    with st.expander("Network assumptions"):
+        a1, a2, a3 = st.columns(3)
+        rent_ratio = a1.number_input("Rent Ratio", value=RENT_RATIO, min_value=0.01, max_value=1.0, step=0.01, format="%.2f")
+        show_rate = a2.number_input("Show Rate", value=SHOW_RATE, min_value=0.01, max_value=1.0, step=0.01, format="%.2f")
+        conversion = a3.number_input("Conversion", value=CONVERSION, min_value=0.01, max_value=1.0, step=0.01, format="%.2f")
     
-    st.divider()
-    st.markdown("#### 🎯 Execution Reality Check")
-    st.write(f"To hit **{required_patients:,.0f} patients**, assuming the network average Show Rate of **38%** and Conversion of **75%**:")
-    
-    req_shows = required_patients / 0.75
-    req_appts = req_shows / 0.38
+    if underwrite_mode == "Single Quote":
+        st.info("Input the variables negotiated by the real estate team below:")
+        
+        c1, c2, c3, c4 = st.columns(4)
+        rent = c1.number_input("Monthly Rent Quote (₹)", value=150000, step=10000)
+        capex = c2.number_input("Fit-out CapEx (₹)", value=2800000, step=100000)
+        deposit_months = c3.number_input("Deposit (Months)", value=6)
+        ticket_size = c4.number_input("Est. Ticket Size (₹)", value=22000)
+        
+        quote = underwrite(pd.DataFrame([{"Rent": rent, "CapEx": capex, "Deposit_Months": deposit_months,
+                                          "Ticket_Size": ticket_size}]),
+                           rent_ratio=rent_ratio, show_rate=show_rate, conversion=conversion).iloc[0]
+        required_patients = quote["Required_Patients"]
+        
+        st.markdown("### 📋 Underwriting Results")
+        res1, res2, res3 = st.columns(3)
+        res1.metric("Day-Zero Cash Burn", f"₹ {quote['Day_Zero_Cash']:,.0f}")
+        res2.metric("Target Monthly Revenue", f"₹ {quote['Required_Revenue']/100000:,.1f} Lacs", help=f"To maintain {rent_ratio:.0%} rent ratio")
+        res3.metric("Required New Patients / Month", f"{required_patients:,.0f} Patients")
+        
+        st.divider()
+        st.markdown("#### 🎯 Execution Reality Check")
+        st.write(f"To hit **{required_patients:,.0f} patients**, assuming the network average Show Rate of **{show_rate:.0%}** and Conversion of **{conversion:.0%}**:")
+        
+        st.warning(f"Marketing must generate **{quote['Required_Appointments']:,.0f} Appointments** per month for this specific pin code to survive the ₹{rent:,.0f} rent block.")
     
-    st.warning(f"Marketing must generate **{req_appts:,.0f} Appointments** per month for this specific pin code to survive the ₹{rent:,.0f} rent block.")
+    else:
+        st.info("Upload a CSV with columns Site, Rent, CapEx, Deposit_Months, Ticket_Size (one row per quote).")
+        sites_file = st.file_uploader("Candidate sites CSV", type="csv")
+        
+        if sites_file is not None:
+            try:
+                df_sites = underwrite(pd.read_csv(sites_file), rent_ratio=rent_ratio, show_rate=show_rate, conversion=conversion)
+                df_grid = sensitivity_grid(df_sites)
+            except ValueError as e:
+                st.error(f"🚨 Site file error: {e}")
+                df_sites = pd.DataFrame()
+            
+            if not df_sites.empty:
+                st.markdown(f"### 📋 Underwriting Results ({len(df_sites)} sites)")
+                st.dataframe(
+                    df_sites[["Site", "Rent", "CapEx", "Day_Zero_Cash", "Required_Revenue", "Required_Patients", "Required_Appointments"]]
+                    .style.format({"Rent": "₹{:,.0f}", "CapEx": "₹{:,.0f}", "Day_Zero_Cash": "₹{:,.0f}", "Required_Revenue": "₹{:,.0f}",
+                                   "Required_Patients": "{:,.0f}", "Required_Appointments": "{:,.0f}"}),
+                    use_container_width=True, hide_index=True
+                )
+                
+                st.divider()
+                st.markdown("#### 🎯 Sensitivity: Median Required Appointments Across Sites")
+                grid_ratio = st.select_slider("Rent Ratio", options=RENT_RATIO_GRID, value=RENT_RATIO)
+                df_matrix = (df_grid[df_grid["Rent_Ratio"] == grid_ratio]
+                             .groupby(["Show_Rate", "Conversion"])["Required_Appointments"].median()
+                             .unstack("Conversion"))
+                fig4 = px.imshow(df_matrix, text_auto=".0f", color_continuous_scale="RdYlGn_r", aspect="auto",
+                                 labels={"x": "Conversion", "y": "Show Rate", "color": "Appointments / Month"})
+                st.plotly_chart(fig4, use_container_width=True)
+                
+                st.download_button("Download underwriting + sensitivity (CSV)",
+                                   df_grid.merge(df_sites[["Day_Zero_Cash", "Required_Revenue"]].reset_index(drop=True),
+                                                 left_on="Site_Idx", right_index=True).to_csv(index=False),
+                                   file_name="site_underwriting.csv", mime="text/csv")
 
 # --- MODULE 5: MARKET DISCOVERY ---
 elif app_mode == "5. Market Discovery (Next 30 Cities)":
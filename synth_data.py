@@ -0,0 +1,423 @@
+"""
+Expansion OS - Synthetic Data Generator
+=======================================
+Writes fake inputs with the shapes the loaders expect, at a multiple of
+today's production size, so the pipelines can be benchmarked without the
+real MIS and customer files leaving the company:
+
+  - the seven MIS / first-time-customer exports build_core_frame reads
+    (file names, header offsets, Area / All / Fy26 / month columns)
+  - the website first-time-customer CSV aggregate_web_demand streams
+  - one CSV per TABLE_MAP table under <out>/data/
+
+Clinics, cities, pincodes, customers and order rows scale with `scale`;
+states and districts stay at India's real counts. Columns of the TABLE_MAP
+tables follow what the app reads (TABLE_KEYS, TABLE_SCHEMAS, coordinate
+and score columns); values are random.
+
+Usage:
+    python synth_data.py --scale 10 --out /tmp/bench_x10
+    from synth_data import generate
+    generate("/tmp/bench_x10", scale=10)     # {file name: rows}
+"""
+
+import argparse
+import os
+
+import numpy as np
+import pandas as pd
+
+from d2c_pipeline import WEB_FILE
+from db import TABLE_KEYS, TABLE_MAP
+from mis_pipeline import SOURCE_FILES
+
+# Approximate production sizes at scale=1
+BASE_CLINICS = 62
+BASE_CITIES = 1_500
+BASE_PINCODES = 19_000
+BASE_CLINIC_1CX_ROWS = 75_000
+BASE_WEB_ROWS = 300_000
+BASE_WEB_CUSTOMERS = 220_000
+
+N_DISTRICTS = 640
+MIS_MONTHS = pd.date_range("2023-04-01", "2026-03-01", freq="MS")    # FY24-FY26
+FIRST_1CX_START = pd.Timestamp("2023-01-01")
+ZIPS_PER_CLINIC = 40
+
+STATE_REGIONS = {
+    "Andhra Pradesh": "South", "Arunachal Pradesh": "East", "Assam": "East", "Bihar": "East",
+    "Chhattisgarh": "East", "Goa": "West", "Gujarat": "West", "Haryana": "North",
+    "Himachal Pradesh": "North", "Jharkhand": "East", "Karnataka": "South", "Kerala": "South",
+    "Madhya Pradesh": "West", "Maharashtra": "West", "Manipur": "East", "Meghalaya": "East",
+    "Mizoram": "East", "Nagaland": "East", "Odisha": "East", "Punjab": "North",
+    "Rajasthan": "North", "Sikkim": "East", "Tamil Nadu": "South", "Telangana": "South",
+    "Tripura": "East", "Uttar Pradesh": "North", "Uttarakhand": "North", "West Bengal": "East",
+    "Andaman and Nicobar Islands": "East", "Chandigarh": "North",
+    "Dadra and Nagar Haveli and Daman and Diu": "West", "Delhi": "North",
+    "Jammu and Kashmir": "North", "Ladakh": "North", "Lakshadweep": "South", "Puducherry": "South",
+}
+STATES = list(STATE_REGIONS)
+
+# India bounding box for coordinates
+LAT_RANGE = (8.0, 32.0)
+LON_RANGE = (68.0, 92.0)
+
+
+# === Dimensions ======================================================
+
+class _Dims:
+    """Shared label pools so every file joins on the same clinics / cities / pincodes."""
+
+    def __init__(self, scale: float, rng: np.random.Generator):
+        self.rng = rng
+        self.scale = scale
+        n_clinics = max(1, round(BASE_CLINICS * scale))
+        n_cities = max(n_clinics, round(BASE_CITIES * scale))
+        self.city_state = rng.choice(STATES, n_cities)
+        self.cities = np.array([f"City {i:05d}" for i in range(n_cities)])
+        self.city_lat = rng.uniform(*LAT_RANGE, n_cities)
+        self.city_lon = rng.uniform(*LON_RANGE, n_cities)
+
+        clinic_city = rng.choice(n_cities, n_clinics, replace=False)
+        self.clinics = np.array([f"{self.cities[c]} Clinic {i:04d}" for i, c in enumerate(clinic_city)])
+        self.clinic_city = clinic_city
+
+        self.district_state = rng.choice(STATES, N_DISTRICTS)
+        self.districts = np.array([f"District {i:03d}" for i in range(N_DISTRICTS)])
+
+        n_pins = max(ZIPS_PER_CLINIC, round(BASE_PINCODES * scale))
+        self.pincodes = 110001 + np.sort(rng.choice(899_998, n_pins, replace=False))
+        self.months = [d.strftime("%Y-%m") for d in MIS_MONTHS]
+        self.years = list(range(2020, 2026))
+
+    def sample(self, kind: str, n: int) -> np.ndarray:
+        r = self.rng
+        if kind == "state":
+            return r.choice(STATES, n)
+        if kind == "region":
+            return r.choice(["West", "North", "South", "East"], n)
+        if kind == "city":
+            return r.choice(self.cities, n)
+        if kind == "clinic":
+            return r.choice(self.clinics, n)
+        if kind == "district":
+            return r.choice(self.districts, n)
+        if kind == "pincode":
+            return r.choice(self.pincodes, n)
+        if kind == "month":
+            return r.choice(self.months, n)
+        if kind == "year":
+            return r.choice(self.years, n)
+        if kind == "lat":
+            return r.uniform(*LAT_RANGE, n).round(6)
+        if kind == "lon":
+            return r.uniform(*LON_RANGE, n).round(6)
+        if kind == "count":
+            return r.poisson(120, n)
+        if kind == "lacs":
+            return r.gamma(2.0, 8.0, n).round(2)
+        if kind == "pct":
+            return r.uniform(0, 100, n).round(2)
+        if kind == "score":
+            return r.uniform(0, 1, n).round(4)
+        if kind == "tier":
+            return r.choice(["Tier 1", "Tier 2", "Tier 3"], n)
+        if kind == "rank":
+            return r.permutation(n) + 1
+        if kind == "text":
+            return np.array([f"Item {i}" for i in r.integers(0, 10_000, n)])
+        raise ValueError(f"Unknown column kind {kind!r}")
+
+
+# === MIS exports =====================================================
+
+def _month_label(ts: pd.Timestamp) -> str:
+    return ts.strftime("%b %Y")        # "Apr 2025": contains "202", as _stage_appt expects
+
+
+def _sheet_names(dims: _Dims) -> np.ndarray:
+    """Clinic names as a sheet spells them: ~2% with stray case/spacing the stitch normalises."""
+    names = dims.clinics.astype(object).copy()
+    messy = dims.rng.random(len(names)) < 0.02
+    names[messy] = [f" {n.upper()} " for n in names[messy]]
+    return names
+
+
+def _write_with_title(df: pd.DataFrame, path: str, title: str):
+    """A sheet export with one title row above the header (read with header=1)."""
+    with open(path, "w", newline="") as f:
+        f.write(title + "," * (len(df.columns) - 1) + "\n")
+        df.to_csv(f, index=False)
+
+
+def generate_mis(out_dir: str, dims: _Dims) -> dict:
+    """The seven build_core_frame inputs. Returns {file name: rows}."""
+    r, n = dims.rng, len(dims.clinics)
+    months = [_month_label(m) for m in MIS_MONTHS]
+    paths = {name: os.path.join(out_dir, fname) for name, fname in SOURCE_FILES.items()}
+
+    pd.DataFrame({
+        "Sr No": np.arange(1, n + 1), "Area": dims.clinics, "City": dims.cities[dims.clinic_city],
+        "State": dims.city_state[dims.clinic_city],
+        "Latitude": dims.city_lat[dims.clinic_city].round(6), "Longitude": dims.city_lon[dims.clinic_city].round(6),
+    }).to_csv(paths["geo"], index=False)
+
+    regions = np.array([STATE_REGIONS[s] for s in dims.city_state[dims.clinic_city]])
+    sales = pd.DataFrame({"Area": _sheet_names(dims), "Region": regions, "Age": r.integers(1, 72, n)})
+    for m in months[-6:]:
+        sales[m] = r.gamma(2.0, 6.0, n).round(2)
+    sales["All"] = sales[months[-6:]].sum(axis=1).round(2)
+    sales.to_csv(paths["sales"], index=False)
+
+    ebitda = pd.DataFrame({"Clinic Name": _sheet_names(dims)})
+    for fy in ("Fy24", "Fy25", "Fy26"):
+        ebitda[fy] = r.normal(0.12, 0.15, n).round(4)
+    ebitda.to_csv(paths["ebitda"], index=False)
+
+    show = pd.DataFrame({"Area": _sheet_names(dims)})
+    for m in months[-12:]:
+        show[m] = r.uniform(0.25, 0.75, n).round(4)
+    show["All"] = show[months[-12:]].mean(axis=1).round(4)
+    _write_with_title(show, paths["show"], "NTB Show %")
+
+    conv = pd.DataFrame({"Area": _sheet_names(dims)})
+    for m in months[-12:]:
+        conv[m] = r.uniform(0.4, 0.95, n).round(4)
+    conv["All"] = conv[months[-12:]].mean(axis=1).round(4)
+    conv.to_csv(paths["conv"], index=False)
+
+    appt = pd.DataFrame({"Area": _sheet_names(dims)})
+    for m in months:
+        appt[m] = r.poisson(180, n)
+    appt["Grand Total"] = appt[months].sum(axis=1)
+    _write_with_title(appt, paths["appt"], "NTB Appointments")
+
+    rows = max(1, round(BASE_CLINIC_1CX_ROWS * dims.scale))
+    days = (MIS_MONTHS[-1] + pd.offsets.MonthEnd(0) - FIRST_1CX_START).days
+    dates = FIRST_1CX_START + pd.to_timedelta(np.sort(r.integers(0, days + 1, rows)), unit="D")
+    pd.DataFrame({
+        "Date": dates.strftime("%d-%m-%Y"),
+        "Clinic Loc": r.choice(dims.clinics, rows),
+        "Customer ID": r.integers(1, int(rows * 0.8) + 2, rows),
+        "Order Value": r.gamma(2.0, 1500.0, rows).round(2),
+    }).to_csv(paths["first_1cx"], index=False)
+
+    counts = {SOURCE_FILES[name]: n for name in SOURCE_FILES}
+    counts[SOURCE_FILES["first_1cx"]] = rows
+    return counts
+
+
+def generate_web(out_dir: str, dims: _Dims, chunk_rows: int = 1_000_000) -> dict:
+    """The website first-time-customer export, written in chunks."""
+    r = dims.rng
+    rows = max(1, round(BASE_WEB_ROWS * dims.scale))
+    customers = max(1, round(BASE_WEB_CUSTOMERS * dims.scale))
+    # Orders concentrate in a minority of cities
+    weights = r.pareto(1.2, len(dims.cities)) + 0.01
+    weights /= weights.sum()
+    path = os.path.join(out_dir, WEB_FILE)
+    for start in range(0, rows, chunk_rows):
+        n = min(chunk_rows, rows - start)
+        city = r.choice(len(dims.cities), n, p=weights)
+        dates = pd.Timestamp("2020-01-01") + pd.to_timedelta(r.integers(0, 2191, n), unit="D")
+        pd.DataFrame({
+            "Order ID": np.arange(start, start + n) + 1_000_000,
+            "Date": dates.strftime("%d-%m-%Y"),
+            "Customer ID": r.integers(1, customers + 1, n),
+            "City": dims.cities[city],
+            "State": dims.city_state[city],
+            "Pincode": r.choice(dims.pincodes, n),
+            "Total": r.gamma(2.0, 1200.0, n).round(2),
+        }).to_csv(path, mode="w" if start == 0 else "a", header=start == 0, index=False)
+    return {WEB_FILE: rows}
+
+
+# === TABLE_MAP tables ================================================
+# {table: (base rows or a grid of key dimensions, {column: kind})}. Grid
+# tables are the cross product of their key pools, so TABLE_KEYS stay unique.
+
+GEO = {"Latitude": "lat", "Longitude": "lon"}
+
+TABLE_SHAPES = {
+    "master_state":          ("states", {"State": "state", "Region": "region", "Population_Cr": "lacs",
+                                         "Online_Orders": "count", "Clinics": "count", "Revenue_Lacs": "lacs"}),
+    "state_orders_summary":  ("states", {"State": "state", "Orders": "count", "Customers": "count",
+                                         "Revenue_Lacs": "lacs", "AOV": "lacs"}),
+    "state_clinic_summary":  ("states", {"State": "state", "Clinics": "count", "Sales_Lacs": "lacs",
+                                         "Avg_Show_Pct": "pct"}),
+    "city_orders_summary":   ("cities", {"City": "city", "State": "state", "Orders": "count",
+                                         "Customers": "count", "Revenue_Lacs": "lacs", **GEO}),
+    "city_clinic_summary":   ("clinic_cities", {"City": "city", "State": "state", "Clinics": "count",
+                                                "Sales_Lacs": "lacs"}),
+    "year_trend":            ("years", {"Year": "year", "Orders": "count", "Customers": "count",
+                                        "Revenue_Lacs": "lacs"}),
+    "year_state_orders":     (["Year", "State"], {"Orders": "count", "Revenue_Lacs": "lacs"}),
+    "pincode_clinic":        ("pincodes", {"Pincode": "pincode", "Clinic": "clinic", "City": "city",
+                                           "State": "state", "Orders": "count", **GEO}),
+    "product_state":         (["Product", "State"], {"Orders": "count", "Revenue_Lacs": "lacs"}),
+    "clinic_performance":    ("clinics", {"Clinic": "clinic", "City": "city", "State": "state",
+                                          "Region": "region", "Sales_Lacs": "lacs", "EBITDA_Pct": "pct",
+                                          "Show_Pct": "pct", "Conversion_Pct": "pct"}),
+    "clinic_zip_summary":    (["Clinic", "Pincode"], {"Patients": "count", "Revenue_Lacs": "lacs"}),
+    "clinic_monthly_trend":  (["Clinic", "Month"], {"Appointments": "count", "Shows": "count",
+                                                    "Revenue_Lacs": "lacs"}),
+    "nfhs5_state":           ("states", {"State": "state", "Infertility_Pct": "pct", "Anaemia_Pct": "pct",
+                                         "Institutional_Births_Pct": "pct"}),
+    "nfhs5_district":        ("districts", {"State": "state", "District": "district", "Infertility_Pct": "pct",
+                                            "Anaemia_Pct": "pct", "Institutional_Births_Pct": "pct"}),
+    "infra_city":            ("cities", {"City": "city", "State": "state", "Malls": "count",
+                                         "Hospitals": "count", "Metro": "score"}),
+    "expansion_scores":      ("districts", {"State": "state", "District": "district", "Score": "score",
+                                            "Rank": "rank", "Tier": "tier"}),
+    "competition_map":       (2_000, {"Name": "text", "City": "city", "State": "state", "Type": "tier", **GEO}),
+    "census_district_demographics": ("districts", {"State": "state", "District": "district",
+                                                   "Population": "count", "Literacy_Rate": "pct",
+                                                   "Urban_Pct": "pct", "Female_Workforce_Pct": "pct",
+                                                   "Income_Index": "score"}),
+    "census_hh_assets":      ("districts", {"State": "state", "District": "district", "Internet_Pct": "pct",
+                                            "Mobile_Pct": "pct", "Asset_Index": "score",
+                                            "Transport_Access": "score"}),
+    "state_health_spending": ("states", {"State": "state", "Health_Spend_Per_Capita": "lacs", "MPCE": "lacs"}),
+    "cei_district_scores":   ("districts", {"State": "state", "District": "district",
+                                            "Online_Demand_Index": "score", "Health_Gap_Index": "score",
+                                            "Competition_Vacuum_Index": "score", "Infra_Access_Index": "score",
+                                            "CEI_Score": "score"}),
+    "cei_methodology":       (12, {"Component": "text", "Weight": "score", "Description": "text"}),
+    "smart_cities":          (100, {"City": "city", "State": "state", "Round": "tier"}),
+    "amrut_cities":          (500, {"City": "city", "State": "state", "Population": "count"}),
+    "ntb_show_clinic":       ("clinics", {"Clinic": "clinic", "Appointments": "count", "Shows": "count",
+                                          "Show_Pct": "pct"}),
+    "ntb_show_summary":      ("months", {"Month": "month", "Appointments": "count", "Shows": "count",
+                                         "Show_Pct": "pct"}),
+    "ntb_zipdata_clinic":    (["Clinic", "Pincode"], {"NTB": "count", "Shows": "count"}),
+    "ntb_zipdata_monthly":   (["Clinic", "Pincode", "Month"], {"NTB": "count", "Shows": "count"}),
+    "revenue_projection_175": (175, {"City": "city", "State": "state", "Clinic_Type": "tier",
+                                     "Year1_Revenue_Lacs": "lacs", "Year3_Revenue_Lacs": "lacs",
+                                     "Payback_Months": "count"}),
+    "revenue_city_rollup":   (120, {"City": "city", "State": "state", "Clinics": "count", "Revenue_Lacs": "lacs"}),
+    "existing_clinics_61":   ("clinics", {"Clinic": "clinic", "City": "city", "State": "state",
+                                          "Sales_Lacs": "lacs", **GEO}),
+    "expansion_same_city":   (60, {"City": "city", "State": "state", "Area": "text", "Score": "score", **GEO}),
+    "expansion_new_city":    (115, {"City": "city", "State": "state", "Score": "score", "Tier": "tier", **GEO}),
+    "ivf_competitor_map":    (800, {"Name": "text", "City": "city", "State": "state", "Brand": "text", **GEO}),
+    "web_order_demand":      ("pincodes", {"Pincode": "pincode", "City": "city", "State": "state",
+                                           "Orders": "count", "Revenue_Lacs": "lacs", **GEO}),
+    "implementation_roadmap": (40, {"Phase": "tier", "Quarter": "text", "City": "city", "Clinics": "count",
+                                    "Capex_Lacs": "lacs"}),
+    "show_pct_analysis":     ("clinics", {"Clinic": "clinic", "Show_Pct": "pct", "Benchmark_Pct": "pct",
+                                          "Gap": "pct"}),
+    "scenario_simulator_clinics": ("clinics", {"Clinic": "clinic", "Rent": "lacs", "Ticket_Size": "lacs",
+                                               "Show_Pct": "pct", "Conversion_Pct": "pct"}),
+    "expansion_priority_tiers": (175, {"City": "city", "State": "state", "Tier": "tier", "Score": "score"}),
+    "show_pct_rank_comparison": ("clinics", {"Clinic": "clinic", "Rank_Before": "rank", "Rank_After": "rank"}),
+    "show_pct_impact_comparison": ("clinics", {"Clinic": "clinic", "Revenue_Before_Lacs": "lacs",
+                                               "Revenue_After_Lacs": "lacs"}),
+}
+
+
+def _pool(dims: _Dims, key: str) -> np.ndarray:
+    """Distinct values of a key dimension (grid tables and per-entity tables)."""
+    if key in ("states", "State"):
+        return np.array(STATES)
+    if key in ("clinics", "Clinic"):
+        return dims.clinics
+    if key in ("months", "Month"):
+        return np.array(dims.months)
+    if key in ("years", "Year"):
+        return np.array(dims.years)
+    if key == "Product":
+        return np.array([f"Product {i:02d}" for i in range(40)])
+    if key == "Pincode":
+        return dims.rng.choice(dims.pincodes, ZIPS_PER_CLINIC, replace=False)
+    raise ValueError(f"No pool for {key!r}")
+
+
+def _entity_frame(dims: _Dims, entity: str) -> pd.DataFrame:
+    """One row per entity, with its real label, location and geography."""
+    if entity in ("cities", "clinic_cities"):
+        idx = np.unique(dims.clinic_city) if entity == "clinic_cities" else np.arange(len(dims.cities))
+        return pd.DataFrame({"City": dims.cities[idx], "State": dims.city_state[idx],
+                             "Latitude": dims.city_lat[idx].round(6), "Longitude": dims.city_lon[idx].round(6)})
+    if entity == "clinics":
+        c = dims.clinic_city
+        return pd.DataFrame({"Clinic": dims.clinics, "City": dims.cities[c], "State": dims.city_state[c],
+                             "Region": [STATE_REGIONS[s] for s in dims.city_state[c]],
+                             "Latitude": dims.city_lat[c].round(6), "Longitude": dims.city_lon[c].round(6)})
+    if entity == "districts":
+        return pd.DataFrame({"District": dims.districts, "State": dims.district_state})
+    if entity == "pincodes":
+        city = dims.rng.choice(len(dims.cities), len(dims.pincodes))
+        return pd.DataFrame({"Pincode": dims.pincodes, "City": dims.cities[city], "State": dims.city_state[city],
+                             "Clinic": dims.rng.choice(dims.clinics, len(dims.pincodes)),
+                             "Latitude": (dims.city_lat[city] + dims.rng.normal(0, 0.05, len(city))).round(6),
+                             "Longitude": (dims.city_lon[city] + dims.rng.normal(0, 0.05, len(city))).round(6)})
+    if entity == "states":
+        return pd.DataFrame({"State": STATES, "Region": list(STATE_REGIONS.values())})
+    if entity == "years":
+        return pd.DataFrame({"Year": dims.years})
+    if entity == "months":
+        return pd.DataFrame({"Month": dims.months})
+    raise ValueError(f"Unknown entity {entity!r}")
+
+
+def table_frame(table_name: str, dims: _Dims) -> pd.DataFrame:
+    """Synthetic rows for one TABLE_MAP table."""
+    rows, columns = TABLE_SHAPES[table_name]
+    keys = rows if isinstance(rows, list) else []
+    if keys:
+        pools = [_pool(dims, k) for k in keys]
+        grids = np.meshgrid(*[np.arange(len(p)) for p in pools], indexing="ij")
+        base = pd.DataFrame({k: pool[g.ravel()] for k, pool, g in zip(keys, pools, grids)})
+    elif isinstance(rows, str):
+        base = _entity_frame(dims, rows)
+    else:
+        base = pd.DataFrame(index=pd.RangeIndex(max(1, round(rows * dims.scale))))
+
+    out = {k: base[k].to_numpy() for k in keys}
+    for col, kind in columns.items():
+        out[col] = base[col].to_numpy() if col in base.columns else dims.sample(kind, len(base))
+    return pd.DataFrame(out)
+
+
+def generate_tables(data_dir: str, dims: _Dims, tables=None) -> dict:
+    """One CSV per TABLE_MAP table. Returns {table: rows}."""
+    os.makedirs(data_dir, exist_ok=True)
+    counts = {}
+    for name in tables or TABLE_MAP:
+        df = table_frame(name, dims)
+        keys = TABLE_KEYS.get(name)
+        if keys:
+            df = df.drop_duplicates(subset=keys)
+        df.to_csv(os.path.join(data_dir, TABLE_MAP[name]), index=False)
+        counts[name] = len(df)
+    return counts
+
+
+# === Entry point =====================================================
+
+def generate(out_dir: str, scale: float = 1.0, seed: int = 0) -> dict:
+    """Write every synthetic input under out_dir (tables under out_dir/data).
+
+    Returns {file or table name: rows}.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    dims = _Dims(scale, np.random.default_rng(seed))
+    counts = generate_mis(out_dir, dims)
+    counts.update(generate_web(out_dir, dims))
+    counts.update(generate_tables(os.path.join(out_dir, "data"), dims))
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Write synthetic MIS, customer and table files.")
+    parser.add_argument("--out", required=True, help="directory to write into")
+    parser.add_argument("--scale", type=float, default=1.0, help="multiple of today's production size")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    counts = generate(args.out, args.scale, args.seed)
+    for name, rows in counts.items():
+        print(f"{rows:>12,}  {name}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""
+Expansion OS - Site Underwriting
+================================
+Vectorised version of the Site Underwriter (AOP) maths, so a CSV of
+candidate sites is underwritten in one pass and a show-rate x conversion x
+rent-ratio sweep is a single broadcast instead of one widget round per quote.
+
+Usage:
+    from underwriting import underwrite, sensitivity_grid
+    table = underwrite(sites_df)
+    grid = sensitivity_grid(sites_df)
+"""
+
+import numpy as np
+import pandas as pd
+
+# Network assumptions used by the single-quote calculator
+RENT_RATIO = 0.12
+SHOW_RATE = 0.38
+CONVERSION = 0.75
+
+# Default sweep for the sensitivity matrix
+SHOW_RATE_GRID = [0.30, 0.34, 0.38, 0.42, 0.46]
+CONVERSION_GRID = [0.65, 0.70, 0.75, 0.80, 0.85]
+RENT_RATIO_GRID = [0.10, 0.12, 0.14]
+
+# Upload columns (case-insensitive aliases accepted)
+SITE_COLUMNS = {
+    "Site": ["site", "site name", "location", "pincode"],
+    "Rent": ["rent", "monthly rent", "rent quote"],
+    "CapEx": ["capex", "fit-out capex", "fitout capex"],
+    "Deposit_Months": ["deposit_months", "deposit months", "deposit"],
+    "Ticket_Size": ["ticket_size", "ticket size", "ticket"],
+}
+
+
+def normalize_sites(df: pd.DataFrame) -> pd.DataFrame:
+    """Map uploaded column names onto SITE_COLUMNS and coerce numerics.
+
+    Raises ValueError naming any required column that is missing.
+    """
+    lookup = {c.strip().lower(): c for c in df.columns}
+    renames, missing = {}, []
+    for target, aliases in SITE_COLUMNS.items():
+        source = next((lookup[a] for a in [target.lower()] + aliases if a in lookup), None)
+        if source is None:
+            if target != "Site":
+                missing.append(target)
+        else:
+            renames[source] = target
+    if missing:
+        raise ValueError(f"Missing column(s): {', '.join(missing)}")
+
+    out = df.rename(columns=renames)
+    if "Site" not in out.columns:
+        out["Site"] = [f"Site {i + 1}" for i in range(len(out))]
+    for col in ["Rent", "CapEx", "Deposit_Months", "Ticket_Size"]:
+        out[col] = pd.to_numeric(out[col], errors="coerce")
+    return out
+
+
+def underwrite(sites: pd.DataFrame, rent_ratio: float = RENT_RATIO, show_rate: float = SHOW_RATE,
+               conversion: float = CONVERSION) -> pd.DataFrame:
+    """Day-zero cash and monthly targets for every site, as vectorised columns."""
+    out = normalize_sites(sites)
+    out["Day_Zero_Cash"] = out["CapEx"] + out["Rent"] * out["Deposit_Months"]
+    out["Required_Revenue"] = out["Rent"] / rent_ratio
+    out["Required_Patients"] = out["Required_Revenue"] / out["Ticket_Size"]
+    out["Required_Shows"] = out["Required_Patients"] / conversion
+    out["Required_Appointments"] = out["Required_Shows"] / show_rate
+    return out
+
+
+def sensitivity_grid(sites: pd.DataFrame, show_rates=SHOW_RATE_GRID, conversions=CONVERSION_GRID,
+                     rent_ratios=RENT_RATIO_GRID) -> pd.DataFrame:
+    """Required appointments per site over the full parameter grid.
+
+    One broadcast over (site, show rate, conversion, rent ratio); returns a
+    long frame with one row per combination. Site_Idx is the site's row
+    position in `sites` - join back on it, since Site names can repeat.
+    """
+    out = normalize_sites(sites)
+    rent = out["Rent"].to_numpy(dtype=float)[:, None, None, None]
+    ticket = out["Ticket_Size"].to_numpy(dtype=float)[:, None, None, None]
+    s = np.asarray(show_rates, dtype=float)[None, :, None, None]
+    c = np.asarray(conversions, dtype=float)[None, None, :, None]
+    r = np.asarray(rent_ratios, dtype=float)[None, None, None, :]
+    appts = rent / r / ticket / c / s
+
+    idx = pd.MultiIndex.from_product(
+        [np.arange(len(out)), show_rates, conversions, rent_ratios],
+        names=["Site_Idx", "Show_Rate", "Conversion", "Rent_Ratio"],
+    )
+    grid = pd.DataFrame({"Required_Appointments": appts.ravel()}, index=idx).reset_index()
+    grid.insert(1, "Site", out["Site"].to_numpy()[grid["Site_Idx"].to_numpy()])
+    return grid